@@ -0,0 +1,100 @@
+import argparse
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+import main
+from job import Job
+from writer import co_initialize, co_uninitialize
+
+logger = logging.getLogger(__name__)
+
+
+def make_args(**options) -> argparse.Namespace:
+    """
+    Command line options of main.py as a Namespace, ex: make_args(agent=["Jane Doe"], email=["team@x.com"], send=True)
+    Options that are not given keep their command line default
+    """
+    args = main.make_parser().parse_args([])
+    for key, value in options.items():
+        if not hasattr(args, key):
+            raise TypeError(f"Unknown option {key}")
+        setattr(args, key, value)
+    return args
+
+
+def read_wide_schedule(filepath: str) -> pd.DataFrame:
+    return main.read_wide_schedule(filepath)
+
+
+def melt_schedule(wide: pd.DataFrame) -> pd.DataFrame:
+    """Long schedule for main(), from the frame the GUI grid already shows"""
+    return main.melt_schedule(wide)
+
+
+def read_services(filepath: str) -> pd.DataFrame:
+    return main.read_services(filepath)
+
+
+def check_coverage(schedule: pd.DataFrame, services: pd.DataFrame,
+                   headers: list[str]) -> tuple[main.CoverageReport, set[tuple[str, str]], set[str]]:
+    """
+    Coverage of a melted schedule for the GUI overlay
+    Returns the report, the (agent, column) cells of double-booked shifts and the columns touching an uncovered interval
+    """
+    shifts = main.convert_shift_datetimes(schedule, local=True)
+    report = main.check_schedule(shifts, services)
+    columns = main.convert_shift_datetimes(main.split_shift_cells(pd.Series(headers, dtype=object)), local=True)
+    uncovered = report.uncovered(columns["start"].to_numpy(), columns["end"].to_numpy())
+    return report, report.cells(shifts), {header for header, flag in zip(headers, uncovered) if flag}
+
+
+def run(args: argparse.Namespace,
+        schedule: pd.DataFrame | None = None,
+        services: pd.DataFrame | None = None,
+        job: Job | None = None,
+        debug: bool = False) -> Job:
+    """Runs main() on the calling thread, the job always receives a finished message"""
+    job = job if job is not None else Job()
+    co_initialize()
+    try:
+        main.main(args, debug, schedule=schedule, services=services, job=job)
+    except SystemExit:
+        # main exits on configuration errors, ex: an unknown sender mailbox
+        job.finish(error="stopped, see the log for details")
+    except Exception as e:
+        logger.exception("Scheduling run failed")
+        job.finish(error=str(e))
+    else:
+        job.finish()
+    finally:
+        co_uninitialize()
+    return job
+
+
+class SchedulingService:
+    """
+    Runs scheduling jobs in the background, one at a time, for the GUI
+    The caller polls job.events for progress and can stop the run with job.cancel()
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduling")
+        self.future: Future | None = None
+
+    @property
+    def busy(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def submit(self, args: argparse.Namespace,
+               schedule: pd.DataFrame | None = None,
+               services: pd.DataFrame | None = None) -> Job:
+        if self.busy:
+            raise RuntimeError("A scheduling run is already in progress")
+        job = Job()
+        self.future = self.executor.submit(run, args, schedule, services, job)
+        return job
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
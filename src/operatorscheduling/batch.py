@@ -0,0 +1,349 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import fake_outlook
+import main
+from dispatch import Dispatcher
+from directory import EmployeeDirectory
+from ics_writer import IcsWriter
+from instrumentation import Metrics, span
+from job import Job
+from parse_cache import ParseCache
+from recurrence import SeriesSpec, collapse, shift_specs
+from settings import Settings
+from shift_store import ShiftStore
+from timeline import Timeline
+from writer import AppointmentSpec, WriteSummary
+
+logger = logging.getLogger(__name__)
+
+# Manifest keys of a team that replace the command line option of the same name
+TEAM_OPTIONS = ("email", "agent", "date", "date_from", "date_to", "ics_path")
+
+
+class Team:
+    """One entry of the manifest: its files, its .env and the main.py options of its run"""
+    __slots__ = ("name", "env", "args")
+
+    def __init__(self, name: str, env: str, args: argparse.Namespace):
+        self.name = name
+        self.env = env
+        self.args = args
+
+    @property
+    def handover(self) -> bool:
+        return not (self.args.date or self.args.date_from or self.args.date_to)
+
+    def __repr__(self) -> str:
+        return f"{self.name} - {self.args.input}"
+
+
+class TeamPlan:
+    """What a worker process prepared for one team, sent back to the batch process"""
+    __slots__ = ("name", "timeline", "specs", "directory", "seconds", "error", "time_zone")
+
+    def __init__(self, name: str, timeline: Timeline | None = None,
+                 specs: list[AppointmentSpec | SeriesSpec] | None = None,
+                 directory: EmployeeDirectory | None = None, seconds: float = 0.0, error: str | None = None,
+                 time_zone: str | None = None):
+        self.name = name
+        self.timeline = timeline
+        self.specs = specs or []
+        self.directory = directory
+        self.seconds = seconds
+        self.error = error
+        # TIMEZONE of the team, the iCalendar export writes the shifts in UTC
+        self.time_zone = time_zone
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def read_manifest(path: str, args: argparse.Namespace) -> list[Team]:
+    """
+    Teams of a JSON manifest, ex: {"teams": [{"name": "Support", "input": "support.csv",
+    "service": "support_services.csv", "env": "support.env", "email": ["support@x.com"]}]}
+    Paths are relative to the manifest, options a team leaves out come from the command line
+    """
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    entries = manifest.get("teams", []) if isinstance(manifest, dict) else manifest
+    folder = os.path.dirname(os.path.abspath(path))
+    teams: list[Team] = []
+    problems: list[str] = []
+    for number, entry in enumerate(entries, start=1):
+        name = str(entry.get("name") or f"team{number}")
+        missing = [key for key in ("input", "service", "env") if not entry.get(key)]
+        unknown = sorted(set(entry) - {"name", "input", "service", "env", *TEAM_OPTIONS})
+        if missing:
+            problems.append(f"Team {name} has no {', '.join(missing)}")
+        if unknown:
+            problems.append(f"Team {name} has unknown options: {', '.join(unknown)}")
+        if any(team.name == name for team in teams):
+            problems.append(f"Team {name} is listed twice")
+        if missing or unknown:
+            continue
+        team_args = argparse.Namespace(**vars(args))
+        team_args.input = os.path.join(folder, entry["input"])
+        team_args.service = os.path.join(folder, entry["service"])
+        for key in TEAM_OPTIONS:
+            if key in entry:
+                setattr(team_args, key, entry[key])
+        if "ics_path" in entry:
+            team_args.ics_path = os.path.join(folder, entry["ics_path"])
+        else:
+            # Every team exports into its own file, or its own folder with --ics-per-agent
+            team_args.ics_path = os.path.join(args.ics_path, name if args.ics_per_agent else f"{name}.ics")
+        team_args.email = main.as_list(team_args.email)
+        teams.append(Team(name, os.path.join(folder, entry["env"]), team_args))
+    if not entries:
+        problems.append(f"No teams found in {path}")
+    for problem in problems:
+        logger.error(problem)
+    if problems:
+        sys.exit(1)
+    return teams
+
+
+def prepare_team(team: Team) -> TeamPlan:
+    """
+    Parses the files of one team and builds its appointments, runs in a worker process
+    Only the team settings are used, the .env of the working folder is never read
+    """
+    started = time.perf_counter()
+    args = team.args
+    try:
+        settings = Settings.load(team.env)
+        cache = ParseCache(args.parse_cache, int(args.parse_cache_size * 1024 * 1024)) if args.parse_cache else None
+        shifts = main.load_schedule(args.input, cache, settings)
+        services = main.load_services(args.service, cache)
+        selected = main.select_shifts(shifts, main.as_list(args.agent), main.as_list(args.date),
+                                      args.date_from, args.date_to, settings)
+        if args.backend == "ics":
+            # The export writes the real time of every shift, not the value shifted for pywin32
+            selected = main.convert_shift_datetimes(selected, settings, local=True)
+        timeline = main.create_operator_timeline(main.create_agent_list(selected, settings=settings))
+        manager = main.MeetingManager(args.email[0] if args.email else None, connect=False,
+                                      directory=settings.directory)
+        specs = main.make_specs(manager, timeline, services, team.handover)
+        if args.recurring:
+            specs = collapse(specs)
+    except SystemExit:
+        # The problems were logged by the worker, ex: employees missing in the team .env
+        return TeamPlan(team.name, seconds=time.perf_counter() - started, error="configuration error, see the log")
+    except Exception as e:
+        logger.exception(f"Preparing team {team.name} failed")
+        return TeamPlan(team.name, seconds=time.perf_counter() - started, error=str(e))
+    return TeamPlan(team.name, timeline, specs, settings.directory, time.perf_counter() - started,
+                    time_zone=settings.time_settings()[1])
+
+
+class Batch:
+    """
+    Runs the teams of a manifest like one main.py run each, but side by side
+    Worker processes parse and plan the teams in parallel. As soon as a team is ready its appointments go
+    to the Outlook writers of its mailboxes, teams sending from the same mailboxes share one Dispatcher.
+    Cancelling and the iCalendar export stay in this process, they are short next to the parsing.
+    """
+
+    def __init__(self, teams: list[Team], args: argparse.Namespace, metrics: Metrics, job: Job | None = None):
+        self.teams = teams
+        self.args = args
+        self.metrics = metrics
+        self.job = job
+        self.ics = args.backend == "ics"
+        self.send = main.parse_flag(args.send)
+        self.cancel = main.parse_flag(args.cancel)
+        self.plans: dict[str, TeamPlan] = {}
+        self.results: dict[str, dict] = {team.name: {} for team in teams}
+        self.team_of: dict[int, str] = {}
+        self.manager: main.MeetingManager | None = None
+        self.dispatchers: dict[tuple[str, ...], Dispatcher] = {}
+        self.feeders: dict[tuple[str, ...], ThreadPoolExecutor] = {}
+        self.feeding: list[Future] = []
+
+    def connect(self) -> main.MeetingManager:
+        if self.manager is None:
+            mailboxes = [team.args.email[0] for team in self.teams if team.args.email]
+            store = ShiftStore(self.args.store) if self.args.store else None
+            self.manager = main.MeetingManager(mailboxes[0], store, metrics=self.metrics)
+        return self.manager
+
+    def dispatcher(self, mailboxes: list[str]) -> tuple[Dispatcher, ThreadPoolExecutor]:
+        key = tuple(mailboxes)
+        if key not in self.dispatchers:
+            manager = self.connect()
+            self.dispatchers[key] = Dispatcher(mailboxes,
+                                               lambda mailbox: main.MeetingManager(mailbox, metrics=self.metrics).store,
+                                               partition=self.args.partition,
+                                               on_flush=manager.record_results,
+                                               batch_size=self.args.batch_size,
+                                               dry_run=main.debug,
+                                               rate_limit=self.args.rate_limit,
+                                               on_result=main.progress_callback("send", None, self.job),
+                                               stop=None if self.job is None else self.job.cancel_event,
+                                               metrics=self.metrics)
+            # Submitting blocks while the writer queue is full, one feeder per Dispatcher keeps the mailboxes apart
+            self.feeders[key] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"feed {key[0]}")
+        return self.dispatchers[key], self.feeders[key]
+
+    def check(self):
+        """Everything that would stop a team late, reported before any worker starts"""
+        problems = []
+        if self.args.check or self.args.plan or self.args.sync or self.args.watch or self.args.resume:
+            problems.append("--check/--plan/--sync/--watch/--resume run one team at a time, use main.py for them")
+        if self.args.recurring and (self.ics or not self.args.store):
+            problems.append("--recurring writes Outlook series and needs the shift store, drop --backend ics or set --store")
+        if not self.send and not self.cancel:
+            problems.append("Nothing to do, pass --send True or --cancel True")
+        if not self.ics:
+            problems.extend(f"No email specified to send the reminders of team {team.name} from"
+                            for team in self.teams if not team.args.email)
+        for problem in problems:
+            logger.error(problem)
+        if problems:
+            sys.exit(1)
+
+    def run(self):
+        self.check()
+        if not self.ics and (self.args.fake_outlook or os.name == 'posix'):
+            mailboxes = sorted({mailbox for team in self.teams for mailbox in team.args.email})
+            fake_outlook.setup(mailboxes, latency=self.args.fake_latency / 1000, jitter=self.args.fake_jitter / 1000,
+                               fault_rate=self.args.fake_fault_rate, throttle_rate=self.args.fake_throttle_rate)
+        if not self.ics and self.send:
+            # An unknown sender mailbox stops the batch here instead of inside a writer thread
+            self.connect().resolve_mailboxes(sorted({mailbox for team in self.teams for mailbox in team.args.email}))
+        workers = self.args.workers or min(len(self.teams), os.cpu_count() or 1)
+        logger.info(f"Preparing {len(self.teams)} teams with {workers} worker processes")
+        teams = {team.name: team for team in self.teams}
+        try:
+            with span(self.metrics, "prepare"), ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(prepare_team, team) for team in self.teams]
+                for future in as_completed(futures):
+                    plan = future.result()
+                    self.plans[plan.name] = plan
+                    self.prepared(teams[plan.name], plan)
+            with span(self.metrics, "send"):
+                self.finish_sending()
+            if self.cancel:
+                with span(self.metrics, "cancel"):
+                    for team in self.teams:
+                        if self.plans[team.name].ok:
+                            self.cancel_team(team, self.plans[team.name])
+        finally:
+            for feeder in self.feeders.values():
+                feeder.shutdown(wait=False, cancel_futures=True)
+
+    def prepared(self, team: Team, plan: TeamPlan):
+        result = self.results[team.name]
+        result["prepare_s"] = round(plan.seconds, 3)
+        if not plan.ok:
+            logger.error(f"Team {team.name} skipped: {plan.error}")
+            result["error"] = plan.error
+            return
+        logger.info(f"Team {team.name} prepared in {plan.seconds:.1f}s: {len(plan.timeline)} shifts")
+        result["shifts"] = len(plan.timeline)
+        self.metrics.count("shifts", len(plan.timeline))
+        if not self.send:
+            return
+        if self.ics:
+            self.export(team, plan)
+            return
+        if self.job is not None:
+            self.job.start(len(plan.timeline))
+        self.team_of.update((id(spec), team.name) for spec in plan.specs)
+        dispatcher, feeder = self.dispatcher(team.args.email)
+        self.feeding.append(feeder.submit(lambda: [dispatcher.submit(spec) for spec in plan.specs]))
+
+    def finish_sending(self):
+        for feeding in self.feeding:
+            feeding.result()
+        summary = WriteSummary()
+        for dispatcher in self.dispatchers.values():
+            summary.merge(dispatcher.close())
+        if not self.dispatchers:
+            return
+        logger.info(summary)
+        for outcome, results in (("sent", summary.succeeded), ("failed", summary.failed)):
+            for result in results:
+                team = self.results[self.team_of[id(result.spec)]]
+                team[outcome] = team.get(outcome, 0) + len(shift_specs(result.spec))
+
+    def export(self, team: Team, plan: TeamPlan):
+        with span(self.metrics, "export"):
+            writer = IcsWriter(team.args.ics_path,
+                               per_agent=team.args.ics_per_agent,
+                               organizer=team.args.email[0] if team.args.email else None,
+                               # Only an export of the whole schedule knows which earlier events were removed
+                               cancel_missing=team.handover and not team.args.agent,
+                               dry_run=main.debug,
+                               on_result=main.progress_callback("send", None, self.job),
+                               stop=None if self.job is None else self.job.cancel_event,
+                               time_zone=plan.time_zone)
+            for spec in plan.specs:
+                writer.submit(spec)
+            summary = writer.close()
+        logger.info(f"Team {team.name}: {summary}")
+        self.results[team.name].update(exported=len(summary.succeeded), failed=len(summary.failed))
+
+    def cancel_team(self, team: Team, plan: TeamPlan):
+        if self.ics:
+            writer = IcsWriter(team.args.ics_path, per_agent=team.args.ics_per_agent,
+                               organizer=team.args.email[0] if team.args.email else None, dry_run=main.debug,
+                               time_zone=plan.time_zone)
+            for spec in plan.specs:
+                writer.cancel(spec)
+            summary = writer.close()
+            self.results[team.name].update(cancel_done=len(summary.succeeded), cancel_failed=len(summary.failed))
+            return
+        # A Job of its own counts what was cancelled for the team
+        counter = Job()
+        manager = self.connect().with_directory(plan.directory)
+        manager.load_snapshot(plan.timeline)
+        main.cancel_meeting(manager, plan.timeline, None, counter)
+        self.results[team.name].update(cancel_done=counter.done - counter.failed, cancel_failed=counter.failed)
+
+    def report(self) -> list[dict]:
+        return [{"team": team.name, "input": team.args.input, **self.results[team.name]} for team in self.teams]
+
+    def summary(self) -> str:
+        lines = [f"{len(self.teams)} teams"]
+        for entry in self.report():
+            details = ", ".join(f"{key}={value}" for key, value in entry.items() if key not in ("team", "input"))
+            lines.append(f"  {entry['team']}: {details}")
+        return "\n".join(lines)
+
+
+def run_batch(args: argparse.Namespace, job: Job | None = None) -> Batch:
+    """Runs every team of args.manifest, the consolidated report is written to --report"""
+    metrics = Metrics()
+    if job is not None:
+        job.metrics = metrics
+    batch = Batch(read_manifest(args.manifest, args), args, metrics, job)
+    try:
+        batch.run()
+    finally:
+        logger.info(f"Batch finished\n{batch.summary()}\n{metrics.summary()}")
+        if args.report:
+            metrics.write(args.report, teams=batch.report())
+            logger.info(f"Batch report written to {args.report}")
+    return batch
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """main.py options, applied to every team of the manifest that does not set them itself"""
+    parser = main.make_parser()
+    parser.description = "Sends or cancels the reminders of several teams, each with its own files and .env"
+    parser.add_argument("manifest", type=str, help="JSON file listing the teams: name, input, service, env and options")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes parsing the teams, one per team up to the CPU count by default")
+    return parser
+
+
+if __name__ == "__main__":
+    run_batch(make_parser().parse_args())
@@ -0,0 +1,484 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from coverage_check import analyze
+from ics_writer import IcsWriter
+from service_index import ServiceIndex
+from shift_store import content_hash
+from timeline import Timeline, to_epoch
+from writer import AppointmentSpec
+
+
+def make_tuple_timeline(agents: int, days: int, seed: int = 0) -> list[tuple[str, str, datetime, datetime]]:
+    rng = random.Random(seed)
+    first_day = datetime(2025, 1, 1)
+    operator_timeline = []
+    for agent in range(agents):
+        name = f"Agent{agent}"
+        email = f"agent{agent}@example.com"
+        for day in range(days):
+            if rng.random() < 0.4:
+                start = first_day + timedelta(days=day, hours=rng.choice((7, 15, 23)))
+                operator_timeline.append((name, email, start, start + timedelta(hours=8)))
+    return sorted(operator_timeline, key=lambda x: x[1])
+
+
+def tuples_to_timeline(operator_timeline: list[tuple[str, str, datetime, datetime]]) -> Timeline:
+    interned: dict[str, int] = {}
+    emails: list[str] = []
+    for name, email, _, _ in operator_timeline:
+        if name not in interned:
+            interned[name] = len(interned)
+            emails.append(email)
+    return Timeline(list(interned), emails,
+                    np.array([interned[shift[0]] for shift in operator_timeline], dtype=np.int32),
+                    np.array([to_epoch(shift[2]) for shift in operator_timeline], dtype=np.int64),
+                    np.array([to_epoch(shift[3]) for shift in operator_timeline], dtype=np.int64))
+
+
+def make_service_timeline(windows: int, days: int, seed: int = 0) -> pd.DataFrame:
+    """Main/Backup windows of 1-14 days placed at random hours, so they overlap"""
+    rng = random.Random(seed)
+    first_day = datetime(2025, 1, 1)
+    rows = []
+    for window in range(windows):
+        start = first_day + timedelta(hours=rng.randrange(days * 24))
+        rows.append((rng.choice(("Main", "Backup")), start, start + timedelta(days=rng.randint(1, 14))))
+    return pd.DataFrame(rows, columns=["service", "start", "end"])
+
+
+SHIFT_SLOTS = ("07:00-15:00", "15:00-22:00", "22:00-07:00")
+FIRST_DAY = datetime(2025, 1, 1)
+
+
+def agent_names(agents: int) -> list[str]:
+    return [f"Agent{agent}" for agent in range(agents)]
+
+
+def make_schedule(agents: int, days: int, seed: int = 0, work_share: float = 0.6) -> pd.DataFrame:
+    """
+    Wide schedule as Telia sends it: an Agents/Date column and one column per day and shift slot,
+    ex: "08.08.2025 15:00-22:00", with an x where the agent works. Agents work at most one slot a day.
+    """
+    rng = np.random.default_rng(seed)
+    columns = [f"{FIRST_DAY + timedelta(days=day):%d.%m.%Y} {slot}" for day in range(days) for slot in SHIFT_SLOTS]
+    rows, day = np.nonzero(rng.random((agents, days)) < work_share)
+    cells = np.full((agents, len(columns)), None, dtype=object)
+    cells[rows, day * len(SHIFT_SLOTS) + rng.integers(len(SHIFT_SLOTS), size=len(rows))] = "x"
+    schedule = pd.DataFrame(cells, columns=columns)
+    schedule.insert(0, "Agents/Date", agent_names(agents))
+    return schedule
+
+
+def write_inputs(directory: str, agents: int, days: int, windows: int, seed: int = 0) -> tuple[str, str]:
+    """Generated schedule and service timeline as the CSV files main.py reads, returns their paths"""
+    schedule_path = os.path.join(directory, "agents_schedulers.csv")
+    service_path = os.path.join(directory, "service_timeline.csv")
+    make_schedule(agents, days, seed).to_csv(schedule_path, sep=";", index=False)
+    make_service_timeline(windows, days, seed).to_csv(service_path, sep=";", index=False,
+                                                      date_format="%Y-%m-%d %H:%M:%S")
+    return schedule_path, service_path
+
+
+def configure_main(agents: int):
+    """The config main.py would read from .env, with an EMP_ entry for every generated agent"""
+    import main
+    main.config.update({"FORMAT": "%d.%m.%Y %H:%M", "TIMEZONE": "Europe/Vilnius", "EMAIL_DOMAIN": "example.com"})
+    main.config.update({f"EMP_{name}": name.lower() for name in agent_names(agents)})
+    main.get_settings.cache_clear()
+
+
+def query_title(service: pd.DataFrame, date: datetime) -> str:
+    # What make_meeting_title did per appointment before the ServiceIndex
+    services = service.query("@date >= start and @date <= end")
+    service_prefix = "/".join(services["service"].tolist())
+    if not services["service"].tolist():
+        return "Upcomming shift"
+    return f"[{service_prefix}] Upcomming shift"
+
+
+def measure_memory(build) -> tuple[object, int]:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    built = build()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, after - before
+
+
+def timed(function, repeat: int = 3) -> tuple[float, object]:
+    """Best wall time in milliseconds and the result of the last call"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def best_of(statement, number: int = 200, repeat: int = 5) -> float:
+    """Best time per call in microseconds"""
+    return min(timeit.repeat(statement, number=number, repeat=repeat)) / number * 1e6
+
+
+def bench_timeline(agents: int, days: int) -> dict:
+    """Memory per shift and lookup latency: tuple list against the columnar Timeline"""
+    tuples, tuple_bytes = measure_memory(lambda: make_tuple_timeline(agents, days))
+    timeline, timeline_bytes = measure_memory(lambda: tuples_to_timeline(tuples))
+    assert isinstance(tuples, list) and isinstance(timeline, Timeline)
+
+    probe = tuples[len(tuples) // 2]
+    name, _, date, _ = probe
+    shifts = len(tuples)
+    return {
+        "shifts": shifts,
+        "bytes_per_shift": {
+            "tuples": tuple_bytes / shifts,
+            "timeline": timeline_bytes / shifts,
+        },
+        "lookup_by_date_us": {
+            "tuples": best_of(lambda: [s for s in tuples if s[2] == date]),
+            "timeline": best_of(lambda: timeline.at(date)),
+        },
+        "lookup_by_range_us": {
+            "tuples": best_of(lambda: [s for s in tuples if date <= s[2] < date + timedelta(days=7)]),
+            "timeline": best_of(lambda: timeline.between(date, date + timedelta(days=7))),
+        },
+        "lookup_by_agent_us": {
+            "tuples": best_of(lambda: [s for s in tuples if s[0] == name]),
+            "timeline": best_of(lambda: timeline.for_agent(name)),
+        },
+    }
+
+
+def bench_titles(agents: int, days: int, windows: int = 1000) -> dict:
+    """Per title cost: pandas query per shift against one batched ServiceIndex lookup"""
+    timeline = tuples_to_timeline(make_tuple_timeline(agents, days))
+    service = make_service_timeline(windows, days)
+    dates = timeline.start_dates()
+    sample = [date.astype(datetime) for date in dates[:200]]
+
+    query_us = best_of(lambda: [query_title(service, date) for date in sample], number=1, repeat=3) / len(sample)
+    build_us = best_of(lambda: ServiceIndex(service), number=1, repeat=3)
+    index = ServiceIndex(service)
+    batch_us = best_of(lambda: index.titles(dates), number=3, repeat=3)
+    assert index.titles(dates[:200]) == [query_title(service, date) for date in sample]
+    return {
+        "shifts": len(timeline),
+        "service_windows": windows,
+        "per_title_us": {
+            "query": query_us,
+            "index": batch_us / len(timeline),
+        },
+        "index_build_ms": build_us / 1000,
+    }
+
+
+def make_specs(timeline: Timeline, service: pd.DataFrame) -> list[AppointmentSpec]:
+    # What send_results hands to the writer, without the config lookups of the MeetingManager
+    titles = ServiceIndex(service).titles(timeline.start_dates())
+    following = timeline.next_operators()
+    specs = []
+    for shift in timeline:
+        next_name = "TBD" if following[shift.index] < 0 else timeline[int(following[shift.index])].name
+        body = f"Next operator -> {next_name}"
+        specs.append(AppointmentSpec(shift.name, shift.email, shift.name, titles[shift.index], "At work/Home",
+                                     body, shift.start, shift.end, content_hash(titles[shift.index], shift.start,
+                                                                                shift.end, body)))
+    return specs
+
+
+def bench_ics(agents: int, days: int, windows: int = 1000) -> dict:
+    """iCalendar export of the whole timeline: first export, unchanged re-export and one file per agent"""
+    timeline = tuples_to_timeline(make_tuple_timeline(agents, days))
+    specs = make_specs(timeline, make_service_timeline(windows, days))
+
+    def export(path: str, per_agent: bool = False) -> float:
+        started = time.perf_counter()
+        writer = IcsWriter(path, per_agent=per_agent, cancel_missing=True, time_zone="Europe/Vilnius")
+        for spec in specs:
+            writer.submit(spec)
+        writer.close()
+        return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shifts.ics")
+        first = export(path)
+        again = export(path)
+        size = os.path.getsize(path)
+        per_agent = export(os.path.join(directory, "agents"), per_agent=True)
+    return {
+        "shifts": len(specs),
+        "export_ms": {
+            "first": first * 1000,
+            "unchanged": again * 1000,
+            "per_agent": per_agent * 1000,
+        },
+        "bytes_per_shift": size / len(specs),
+    }
+
+
+def bench_coverage(agents: int, days: int, windows: int = 1000, repeat: int = 3) -> dict:
+    """Coverage check of the whole timeline: uncovered service windows, double-bookings and handover chains"""
+    timeline = tuples_to_timeline(make_tuple_timeline(agents, days))
+    service = make_service_timeline(windows, days)
+    elapsed, report = timed(lambda: analyze(timeline, service), repeat)
+    return {
+        "shifts": len(timeline),
+        "analyze_ms": elapsed,
+        "gaps": len(report.gaps),
+        "overlaps": len(report.overlaps),
+        "chains": len(report.chains),
+    }
+
+
+def bench_stages(agents: int, days: int, windows: int = 1000, repeat: int = 3) -> dict:
+    """Milliseconds per stage of a run, from the schedule CSV to the appointments handed to the writer"""
+    import main
+    configure_main(agents)
+    stages: dict[str, float] = {}
+
+    def stage(name: str, function):
+        stages[name], result = timed(function, repeat)
+        return result
+
+    with tempfile.TemporaryDirectory() as directory:
+        schedule_path, service_path = write_inputs(directory, agents, days, windows)
+        wide = stage("read_wide_schedule", lambda: main.read_wide_schedule(schedule_path))
+        services = stage("read_services", lambda: main.read_services(service_path))
+    shifts = stage("melt_schedule", lambda: main.melt_schedule(wide))
+    shifts = stage("convert_shift_datetimes", lambda: main.convert_shift_datetimes(shifts))
+    operators = stage("create_agent_list", lambda: main.create_agent_list(shifts))
+    timeline = stage("create_operator_timeline", lambda: main.create_operator_timeline(operators))
+    # A new manager every time, so the ServiceIndex is built again
+    titles = stage("make_meeting_titles",
+                   lambda: main.MeetingManager(None, connect=False).make_meeting_titles(services, timeline))
+    manager = main.MeetingManager(None, connect=False)
+    stage("next_operators", timeline.next_operators)
+    stage("build_specs", lambda: [manager.build_spec(shift, services, None, subject=titles[shift.index])
+                                  for shift in timeline])
+    sample = list(timeline)[:200]
+    per_title_us = timed(lambda: [manager.make_meeting_title(services, shift) for shift in sample], repeat)[0]
+    return {
+        "agents": agents,
+        "shifts": len(timeline),
+        "service_windows": windows,
+        "stage_ms": stages,
+        "total_ms": sum(stages.values()),
+        "make_meeting_title_us": per_title_us * 1000 / max(1, len(sample)),
+    }
+
+
+def bench_end_to_end(agents: int, days: int, windows: int = 1000, latency: float = 0.0,
+                     fault_rate: float = 0.0, mailboxes: int = 1) -> dict:
+    """
+    A whole send run of main.py on generated files against the fake Outlook
+    latency (ms per call) and fault_rate are injected by the fake, the COM retries and pacing run as in production
+    """
+    import api
+    import fake_outlook
+    import main
+    configure_main(agents)
+    fake_outlook.reset()
+    root = logging.getLogger()
+    level = root.level
+    with tempfile.TemporaryDirectory() as directory:
+        schedule_path, service_path = write_inputs(directory, agents, days, windows)
+        args = api.make_args(input=schedule_path, service=service_path, send=True,
+                             email=[f"bench{mailbox}@example.com" for mailbox in range(mailboxes)],
+                             fake_outlook=True, fake_latency=latency, fake_fault_rate=fault_rate,
+                             parse_cache="", journal="", store=os.path.join(directory, "shift_store.sqlite3"))
+        # One log line per appointment would be measured too
+        root.setLevel(logging.WARNING)
+        try:
+            elapsed, _ = timed(lambda: main.main(args, debug_=False), repeat=1)
+        finally:
+            root.setLevel(level)
+    outlook = fake_outlook.current()
+    appointments = sum(item.sent > 0 for item in outlook.items())
+    fake_outlook.reset()
+    return {
+        "agents": agents,
+        "appointments": appointments,
+        "mailboxes": mailboxes,
+        "latency_ms": latency,
+        "fault_rate": fault_rate,
+        "elapsed_ms": elapsed,
+        "appointments_per_second": appointments / elapsed * 1000 if elapsed else 0.0,
+        "outlook_calls": dict(sorted(outlook.calls.items())),
+        "injected_faults": sum(outlook.faults.values()),
+    }
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run in a fresh interpreter, prints the import time and which heavy modules got loaded
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+print(",".join(name for name in ("pandas", "numpy", "win32com", "pytz") if name in sys.modules))
+"""
+
+# Prints once the first frame of the GUI is drawn, the parent measures from the process start
+FIRST_FRAME_PROBE = """
+import interface
+app = interface.App()
+app.update()
+print("drawn", flush=True)
+app.destroy()
+"""
+
+
+def run_probe(code: str) -> tuple[float, list[str]]:
+    started = time.perf_counter()
+    done = subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_DIR, capture_output=True, text=True, timeout=120)
+    elapsed = time.perf_counter() - started
+    if done.returncode != 0:
+        raise RuntimeError(done.stderr.strip().splitlines()[-1] if done.stderr.strip() else "probe failed")
+    return elapsed, done.stdout.split("\n")
+
+
+def bench_import(module: str, repeat: int) -> dict:
+    times = []
+    loaded: list[str] = []
+    for _ in range(repeat):
+        _, output = run_probe(IMPORT_PROBE.format(module=module))
+        times.append(float(output[0]))
+        loaded = [name for name in output[1].split(",") if name]
+    return {"import_ms": min(times) * 1000, "heavy_modules": loaded}
+
+
+def bench_startup(agents: int, days: int, repeat: int = 5) -> dict:
+    """
+    Import time of the entry points and time to the first GUI frame, each in a fresh interpreter
+    The schedule size does not matter here. interface should load neither pandas nor win32com.
+    """
+    results: dict = {}
+    for module in ("main", "api", "interface"):
+        try:
+            results[module] = bench_import(module, repeat)
+        except RuntimeError as e:
+            results[module] = {"error": str(e)}
+    heavy = {"pandas", "win32com"} & set(results["interface"].get("heavy_modules", ()))
+    assert not heavy, f"interface imports {sorted(heavy)} before the window is drawn"
+    try:
+        results["first_frame_ms"] = min(run_probe(FIRST_FRAME_PROBE)[0] for _ in range(repeat)) * 1000
+    except RuntimeError as e:
+        # No display or no GUI dependencies on this machine
+        results["first_frame_ms"] = {"error": str(e)}
+    return results
+
+
+BENCHMARKS = {
+    "timeline": bench_timeline,
+    "titles": bench_titles,
+    "startup": bench_startup,
+    "ics": bench_ics,
+    "coverage": bench_coverage,
+    "stages": bench_stages,
+    "end_to_end": bench_end_to_end,
+}
+# What "suite" runs, startup is left out as it measures fresh interpreters rather than the schedule size
+SUITE = ("stages", "timeline", "titles", "ics", "coverage", "end_to_end")
+
+
+def git_commit() -> str | None:
+    try:
+        done = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PACKAGE_DIR,
+                              capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return done.stdout.strip() or None
+
+
+def make_record(benchmark: str, parameters: dict, results: dict) -> dict:
+    """Results with what is needed to compare them against another commit or machine"""
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    numbers = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            numbers.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            numbers[f"{prefix}{key}"] = float(value)
+    return numbers
+
+
+def compare(old: dict, new: dict) -> str:
+    """Every number both records have, with new/old, ex: 1.25 took a quarter longer or grew by a quarter"""
+    before, after = flatten(old["results"]), flatten(new["results"])
+    lines = [f"{old.get('commit') or '?'} -> {new.get('commit') or '?'}"]
+    if old.get("parameters") != new.get("parameters"):
+        lines.append(f"  parameters differ: {old.get('parameters')} -> {new.get('parameters')}")
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key] if before[key] else float("nan")
+        lines.append(f"  {key}: {before[key]:.6g} -> {after[key]:.6g} ({ratio:.2f}x)")
+    return "\n".join(lines)
+
+
+def run(benchmark: str, args: argparse.Namespace) -> dict:
+    options = {
+        "titles": {"windows": args.windows},
+        "ics": {"windows": args.windows},
+        "coverage": {"windows": args.windows, "repeat": args.repeat},
+        "startup": {"repeat": args.repeat},
+        "stages": {"windows": args.windows, "repeat": args.repeat},
+        "end_to_end": {"windows": args.windows, "latency": args.latency, "fault_rate": args.fault_rate,
+                       "mailboxes": args.mailboxes},
+    }.get(benchmark, {})
+    return BENCHMARKS[benchmark](args.agents, args.days, **options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS) + ["suite"], help="Benchmark to run, suite runs " + ", ".join(SUITE))
+    parser.add_argument("--agents", type=int, default=100, help="Number of agents in the generated schedule")
+    parser.add_argument("--days", type=int, default=365, help="Number of days in the generated schedule")
+    parser.add_argument("--windows", type=int, default=1000, help="Number of service windows in the generated service timeline")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per measurement for startup, runs per stage for stages and coverage")
+    parser.add_argument("--latency", type=float, default=0.0, help="Milliseconds per fake Outlook call for end_to_end")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Share of fake Outlook calls failing for end_to_end")
+    parser.add_argument("--mailboxes", type=int, default=1, help="Sending mailboxes for end_to_end")
+    parser.add_argument("--output", type=str, default=None, help="Write the results with commit and parameters to this JSON file")
+    parser.add_argument("--compare", type=str, default=None, help="JSON file of an earlier run to compare the results with")
+    args = parser.parse_args()
+    if args.benchmark == "suite":
+        results = {benchmark: run(benchmark, args) for benchmark in SUITE}
+    else:
+        results = run(args.benchmark, args)
+    parameters = {key: value for key, value in vars(args).items() if key not in ("benchmark", "output", "compare")}
+    record = make_record(args.benchmark, parameters, results)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), record))
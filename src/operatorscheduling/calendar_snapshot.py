@@ -0,0 +1,167 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Protocol
+
+logger = logging.getLogger(__name__)
+
+# Properties pulled for every calendar item, in Table column order
+COLUMNS = ("EntryID", "Subject", "Start", "End", "RequiredAttendees", "IsRecurring")
+
+
+class Attendee(Protocol):
+    # An Employee of the directory
+    key: str
+    display_name: str
+
+
+def make_restriction(start_date: datetime, end_date: datetime) -> str:
+    return f"[Start] >= '{start_date.strftime('%m/%d/%Y %H:%M')}' AND [End] <= '{end_date.strftime('%m/%d/%Y %H:%M')}'"
+
+
+def to_naive(date: datetime) -> datetime:
+    # pywin32 hands out tz-aware pywintypes datetimes, the timeline works with naive ones
+    return datetime(date.year, date.month, date.day, date.hour, date.minute, date.second)
+
+
+class CalendarEntry:
+    __slots__ = ("entry_id", "subject", "start", "end", "attendees", "recipients", "content_hash", "mailbox",
+                 "recurring")
+
+    def __init__(self, entry_id: str, subject: str, start: datetime, end: datetime, attendees: str,
+                 recipients: tuple[str, ...], content_hash: str | None = None, mailbox: str | None = None,
+                 recurring: bool = False):
+        self.entry_id = entry_id
+        self.subject = subject
+        self.start = start
+        self.end = end
+        self.attendees = attendees
+        self.recipients = recipients
+        # Only known for appointments this tool recorded in the shift store
+        self.content_hash = content_hash
+        # Sending mailbox when it is not the one the snapshot was read from
+        self.mailbox = mailbox
+        # One occurrence of a recurring appointment, entry_id is the EntryID of its master
+        self.recurring = recurring
+
+    @property
+    def key(self) -> str:
+        """Tells the entries apart, the occurrences of a series share their EntryID"""
+        return f"{self.entry_id}|{self.start.isoformat()}" if self.recurring else self.entry_id
+
+    def __repr__(self) -> str:
+        return f"{self.subject} - {self.start} - {self.end} - {self.attendees}"
+
+
+def read_table(folder, restriction: str) -> list[tuple]:
+    """One Restrict with only the needed columns, fetched in a single GetArray call"""
+    table = folder.GetTable(restriction, 0)
+    table.Columns.RemoveAll()
+    for column in COLUMNS:
+        table.Columns.Add(column)
+    row_count = table.GetRowCount()
+    if not row_count:
+        return []
+    return list(table.GetArray(row_count))
+
+
+def read_items(folder, restriction: str) -> list[tuple]:
+    """Fallback for stores without Table support: walks the restricted Items collection once"""
+    items = folder.Items
+    items.IncludeRecurrences = False
+    return [tuple(getattr(item, column) for column in COLUMNS) for item in items.Restrict(restriction)]
+
+
+class CalendarSnapshot:
+    """
+    In-memory copy of the shift appointments in a calendar window
+    Entries are indexed by attendee key, each attendee keeps its entries sorted by start.
+    Recurring appointments are left out, the shift store knows their occurrences (see recurrence.py).
+    attendee_key turns one RequiredAttendees entry into its email, names it cannot resolve stay display names.
+    """
+
+    def __init__(self, rows: Iterable[tuple], attendee_key: Callable[[str], str], subject: str = "Upcomming shift"):
+        self.attendee_key = attendee_key
+        self.by_attendee: dict[str, list[CalendarEntry]] = {}
+        self.by_entry_id: dict[str, CalendarEntry] = {}
+        self._attendee_keys: dict[str, list[str]] = {}
+        self.scanned = 0
+        for entry_id, item_subject, start, end, attendees, recurring in rows:
+            self.scanned += 1
+            if recurring or not item_subject or subject not in item_subject:
+                continue
+            recipients = tuple(dict.fromkeys(self.attendee_key(name) for name in (attendees or "").split(";")
+                                             if name.strip()))
+            self.add(CalendarEntry(entry_id, item_subject, to_naive(start), to_naive(end), attendees or "", recipients))
+
+    @classmethod
+    def load(cls, folder, start_date: datetime, end_date: datetime,
+             attendee_key: Callable[[str], str], subject: str = "Upcomming shift") -> "CalendarSnapshot":
+        restriction = make_restriction(start_date, end_date)
+        try:
+            rows = read_table(folder, restriction)
+        except Exception as e:
+            logger.warning(f"Calendar table not available ({e}), reading items one by one")
+            rows = read_items(folder, restriction)
+        snapshot = cls(rows, attendee_key, subject)
+        logger.info(f"Calendar snapshot {start_date} - {end_date}: {len(snapshot)} shifts out of {snapshot.scanned} items")
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.by_entry_id)
+
+    def add(self, entry: CalendarEntry):
+        self.by_entry_id[entry.entry_id] = entry
+        for recipient in entry.recipients:
+            entries = self.by_attendee.setdefault(recipient, [])
+            bisect.insort(entries, entry, key=lambda e: e.start)
+        self._attendee_keys = {}
+
+    def remove(self, entry: CalendarEntry):
+        self.by_entry_id.pop(entry.entry_id, None)
+        for recipient in entry.recipients:
+            entries = self.by_attendee.get(recipient, [])
+            if entry in entries:
+                entries.remove(entry)
+
+    def attendee_keys(self, attendee: Attendee) -> list[str]:
+        # The address first, then attendees Outlook only listed by a name containing the display name
+        if attendee.key not in self._attendee_keys:
+            keys = [attendee.key] if attendee.key in self.by_attendee else []
+            keys += [key for key in self.by_attendee if "@" not in key and attendee.display_name in key]
+            self._attendee_keys[attendee.key] = keys
+        return self._attendee_keys[attendee.key]
+
+    def for_attendee(self, attendee: Attendee) -> list[CalendarEntry]:
+        found = {entry.entry_id: entry for key in self.attendee_keys(attendee) for entry in self.by_attendee[key]}
+        return sorted(found.values(), key=lambda e: e.start)
+
+    def get(self, attendee: Attendee, start: datetime) -> list[CalendarEntry]:
+        """Entries of attendee starting exactly at start"""
+        found: list[CalendarEntry] = []
+        for key in self.attendee_keys(attendee):
+            entries = self.by_attendee[key]
+            low = bisect.bisect_left(entries, start, key=lambda e: e.start)
+            for entry in entries[low:]:
+                if entry.start != start:
+                    break
+                if entry not in found:
+                    found.append(entry)
+        return found
+
+    def find(self, attendee: Attendee, date: datetime, window: timedelta = timedelta(days=1)) -> list[CalendarEntry]:
+        """Entries of attendee inside date ± window, same window the per shift Restrict used"""
+        found: list[CalendarEntry] = []
+        for key in self.attendee_keys(attendee):
+            entries = self.by_attendee[key]
+            low = bisect.bisect_left(entries, date - window, key=lambda e: e.start)
+            for entry in entries[low:]:
+                if entry.start > date + window:
+                    break
+                if entry.end <= date + window and entry not in found:
+                    found.append(entry)
+        return found
+
+    def between(self, start_date: datetime, end_date: datetime) -> list[CalendarEntry]:
+        return sorted((entry for entry in self.by_entry_id.values()
+                       if entry.start >= start_date and entry.end <= end_date), key=lambda e: e.start)
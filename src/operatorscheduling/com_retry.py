@@ -0,0 +1,178 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from typing import Callable, TypeVar
+
+from instrumentation import Metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def hresult(code: int) -> int:
+    # pywin32 reports HRESULTs as signed 32 bit ints
+    return code - (1 << 32) if code >= 1 << 31 else code
+
+
+# Outlook or Exchange telling us to slow down
+THROTTLING = {
+    hresult(0x8001010A): "RPC_E_SERVERCALL_RETRYLATER",
+    hresult(0x80040401): "MAPI_E_TOO_MANY_SESSIONS",
+}
+# Worth another try after a short pause
+TRANSIENT = {
+    hresult(0x80010001): "RPC_E_CALL_REJECTED",
+    hresult(0x800706BA): "RPC_S_SERVER_UNAVAILABLE",
+    hresult(0x800706BE): "RPC_S_CALL_FAILED",
+    hresult(0x80010108): "RPC_E_DISCONNECTED",
+    hresult(0x80040115): "MAPI_E_NETWORK_ERROR",
+}
+THROTTLING_MESSAGES = ("server busy", "throttl", "limited the number", "too many")
+
+FATAL = "fatal"
+TRANSIENT_ERROR = "transient"
+THROTTLED = "throttled"
+
+
+def error_codes(error: Exception) -> list[int]:
+    """HRESULT of a pywintypes.com_error and the scode from its excepinfo, when there is one"""
+    codes = []
+    code = getattr(error, "hresult", None)
+    if code is None and error.args and isinstance(error.args[0], int):
+        code = error.args[0]
+    if code is not None:
+        codes.append(code)
+    excepinfo = getattr(error, "excepinfo", None)
+    if excepinfo is None and len(error.args) > 2:
+        excepinfo = error.args[2]
+    if isinstance(excepinfo, tuple) and len(excepinfo) > 5 and isinstance(excepinfo[5], int):
+        codes.append(excepinfo[5])
+    return codes
+
+
+def classify(error: Exception) -> str:
+    codes = error_codes(error)
+    if any(code in THROTTLING for code in codes):
+        return THROTTLED
+    if any(message in str(error).lower() for message in THROTTLING_MESSAGES):
+        return THROTTLED
+    if any(code in TRANSIENT for code in codes):
+        return TRANSIENT_ERROR
+    return FATAL
+
+
+class AimdController:
+    """
+    Paces calls with additive increase / multiplicative decrease of the allowed rate
+    Calls are not paced at all (or only capped at max_rate) until the first throttling signal, pacing
+    then starts at the rate the calls actually ran at. Every success adds `increase` calls per second
+    up to max_rate, a throttling signal multiplies the rate by `decrease` down to min_rate.
+    """
+
+    def __init__(self, rate: float | None = None, min_rate: float = 0.2, max_rate: float | None = None,
+                 increase: float = 0.5, decrease: float = 0.5, sleep: Callable[[float], None] = time.sleep):
+        self.max_rate = max_rate
+        # None: unpaced
+        self.rate = max_rate if rate is None else rate if max_rate is None else min(rate, max_rate)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.sleep = sleep
+        self.next_slot = 0.0
+        # Calls so far and when the first one started, the observed rate of an unpaced run
+        self.calls = 0
+        self.first_call: float | None = None
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.calls += 1
+            if self.first_call is None:
+                self.first_call = now
+            if self.rate is None:
+                return
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + 1 / self.rate
+        if wait > 0:
+            self.sleep(wait)
+
+    def observed_rate(self) -> float:
+        elapsed = time.monotonic() - self.first_call if self.first_call is not None else 0.0
+        return self.calls / elapsed if elapsed > 0 else self.min_rate
+
+    def on_success(self):
+        with self.lock:
+            if self.rate is None:
+                return
+            self.rate += self.increase
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+
+    def on_throttle(self):
+        with self.lock:
+            rate = self.observed_rate() if self.rate is None else self.rate
+            self.rate = max(self.min_rate, rate * self.decrease)
+            logger.warning(f"Outlook is throttling, slowing down to {self.rate:.2f} calls/s")
+
+
+class ComCaller:
+    """
+    Runs Outlook COM calls with retries
+    Transient and throttling errors are retried with exponential backoff and full jitter,
+    anything else is raised right away. counters keeps per call and per outcome totals,
+    with metrics every attempt is also timed into a latency histogram per call.
+    """
+
+    def __init__(self, controller: AimdController | None = None,
+                 max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 sleep: Callable[[float], None] = time.sleep, rng: Callable[[], float] = random.random,
+                 metrics: Metrics | None = None):
+        self.controller = controller
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rng = rng
+        self.counters: Counter = Counter()
+        self.metrics = metrics
+
+    def backoff(self, attempt: int) -> float:
+        return self.rng() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def call(self, description: str, function: Callable[..., T], *args, **kwargs) -> T:
+        for attempt in range(self.max_attempts):
+            if self.controller is not None:
+                self.controller.acquire()
+            self.counters["calls"] += 1
+            self.counters[f"calls.{description}"] += 1
+            start = time.perf_counter() if self.metrics is not None else 0.0
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.observe(description, time.perf_counter() - start, ok=False)
+                kind = classify(e)
+                self.counters[kind] += 1
+                if kind == FATAL or attempt == self.max_attempts - 1:
+                    self.counters["failures"] += 1
+                    raise
+                if kind == THROTTLED and self.controller is not None:
+                    self.controller.on_throttle()
+                delay = self.backoff(attempt)
+                self.counters["retries"] += 1
+                logger.warning(f"{description} failed ({kind}: {e}), retry {attempt + 1} in {delay:.1f}s")
+                self.sleep(delay)
+                continue
+            if self.metrics is not None:
+                self.metrics.observe(description, time.perf_counter() - start)
+            if self.controller is not None:
+                self.controller.on_success()
+            return result
+        raise AssertionError("unreachable")
+
+    def report(self) -> str:
+        return ", ".join(f"{key}={value}" for key, value in sorted(self.counters.items()))
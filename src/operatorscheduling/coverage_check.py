@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+from timeline import Timeline
+
+DAY = 24 * 60 * 60
+INT64_MIN = np.iinfo(np.int64).min
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def to_seconds(dates) -> np.ndarray:
+    return np.asarray(dates, dtype="datetime64[s]").astype(np.int64)
+
+
+def to_dates(seconds: np.ndarray) -> np.ndarray:
+    return np.asarray(seconds, dtype=np.int64).astype("datetime64[s]")
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Union of [start, end) intervals as sorted disjoint blocks, touching intervals join into one block"""
+    if not len(starts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    # reach[i]: the furthest any interval up to i gets, a block ends where the next start is past it
+    reach = np.maximum.accumulate(ends)
+    first = np.flatnonzero(np.concatenate([[True], starts[1:] > reach[:-1]]))
+    last = np.append(first[1:], len(starts)) - 1
+    return starts[first], reach[last]
+
+
+def subtract_intervals(starts: np.ndarray, ends: np.ndarray,
+                       block_starts: np.ndarray, block_ends: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parts of every [start, end) window outside the sorted disjoint blocks
+    Returns the window of every part with its start and end, a window can leave several parts or none
+    """
+    # Holes between the blocks, open before the first block and after the last one
+    hole_starts = np.concatenate([[INT64_MIN], block_ends])
+    hole_ends = np.concatenate([block_starts, [INT64_MAX]])
+    first = np.searchsorted(hole_ends, starts, side="right")
+    last = np.searchsorted(hole_starts, ends, side="left")
+    counts = np.maximum(last - first, 0)
+    window = np.repeat(np.arange(len(starts)), counts)
+    hole = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+    part_starts = np.maximum(starts[window], hole_starts[hole])
+    part_ends = np.minimum(ends[window], hole_ends[hole])
+    kept = part_ends > part_starts
+    return window[kept], part_starts[kept], part_ends[kept]
+
+
+def double_bookings(agent_ids: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Positions of shifts starting before an earlier shift of the same agent ended,
+    with the position of that earlier shift (the one reaching furthest)
+    """
+    if not len(starts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.lexsort((starts, agent_ids))
+    # Agents are moved apart by more than the whole span, one running maximum then never crosses agents
+    low = starts.min()
+    width = max(int(ends.max()), int(starts.max())) - int(low) + 1
+    base = agent_ids[order].astype(np.int64) * width - low
+    shifted_starts = starts[order] + base
+    shifted_ends = ends[order] + base
+    reach = np.maximum.accumulate(shifted_ends)
+    holder = np.maximum.accumulate(np.where(shifted_ends == reach, np.arange(len(order)), 0))
+    overlapping = np.flatnonzero(shifted_starts[1:] < reach[:-1]) + 1
+    return order[overlapping], order[holder[overlapping - 1]]
+
+
+def handover_chains(timeline: Timeline) -> pd.DataFrame:
+    """
+    Runs of shifts handing over without a break: the next operator starts exactly when the shift ends
+    A chain ends at a shift that nobody takes over from (TBD in the reminder) or that is followed by a gap
+    """
+    count = len(timeline)
+    columns = ["start", "end", "shifts", "first", "last", "next", "gap_minutes"]
+    if not count:
+        return pd.DataFrame(columns=columns)
+    following = timeline.next_operators()
+    linked = following >= 0
+    linked[linked] = timeline.starts[following[linked]] == timeline.ends[linked]
+    # Empty shifts could hand over back and forth at the same moment
+    linked &= timeline.ends > timeline.starts
+    link = np.where(linked, following, np.arange(count))
+    # Pointer doubling: after log2(count) rounds every shift points at the last shift of its chain
+    terminal = link
+    while True:
+        jumped = terminal[terminal]
+        if np.array_equal(jumped, terminal):
+            break
+        terminal = jumped
+    chains, inverse, shifts = np.unique(terminal, return_inverse=True, return_counts=True)
+    # First shift of every chain: the earliest one pointing at its terminal, timeline positions are start ordered
+    first = np.full(len(chains), count)
+    np.minimum.at(first, inverse, np.arange(count))
+    after = following[chains]
+    names = np.asarray(timeline.names, dtype=object)
+    handed = after >= 0
+    next_names = np.full(len(chains), None, dtype=object)
+    next_names[handed] = names[timeline.agent_ids[after[handed]]]
+    gaps = np.full(len(chains), np.nan)
+    gaps[handed] = (timeline.starts[after[handed]] - timeline.ends[chains[handed]]) / 60
+    return pd.DataFrame({
+        "start": to_dates(timeline.starts[first]),
+        "end": to_dates(timeline.ends[chains]),
+        "shifts": shifts,
+        "first": names[timeline.agent_ids[first]],
+        "last": names[timeline.agent_ids[chains]],
+        "next": next_names,
+        "gap_minutes": gaps,
+    }).sort_values("start", kind="stable").reset_index(drop=True)
+
+
+def shift_timeline(shifts: pd.DataFrame) -> Timeline:
+    """
+    Timeline of a converted long schedule without the employee directory, the checks only need names and times
+    Emails are left empty
+    """
+    codes, names = pd.factorize(shifts["agent"])
+    return Timeline(list(names), [""] * len(names), codes, to_seconds(shifts["start"]), to_seconds(shifts["end"]))
+
+
+def schedule_period(timeline: Timeline) -> tuple[int, int] | None:
+    """Whole days touched by the shifts, service windows outside them are not checked"""
+    if not len(timeline):
+        return None
+    return int(timeline.starts[0]) // DAY * DAY, (int(timeline.ends.max()) + DAY - 1) // DAY * DAY
+
+
+class CoverageReport:
+    """
+    Uncovered service windows, double-booked agents and handover chains of a timeline
+    gaps: service, start, end, minutes. overlaps: agent, start, end, other_start, other_end.
+    chains: see handover_chains.
+    """
+
+    def __init__(self, gaps: pd.DataFrame, overlaps: pd.DataFrame, chains: pd.DataFrame):
+        self.gaps = gaps
+        self.overlaps = overlaps
+        self.chains = chains
+
+    @property
+    def ok(self) -> bool:
+        return not len(self.gaps) and not len(self.overlaps)
+
+    def __str__(self) -> str:
+        lines = [f"{len(self.gaps)} uncovered service intervals, {len(self.overlaps)} double-booked shifts, "
+                 f"{len(self.chains)} handover chains"]
+        for service, start, end, minutes in self.gaps.itertuples(index=False):
+            lines.append(f"  uncovered {service}: {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M} ({minutes / 60:.1f}h)")
+        for agent, start, end, other_start, other_end in self.overlaps.itertuples(index=False):
+            lines.append(f"  double-booked {agent}: {start:%Y-%m-%d %H:%M}-{end:%H:%M} "
+                         f"overlaps {other_start:%Y-%m-%d %H:%M}-{other_end:%H:%M}")
+        for chain in self.chains.itertuples(index=False):
+            handover = "nobody takes over" if chain.next is None else \
+                f"{chain.next} after {chain.gap_minutes / 60:.1f}h" if chain.gap_minutes > 0 else f"-> {chain.next}"
+            lines.append(f"  chain {chain.start:%Y-%m-%d %H:%M} - {chain.end:%Y-%m-%d %H:%M}: {chain.shifts} shifts "
+                         f"{chain.first} ... {chain.last}, {handover}")
+        return "\n".join(lines)
+
+    def cells(self, shifts: pd.DataFrame) -> set[tuple[str, str]]:
+        """(agent, schedule column) of every double-booked shift, shifts is the converted long schedule"""
+        if not len(self.overlaps):
+            return set()
+        booked = pd.concat([self.overlaps[["agent", "start"]],
+                            self.overlaps[["agent", "other_start"]].rename(columns={"other_start": "start"})])
+        found = shifts[["agent", "shift", "start"]].merge(booked.drop_duplicates(), on=["agent", "start"])
+        return set(zip(found["agent"], found["shift"]))
+
+    def uncovered(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Which of the [start, end) intervals, ex: the schedule columns, touch an uncovered interval"""
+        gap_starts, gap_ends = merge_intervals(to_seconds(self.gaps["start"]), to_seconds(self.gaps["end"]))
+        starts, ends = to_seconds(starts), to_seconds(ends)
+        before = np.searchsorted(gap_starts, ends, side="left") - 1
+        return (before >= 0) & (gap_ends[np.maximum(before, 0)] > starts)
+
+
+def analyze(timeline: Timeline, services: pd.DataFrame, period: tuple[int, int] | None = None) -> CoverageReport:
+    """
+    Sweeps the timeline against the service windows, every step is a sort or a binary search over numpy arrays
+    Shift times are wall-clock times like the service windows, see convert_shift_datetimes(local=True).
+    period (epoch seconds) clips the service windows, by default to the days of the shifts
+    """
+    if period is None:
+        period = schedule_period(timeline)
+    services = services.dropna(subset=["start", "end"])
+    window_starts = to_seconds(services["start"])
+    window_ends = to_seconds(services["end"])
+    if period is not None:
+        window_starts = np.maximum(window_starts, period[0])
+        window_ends = np.minimum(window_ends, period[1])
+    service_names = services["service"].astype(str).to_numpy()
+    block_starts, block_ends = merge_intervals(timeline.starts, timeline.ends)
+
+    gaps = []
+    for service in pd.unique(service_names):
+        starts, ends = merge_intervals(window_starts[service_names == service], window_ends[service_names == service])
+        _, part_starts, part_ends = subtract_intervals(starts, ends, block_starts, block_ends)
+        gaps.append(pd.DataFrame({"service": service, "start": to_dates(part_starts), "end": to_dates(part_ends),
+                                  "minutes": (part_ends - part_starts) / 60}))
+    gaps_frame = pd.concat(gaps, ignore_index=True) if gaps else \
+        pd.DataFrame(columns=["service", "start", "end", "minutes"])
+
+    positions, others = double_bookings(timeline.agent_ids, timeline.starts, timeline.ends)
+    names = np.asarray(timeline.names, dtype=object)
+    overlaps = pd.DataFrame({
+        "agent": names[timeline.agent_ids[positions]],
+        "start": to_dates(timeline.starts[positions]),
+        "end": to_dates(timeline.ends[positions]),
+        "other_start": to_dates(timeline.starts[others]),
+        "other_end": to_dates(timeline.ends[others]),
+    })
+    return CoverageReport(gaps_frame.sort_values(["start", "service"], kind="stable").reset_index(drop=True),
+                          overlaps, handover_chains(timeline))
@@ -0,0 +1,117 @@
+import logging
+import sys
+from typing import Iterable, Mapping
+
+from constants import baltic_char_map
+
+logger = logging.getLogger(__name__)
+
+# Built once, str.translate then replaces every character of a name in a single pass
+BALTIC_TABLE = str.maketrans(baltic_char_map)
+
+
+def normalize(text: str | None) -> str:
+    """Display name without Baltic diacritics, ex: Jānis Bērziņš -> Janis Berzins"""
+    if not text:
+        return ""
+    return text.translate(BALTIC_TABLE)
+
+
+def recipient_addresses(item) -> set[str]:
+    """Lowercase SMTP addresses of the recipients of an Outlook item"""
+    addresses = set()
+    for recipient in item.Recipients:
+        address = recipient.Address or ""
+        if "@" not in address:
+            # Exchange users are addressed by an X.500 path, the SMTP address is on the Exchange user
+            user = recipient.AddressEntry.GetExchangeUser()
+            address = "" if user is None else user.PrimarySmtpAddress or ""
+        if address:
+            addresses.add(address.lower())
+    return addresses
+
+
+class Employee:
+    __slots__ = ("name", "email", "display_name")
+
+    def __init__(self, name: str, email: str, display_name: str):
+        self.name = name
+        self.email = email
+        # Normalized, as the attendee shows up in RequiredAttendees after normalize
+        self.display_name = display_name
+
+    @property
+    def key(self) -> str:
+        return self.email.lower()
+
+    def __repr__(self) -> str:
+        return f"{self.name} - {self.email}"
+
+
+class EmployeeDirectory:
+    """
+    Schedule name -> email -> display name of every EMP_ entry in the config, built once per run
+    EMP_Name1 = name1.surname1 gives name1.surname1@EMAIL_DOMAIN shown as Name1 Surname1.
+    Attendees are matched by SMTP address, display names only resolve attendee lists that carry no address.
+    """
+
+    def __init__(self, employees: Iterable[Employee], domain: str | None):
+        self.domain = domain
+        self.by_name: dict[str, Employee] = {}
+        self.by_key: dict[str, Employee] = {}
+        self.by_display_name: dict[str, Employee] = {}
+        for employee in employees:
+            self.by_name[employee.name] = employee
+            self.by_key[employee.key] = employee
+            self.by_display_name.setdefault(employee.display_name, employee)
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, str | None]) -> "EmployeeDirectory":
+        domain = config.get("EMAIL_DOMAIN")
+        employees = [Employee(key[len("EMP_"):], f"{user}@{domain}", normalize(" ".join(user.split(".")).title()))
+                     for key, user in config.items() if key.startswith("EMP_") and user]
+        return cls(employees, domain)
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def problems(self, names: Iterable[str]) -> list[str]:
+        """Everything missing in the config for names, empty when they can all be scheduled"""
+        problems = []
+        if self.domain is None:
+            problems.append("EMAIL_DOMAIN keyword not found in config")
+        unknown = sorted({name for name in names if name not in self.by_name})
+        if unknown:
+            problems.append(f"Employee keywords not found in config: {', '.join(f'EMP_{name}' for name in unknown)}")
+        return problems
+
+    def validate(self, names: Iterable[str]):
+        """Reports every unknown employee at once and exits, before anything is sent"""
+        problems = self.problems(names)
+        for problem in problems:
+            logger.error(problem)
+        if problems:
+            sys.exit(1)
+
+    def get(self, name: str) -> Employee:
+        if self.domain is None or name not in self.by_name:
+            self.validate([name])
+        return self.by_name[name]
+
+    def email(self, name: str) -> str:
+        return self.get(name).email
+
+    def display_name(self, name: str) -> str:
+        return self.get(name).display_name
+
+    def attendee_key(self, attendee: str) -> str:
+        """Index key of one RequiredAttendees entry: the lowercase address when known, else the normalized name"""
+        attendee = normalize(attendee).strip()
+        if "@" in attendee:
+            return attendee.lower()
+        employee = self.by_display_name.get(attendee)
+        return attendee if employee is None else employee.key
+
+    def resolve(self, attendee: str) -> Employee | None:
+        """Employee behind an attendee key, address or display name"""
+        return self.by_key.get(self.attendee_key(attendee))
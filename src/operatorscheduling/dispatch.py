@@ -0,0 +1,51 @@
+import itertools
+import logging
+from typing import Callable
+
+from writer import AppointmentSpec, OutlookWriter, WriteResult, WriteSummary
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS = ("agent", "round-robin")
+
+
+class Dispatcher:
+    """
+    Spreads appointments over one OutlookWriter per sender mailbox
+    "agent" sends all appointments of an agent from one mailbox, agents are dealt out in turn,
+    "round-robin" deals out single appointments
+    The shift store remembers the mailbox of every appointment, so later updates find it either way
+    Each writer has its own thread, Outlook connection and rate limit, results are merged into one summary
+    """
+
+    def __init__(self, mailboxes: list[str], connect: Callable[[str], object],
+                 partition: str = "agent",
+                 on_flush: Callable[[list[WriteResult]], None] | None = None,
+                 **writer_options):
+        if not mailboxes:
+            raise ValueError("At least one mailbox is needed to send reminders")
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition {partition}, expected one of {PARTITIONS}")
+        self.partition = partition
+        self.writers = [
+            OutlookWriter(lambda mailbox=mailbox: connect(mailbox), on_flush=on_flush, mailbox=mailbox, **writer_options)
+            for mailbox in mailboxes
+        ]
+        self.turn = itertools.cycle(self.writers)
+        self.agent_writers: dict[str, OutlookWriter] = {}
+
+    def pick(self, spec: AppointmentSpec) -> OutlookWriter:
+        if self.partition == "round-robin":
+            return next(self.turn)
+        if spec.email not in self.agent_writers:
+            self.agent_writers[spec.email] = next(self.turn)
+        return self.agent_writers[spec.email]
+
+    def submit(self, spec: AppointmentSpec):
+        self.pick(spec).submit(spec)
+
+    def close(self) -> WriteSummary:
+        summary = WriteSummary()
+        for writer in self.writers:
+            summary.merge(writer.close())
+        return summary
@@ -0,0 +1,540 @@
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable
+
+from com_retry import hresult
+
+logger = logging.getLogger(__name__)
+
+RPC_E_CALL_REJECTED = hresult(0x80010001)
+RPC_E_SERVERCALL_RETRYLATER = hresult(0x8001010A)
+MAPI_E_NOT_FOUND = hresult(0x8004010F)
+E_INVALIDARG = hresult(0x80070057)
+
+# Date format of the Restrict filters, see calendar_snapshot.make_restriction
+FILTER_DATE_FORMATS = ("%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M %p", "%m/%d/%Y")
+CLAUSE = re.compile(r"^\s*\[(\w+)\]\s*(>=|<=|<>|=|>|<)\s*'([^']*)'\s*$")
+OPERATORS: dict[str, Callable[[object, object], bool]] = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+}
+
+
+class FakeComError(Exception):
+    """Shaped like pywintypes.com_error: (hresult, message, excepinfo, argerror), classified by com_retry"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(code, message, None, None)
+        self.hresult = code
+
+
+def display_name(address: str) -> str:
+    """How the fake address book shows an SMTP address, ex: name1.surname1@x.com -> Name1 Surname1"""
+    return " ".join(address.partition("@")[0].split(".")).title()
+
+
+def parse_filter(text: str) -> list[tuple[str, Callable[[object, object], bool], object]]:
+    """[Property] op 'value' clauses joined by AND, the subset of the Outlook filter syntax this tool writes"""
+    clauses = []
+    for clause in re.split(r"\s+AND\s+", text.strip(), flags=re.IGNORECASE):
+        match = CLAUSE.match(clause)
+        if match is None:
+            raise FakeComError(E_INVALIDARG, f"Cannot parse the condition: {clause}")
+        prop, operator, value = match.groups()
+        if prop in ("Start", "End"):
+            value = parse_filter_date(value)
+        clauses.append((prop, OPERATORS[operator], value))
+    return clauses
+
+
+def parse_filter_date(value: str) -> datetime:
+    for date_format in FILTER_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise FakeComError(E_INVALIDARG, f"Cannot parse the date: {value}")
+
+
+class FakeOutlook:
+    """
+    In-memory stand-in for the Outlook.Application COM object, for runs and benchmarks without Outlook
+    Models what this tool calls: stores, calendar folders, Items.Add/Restrict, GetTable, Save/Send/Delete,
+    Recipients, RequiredAttendees and recurring appointments with their occurrences.
+    Every COM call can be slowed down by latency seconds (± jitter) and fails with probability fault_rate
+    (a transient RPC error) or throttle_rate (server busy), so the retries of com_retry are exercised too. Shared by all threads like a real Outlook session.
+    """
+
+    def __init__(self, stores: Iterable[str] = (), latency: float = 0.0, jitter: float = 0.0,
+                 fault_rate: float = 0.0, throttle_rate: float = 0.0, seed: int | None = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.sleep = sleep
+        self.rng = random.Random(seed)
+        self.configure(latency, jitter, fault_rate, throttle_rate)
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.calls: Counter = Counter()
+        self.faults: Counter = Counter()
+        self.Session = FakeNamespace(self)
+        for name in stores:
+            self.Session.add_store(name)
+
+    def configure(self, latency: float = 0.0, jitter: float = 0.0, fault_rate: float = 0.0,
+                  throttle_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.throttle_rate = throttle_rate
+
+    def call(self, name: str):
+        """Bookkeeping of one COM call: counted, delayed, maybe failed"""
+        with self.lock:
+            self.calls[name] += 1
+            delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            draw = self.rng.random() if self.fault_rate or self.throttle_rate else 1.0
+        if delay > 0:
+            self.sleep(delay)
+        if draw < self.throttle_rate:
+            with self.lock:
+                self.faults[name] += 1
+            raise FakeComError(RPC_E_SERVERCALL_RETRYLATER, "The server is busy")
+        if draw < self.throttle_rate + self.fault_rate:
+            with self.lock:
+                self.faults[name] += 1
+            raise FakeComError(RPC_E_CALL_REJECTED, "Call was rejected by callee")
+
+    def new_id(self) -> str:
+        with self.lock:
+            return f"{next(self.ids):016X}"
+
+    def GetNamespace(self, name: str) -> "FakeNamespace":
+        self.call("GetNamespace")
+        return self.Session
+
+    def items(self) -> list["FakeAppointment"]:
+        """Every saved appointment in every store"""
+        with self.lock:
+            return [item for store in self.Session.store_list for folder in store.folders.values()
+                    for item in folder.saved.values()]
+
+    def report(self) -> str:
+        calls = ", ".join(f"{name}={count}" for name, count in sorted(self.calls.items()))
+        faults = sum(self.faults.values())
+        return f"{sum(self.calls.values())} calls ({calls}), {faults} injected faults"
+
+
+class FakeNamespace:
+
+    def __init__(self, outlook: FakeOutlook):
+        self.outlook = outlook
+        self.store_list: list[FakeStore] = []
+
+    @property
+    def Stores(self) -> "FakeCollection":
+        self.outlook.call("Stores")
+        return FakeCollection(self.store_list)
+
+    def add_store(self, name: str) -> "FakeStore":
+        with self.outlook.lock:
+            for store in self.store_list:
+                if store.DisplayName == name:
+                    return store
+            store = FakeStore(self.outlook, name)
+            self.store_list.append(store)
+            return store
+
+    def GetItemFromID(self, entry_id: str, store_id: str | None = None) -> "FakeAppointment":
+        self.outlook.call("GetItemFromID")
+        with self.outlook.lock:
+            for store in self.store_list:
+                if store_id is not None and store.StoreID != store_id:
+                    continue
+                for folder in store.folders.values():
+                    if entry_id in folder.saved:
+                        return folder.saved[entry_id]
+        raise FakeComError(MAPI_E_NOT_FOUND, f"The item {entry_id} was not found")
+
+
+class FakeCollection:
+    """A COM collection: iterable, Count and 1 based Item()"""
+
+    def __init__(self, values: list):
+        self.values = values
+
+    def __iter__(self):
+        return iter(list(self.values))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def Count(self) -> int:
+        return len(self.values)
+
+    def Item(self, index: int | str):
+        if isinstance(index, str):
+            for value in self.values:
+                if getattr(value, "DisplayName", None) == index:
+                    return value
+            raise FakeComError(MAPI_E_NOT_FOUND, f"{index} not found")
+        return self.values[index - 1]
+
+
+class FakeStore:
+
+    def __init__(self, outlook: FakeOutlook, name: str):
+        self.outlook = outlook
+        self.DisplayName = name
+        self.StoreID = f"STORE-{outlook.new_id()}"
+        self.folders: dict[int, FakeFolder] = {}
+
+    def __repr__(self) -> str:
+        return self.DisplayName
+
+    def GetDefaultFolder(self, folder_type: int) -> "FakeFolder":
+        self.outlook.call("GetDefaultFolder")
+        with self.outlook.lock:
+            if folder_type not in self.folders:
+                self.folders[folder_type] = FakeFolder(self.outlook, self, folder_type)
+            return self.folders[folder_type]
+
+
+class FakeFolder:
+
+    def __init__(self, outlook: FakeOutlook, store: FakeStore, folder_type: int):
+        self.outlook = outlook
+        self.store = store
+        self.folder_type = folder_type
+        self.saved: dict[str, FakeAppointment] = {}
+
+    @property
+    def StoreID(self) -> str:
+        return self.store.StoreID
+
+    @property
+    def Items(self) -> "FakeItems":
+        return FakeItems(self, None)
+
+    def GetTable(self, restriction: str = "", table_type: int = 0) -> "FakeTable":
+        self.outlook.call("GetTable")
+        return FakeTable(self.outlook, FakeItems(self, restriction).matching())
+
+
+class FakeItems:
+    """Folder.Items, or the result of Restrict on it"""
+
+    def __init__(self, folder: FakeFolder, restriction: str | None):
+        self.folder = folder
+        self.restriction = restriction
+        self.IncludeRecurrences = False
+
+    def matching(self) -> list["FakeAppointment"]:
+        with self.folder.outlook.lock:
+            items = list(self.folder.saved.values())
+        if not self.restriction:
+            return items
+        clauses = parse_filter(self.restriction)
+        return [item for item in items
+                if all(compare(getattr(item, prop, None), value) for prop, compare, value in clauses)]
+
+    def __iter__(self):
+        return iter(self.matching())
+
+    def __len__(self) -> int:
+        return len(self.matching())
+
+    @property
+    def Count(self) -> int:
+        return len(self)
+
+    def Restrict(self, restriction: str) -> "FakeItems":
+        self.folder.outlook.call("Restrict")
+        if self.restriction:
+            restriction = f"{self.restriction} AND {restriction}"
+        parse_filter(restriction)
+        return FakeItems(self.folder, restriction)
+
+    def Add(self, item_type: int = 1) -> "FakeAppointment":
+        self.folder.outlook.call("Items.Add")
+        return FakeAppointment(self.folder)
+
+
+class FakeColumns:
+
+    def __init__(self):
+        self.names: list[str] = []
+
+    def RemoveAll(self):
+        self.names = []
+
+    def Add(self, name: str):
+        self.names.append(name)
+
+
+class FakeTable:
+
+    def __init__(self, outlook: FakeOutlook, items: list["FakeAppointment"]):
+        self.outlook = outlook
+        self.items = items
+        self.position = 0
+        self.Columns = FakeColumns()
+
+    def GetRowCount(self) -> int:
+        return len(self.items) - self.position
+
+    def GetArray(self, rows: int) -> tuple[tuple, ...]:
+        self.outlook.call("GetArray")
+        batch = self.items[self.position:self.position + rows]
+        self.position += len(batch)
+        return tuple(tuple(getattr(item, column) for column in self.Columns.names) for item in batch)
+
+
+class FakeExchangeUser:
+
+    def __init__(self, address: str):
+        self.PrimarySmtpAddress = address
+
+
+class FakeAddressEntry:
+
+    def __init__(self, address: str):
+        self.Address = address
+
+    def GetExchangeUser(self) -> FakeExchangeUser | None:
+        # Only Exchange users have one, SMTP recipients are addressed directly
+        return None if "@" in self.Address else FakeExchangeUser(self.Address)
+
+
+class FakeRecipient:
+
+    def __init__(self, address: str):
+        self.Address = address
+        self.Name = display_name(address)
+        self.AddressEntry = FakeAddressEntry(address)
+
+
+class FakeRecipients:
+
+    def __init__(self, outlook: FakeOutlook):
+        self.outlook = outlook
+        self.recipients: list[FakeRecipient] = []
+
+    def __iter__(self):
+        return iter(list(self.recipients))
+
+    def __len__(self) -> int:
+        return len(self.recipients)
+
+    @property
+    def Count(self) -> int:
+        return len(self.recipients)
+
+    def Add(self, address: str) -> FakeRecipient:
+        self.outlook.call("Recipients.Add")
+        recipient = FakeRecipient(address)
+        self.recipients.append(recipient)
+        return recipient
+
+
+class FakeAppointment:
+    """An AppointmentItem, it gets its EntryID and shows up in the folder once saved"""
+
+    def __init__(self, folder: FakeFolder):
+        self.folder = folder
+        self.EntryID = ""
+        self.Subject = ""
+        self.Location = ""
+        self.Body = ""
+        self.Start: datetime | None = None
+        self.End: datetime | None = None
+        self.MeetingStatus = 0
+        self.BusyStatus = 2
+        self.ReminderMinutesBeforeStart = 15
+        self.Recipients = FakeRecipients(folder.outlook)
+        self.sent = 0
+        self.IsRecurring = False
+        self.pattern: FakeRecurrencePattern | None = None
+        # Occurrences of a series changed or deleted on their own, by day
+        self.exceptions: dict[date, FakeOccurrence] = {}
+        self.deleted: set[date] = set()
+
+    def __repr__(self) -> str:
+        return f"{self.Subject} - {self.Start} - {self.End} - {self.RequiredAttendees}"
+
+    @property
+    def RequiredAttendees(self) -> str:
+        return "; ".join(recipient.Name for recipient in self.Recipients)
+
+    def Save(self):
+        outlook = self.folder.outlook
+        outlook.call("Save")
+        with outlook.lock:
+            if not self.EntryID:
+                self.EntryID = f"{self.folder.StoreID}-{outlook.new_id()}"
+            self.folder.saved[self.EntryID] = self
+
+    def Send(self):
+        self.folder.outlook.call("Send")
+        if not self.EntryID:
+            raise FakeComError(E_INVALIDARG, "The item must be saved before it is sent")
+        self.sent += 1
+
+    def Delete(self):
+        outlook = self.folder.outlook
+        outlook.call("Delete")
+        with outlook.lock:
+            if self.folder.saved.pop(self.EntryID, None) is None:
+                raise FakeComError(MAPI_E_NOT_FOUND, f"The item {self.EntryID} was already deleted")
+
+    def GetRecurrencePattern(self) -> "FakeRecurrencePattern":
+        self.folder.outlook.call("GetRecurrencePattern")
+        if self.pattern is None:
+            self.pattern = FakeRecurrencePattern()
+            self.IsRecurring = True
+        return self.pattern
+
+    def GetOccurrence(self, start: datetime) -> "FakeOccurrence":
+        """The occurrence starting at start, Outlook fails when the series has none then"""
+        self.folder.outlook.call("GetOccurrence")
+        day = start.date()
+        if self.pattern is None or not self.pattern.occurs(day) or day in self.deleted \
+                or start.time() != self.pattern.StartTime.time():
+            raise FakeComError(MAPI_E_NOT_FOUND, f"The series {self.EntryID} has no occurrence at {start}")
+        if day in self.exceptions:
+            return self.exceptions[day]
+        return FakeOccurrence(self, start, start + timedelta(minutes=self.pattern.Duration))
+
+    def occurrences(self) -> list["FakeOccurrence"]:
+        """Every occurrence left in the series, the changed ones as they were saved"""
+        if self.pattern is None:
+            return []
+        first = self.pattern.PatternStartDate
+        starts = [datetime.combine(first.date() + timedelta(days=offset), self.pattern.StartTime.time())
+                  for offset in range((self.pattern.PatternEndDate - first).days + 1)]
+        duration = timedelta(minutes=self.pattern.Duration)
+        return [self.exceptions.get(start.date()) or FakeOccurrence(self, start, start + duration)
+                for start in starts if self.pattern.occurs(start.date()) and start.date() not in self.deleted]
+
+
+class FakeRecurrencePattern:
+    """RecurrencePattern of a series, only daily (0) and weekly (1) patterns"""
+
+    def __init__(self):
+        self.RecurrenceType = 0
+        self.Interval = 1
+        # OlDaysOfWeek: olSunday = 1, olMonday = 2 ... olSaturday = 64
+        self.DayOfWeekMask = 0
+        self.PatternStartDate: datetime | None = None
+        self.PatternEndDate: datetime | None = None
+        self.StartTime: datetime | None = None
+        self.Duration = 0
+
+    def occurs(self, day: date) -> bool:
+        first, last = self.PatternStartDate.date(), self.PatternEndDate.date()
+        if not first <= day <= last:
+            return False
+        if self.RecurrenceType == 0:
+            return (day - first).days % self.Interval == 0
+        # Weeks counted from the Monday of the first week, see recurrence.candidates about Sunday
+        weeks = ((day - timedelta(days=day.weekday())) - (first - timedelta(days=first.weekday()))).days // 7
+        return bool(self.DayOfWeekMask & 1 << ((day.weekday() + 1) % 7)) and weeks % self.Interval == 0
+
+
+class FakeOccurrence:
+    """One occurrence of a series: saving it makes it an exception, deleting it removes that day"""
+
+    def __init__(self, master: FakeAppointment, start: datetime, end: datetime):
+        self.master = master
+        self.Parent = master
+        self.EntryID = master.EntryID
+        self.Subject = master.Subject
+        self.Body = master.Body
+        self.Start = start
+        self.End = end
+        self.sent = 0
+
+    def __repr__(self) -> str:
+        return f"{self.Subject} - {self.Start} - {self.End} - {self.master.RequiredAttendees}"
+
+    def Save(self):
+        outlook = self.master.folder.outlook
+        outlook.call("Save")
+        with outlook.lock:
+            self.master.exceptions[self.Start.date()] = self
+
+    def Send(self):
+        self.master.folder.outlook.call("Send")
+        self.sent += 1
+
+    def Delete(self):
+        outlook = self.master.folder.outlook
+        outlook.call("Delete")
+        with outlook.lock:
+            day = self.Start.date()
+            if day in self.master.deleted:
+                raise FakeComError(MAPI_E_NOT_FOUND, f"The occurrence {self.Start} was already deleted")
+            self.master.exceptions.pop(day, None)
+            self.master.deleted.add(day)
+
+
+_application: FakeOutlook | None = None
+_selected = False
+_lock = threading.Lock()
+
+
+def setup(stores: Iterable[str] = (), **options) -> FakeOutlook:
+    """
+    Selects the fake for every later dispatch in this process and applies the latency/fault options
+    The stores and items of an earlier run in the same process are kept, like a running Outlook keeps them
+    """
+    global _application, _selected
+    with _lock:
+        if _application is None:
+            _application = FakeOutlook(**options)
+        else:
+            _application.configure(**options)
+        app = _application
+        if not _selected:
+            logger.info("Using the in-memory fake Outlook")
+        _selected = True
+    for name in stores:
+        app.Session.add_store(name)
+    return app
+
+
+def reset():
+    """Forgets the shared fake and its items"""
+    global _application, _selected
+    with _lock:
+        _application = None
+        _selected = False
+
+
+def selected() -> bool:
+    return _selected
+
+
+def current() -> FakeOutlook | None:
+    """The shared fake without counting a Dispatch, None before the first use"""
+    return _application
+
+
+def application() -> FakeOutlook:
+    """The shared fake, every connection of a run sees the same stores and items"""
+    global _application
+    with _lock:
+        if _application is None:
+            _application = FakeOutlook()
+        app = _application
+    app.call("Dispatch")
+    return app
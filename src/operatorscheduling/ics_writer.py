@@ -0,0 +1,341 @@
+import glob
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import pytz
+
+from directory import normalize
+from shift_store import make_shift_key
+from writer import AppointmentSpec, WriteResult, WriteSummary
+
+logger = logging.getLogger(__name__)
+
+PRODID = "-//operatorscheduling//Shift reminders//EN"
+# Content hash of the exported appointment, tells an unchanged event from an updated one on the next export
+HASH_PROPERTY = "X-OPERATORSCHEDULING-HASH"
+
+
+def make_uid(spec: AppointmentSpec, tz: pytz.BaseTzInfo | None = None) -> str:
+    """
+    Same shift, same UID: importing a newer export updates the event instead of adding a second one
+    With tz the key is the start as the COM writer gets it, the wall-clock time plus its UTC offset
+    """
+    start = spec.start if tz is None else spec.start + utc_offset(spec.start, tz)
+    return f"{hashlib.sha1(make_shift_key(spec.email, start).encode('utf-8')).hexdigest()}@operatorscheduling"
+
+
+def escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def format_date(date: datetime) -> str:
+    # Floating local time
+    return date.isoformat(timespec="seconds").replace("-", "").replace(":", "")
+
+
+def utc_offset(local: datetime, tz: pytz.BaseTzInfo) -> timedelta:
+    # Same choice as main.utc_offsets: standard time for ambiguous and missing times
+    return tz.localize(local, is_dst=False).utcoffset()
+
+
+def format_utc(local: datetime, tz: pytz.BaseTzInfo) -> str:
+    return (local - utc_offset(local, tz)).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold(line: str) -> str:
+    """Splits lines longer than 75 octets as RFC 5545 requires, never inside a UTF-8 character"""
+    if len(line) <= 75 and line.isascii():
+        return line
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    start, limit = 0, 75
+    while start < len(encoded):
+        stop = min(start + limit, len(encoded))
+        # Continuation bytes are 10xxxxxx, step back to the start of the character
+        while stop < len(encoded) and encoded[stop] & 0xC0 == 0x80:
+            stop -= 1
+        parts.append(encoded[start:stop].decode("utf-8"))
+        start, limit = stop, 74
+    return "\r\n ".join(parts)
+
+
+def unfold(text: str) -> str:
+    """Joins folded lines, text read with universal newlines"""
+    if "\n " in text or "\n\t" in text:
+        return text.replace("\n ", "").replace("\n\t", "")
+    return text
+
+
+def agent_filename(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", normalize(name)).strip("_") + ".ics"
+
+
+class ExportedEvent:
+    """A VEVENT of an earlier export, its property lines are only split when the event is written again"""
+    __slots__ = ("uid", "sequence", "content_hash", "cancelled", "text")
+
+    def __init__(self, text: str):
+        self.text = text
+        # text starts with the UID line, none of these properties is repeated in the VALARM
+        self.uid = self.value("UID") or ""
+        self.sequence = int(self.value("SEQUENCE") or 0)
+        self.content_hash = self.value(HASH_PROPERTY)
+        self.cancelled = self.value("STATUS") == "CANCELLED"
+
+    def value(self, name: str) -> str | None:
+        if self.text.startswith(f"{name}:"):
+            start = len(name) + 1
+        else:
+            start = self.text.find(f"\n{name}:")
+            if start < 0:
+                return None
+            start += len(name) + 2
+        return self.text[start:self.text.find("\n", start)]
+
+    @property
+    def lines(self) -> list[str]:
+        return self.text.rstrip("\n").split("\n")
+
+    def cancelled_copy(self, stamp: str) -> list[str]:
+        """The event as a cancellation, one sequence number above the exported version"""
+        lines = []
+        for line in self.lines:
+            name = line.partition(":")[0].partition(";")[0]
+            if name in ("DTSTAMP", "SEQUENCE", "STATUS"):
+                continue
+            lines.append(line)
+            if name == "UID":
+                lines += [f"DTSTAMP:{stamp}", f"SEQUENCE:{self.sequence + 1}", "STATUS:CANCELLED"]
+        return lines
+
+
+def read_exported(path: str) -> dict[str, ExportedEvent]:
+    """Events of an earlier export by UID, empty when the file is missing or was not written by this tool"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = unfold(f.read())
+    except FileNotFoundError:
+        return {}
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning(f"Could not read the earlier export {path}: {e}")
+        return {}
+    if f"\nPRODID:{PRODID}\n" not in text:
+        logger.warning(f"{path} was not exported by this tool, it is replaced without cancelling its events")
+        return {}
+    events = {}
+    for block in text.split("\nBEGIN:VEVENT\n")[1:]:
+        event = ExportedEvent(block.partition("\nEND:VEVENT\n")[0] + "\n")
+        events[event.uid] = event
+    return events
+
+
+class IcsFile:
+    """
+    One export file, written to a temporary file next to it and renamed on commit
+    Events of the earlier version are looked up by UID to carry the SEQUENCE forward
+    """
+
+    def __init__(self, path: str, dry_run: bool = False):
+        self.path = path
+        self.previous = read_exported(path)
+        self.written: set[str] = set()
+        self.cancelled = 0
+        self.events = 0
+        self.temporary = f"{path}.{os.getpid()}.tmp"
+        self.file = None
+        if not dry_run:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.temporary, "w", encoding="utf-8", newline="")
+            self.file.write(f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{PRODID}\r\nCALSCALE:GREGORIAN\r\n"
+                            f"METHOD:PUBLISH\r\n")
+
+    def sequence(self, uid: str, content_hash: str, cancelled: bool = False) -> int:
+        """Kept for an unchanged event, one higher when the event changed since the earlier export"""
+        previous = self.previous.get(uid)
+        if previous is None:
+            return 0
+        if previous.cancelled != cancelled or (not cancelled and previous.content_hash != content_hash):
+            return previous.sequence + 1
+        return previous.sequence
+
+    def write_event(self, text: str, uid: str):
+        self.written.add(uid)
+        self.events += 1
+        if self.file is not None:
+            self.file.write(text)
+
+    def write_lines(self, lines: list[str], uid: str):
+        self.write_event("BEGIN:VEVENT\r\n" + "".join(fold(line) + "\r\n" for line in lines) + "END:VEVENT\r\n", uid)
+
+    def finish(self, stamp: str, cancel_missing: bool):
+        """Events of the earlier export that were not written again: cancelled, or kept as they were"""
+        for uid, event in self.previous.items():
+            if uid in self.written:
+                continue
+            if cancel_missing and not event.cancelled:
+                self.write_lines(event.cancelled_copy(stamp), uid)
+                self.cancelled += 1
+            else:
+                self.write_lines(event.lines, uid)
+
+    def commit(self):
+        if self.file is None:
+            return
+        self.file.write("END:VCALENDAR\r\n")
+        self.file.close()
+        os.replace(self.temporary, self.path)
+
+    def discard(self):
+        if self.file is None:
+            return
+        self.file.close()
+        try:
+            os.remove(self.temporary)
+        except OSError:
+            pass
+
+
+class IcsWriter:
+    """
+    Delivery backend that exports the appointments to RFC 5545 files instead of writing them through Outlook
+    Needs neither Windows nor Outlook. Every shift gets a stable UID, so importing a newer export updates
+    the events, changed events get a higher SEQUENCE. path is one file, or with per_agent a folder
+    with one file per agent.
+    cancel_missing: events of the earlier export that this export does not contain are written again
+    as cancellations, only right when the export covers the whole schedule. Otherwise they are kept as they were.
+    time_zone is the TIMEZONE of the schedule: the spec times are its wall-clock times, see
+    main.convert_shift_datetimes(local=True), and the events get them in UTC. Without it the spec times
+    are written as floating local times.
+    Files are replaced once close() is called, a stopped export leaves the earlier files untouched.
+    """
+
+    def __init__(self, path: str,
+                 per_agent: bool = False,
+                 organizer: str | None = None,
+                 cancel_missing: bool = False,
+                 dry_run: bool = False,
+                 on_result: Callable[[WriteResult], None] | None = None,
+                 stop: threading.Event | None = None,
+                 time_zone: str | None = None):
+        self.path = path
+        self.time_zone = pytz.timezone(time_zone) if time_zone else None
+        self.per_agent = per_agent
+        self.organizer = organizer
+        self.cancel_missing = cancel_missing
+        self.dry_run = dry_run
+        self.on_result = on_result
+        self.stop = stop
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.files: dict[str, IcsFile] = {}
+        # Titles, bodies and attendees repeat across thousands of shifts, each line is escaped and folded once
+        self.lines: dict[tuple, str] = {}
+        self.summary = WriteSummary()
+        self.started: float | None = None
+
+    def file_for(self, spec: AppointmentSpec) -> IcsFile:
+        path = os.path.join(self.path, agent_filename(spec.name)) if self.per_agent else self.path
+        if path not in self.files:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.files[path] = IcsFile(path, self.dry_run)
+        return self.files[path]
+
+    def line(self, name: str, value: str) -> str:
+        key = (name, value)
+        line = self.lines.get(key)
+        if line is None:
+            line = self.lines[key] = fold(f"{name}:{escape(value)}")
+        return line
+
+    def attendee(self, spec: AppointmentSpec) -> str:
+        key = ("ATTENDEE", spec.attendee, spec.email)
+        line = self.lines.get(key)
+        if line is None:
+            # Parameter values are quoted, a display name may contain , or ;
+            name = spec.attendee.replace('"', "")
+            line = self.lines[key] = fold(f'ATTENDEE;CN="{name}";ROLE=REQ-PARTICIPANT:mailto:{spec.email}')
+        return line
+
+    def alarm(self, spec: AppointmentSpec) -> str:
+        if not spec.reminder_minutes:
+            return ""
+        key = ("VALARM", spec.subject, spec.reminder_minutes)
+        alarm = self.lines.get(key)
+        if alarm is None:
+            alarm = self.lines[key] = (f"BEGIN:VALARM\r\nACTION:DISPLAY\r\n{self.line('DESCRIPTION', spec.subject)}\r\n"
+                                       f"TRIGGER:-PT{spec.reminder_minutes}M\r\nEND:VALARM\r\n")
+        return alarm
+
+    def format_date(self, value: datetime) -> str:
+        return format_date(value) if self.time_zone is None else format_utc(value, self.time_zone)
+
+    def event(self, spec: AppointmentSpec, uid: str, sequence: int, status: str) -> str:
+        organizer = f"ORGANIZER:mailto:{self.organizer}\r\n" if self.organizer else ""
+        transparency = "TRANSPARENT" if spec.busy_status == 0 else "OPAQUE"
+        return (f"BEGIN:VEVENT\r\nUID:{uid}\r\nDTSTAMP:{self.stamp}\r\n"
+                f"DTSTART:{self.format_date(spec.start)}\r\nDTEND:{self.format_date(spec.end)}\r\n"
+                f"SEQUENCE:{sequence}\r\nSTATUS:{status}\r\n"
+                f"{self.line('SUMMARY', spec.subject)}\r\n"
+                f"{self.line('LOCATION', spec.location)}\r\n"
+                f"{self.line('DESCRIPTION', spec.body)}\r\n"
+                f"{organizer}{self.attendee(spec)}\r\n"
+                f"TRANSP:{transparency}\r\n{HASH_PROPERTY}:{spec.content_hash}\r\n"
+                f"{self.alarm(spec)}END:VEVENT\r\n")
+
+    def add(self, spec: AppointmentSpec, status: str):
+        uid = make_uid(spec, self.time_zone)
+        try:
+            ics = self.file_for(spec)
+            sequence = ics.sequence(uid, spec.content_hash, cancelled=status == "CANCELLED")
+            ics.write_event(self.event(spec, uid, sequence, status), uid)
+            result = WriteResult(spec, entry_id=uid, mailbox=self.organizer)
+        except Exception as e:
+            logger.error(f"Exporting appointment {spec} failed: {e}")
+            result = WriteResult(spec, error=e, mailbox=self.organizer)
+        self.summary.add(result)
+        if self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logger.error(f"Checkpointing appointment {spec} failed: {e}")
+
+    def submit(self, spec: AppointmentSpec):
+        self.add(spec, "CONFIRMED")
+
+    def cancel(self, spec: AppointmentSpec):
+        """Exports the shift as a cancelled event with the UID it was exported under"""
+        self.add(spec, "CANCELLED")
+
+    def close(self) -> WriteSummary:
+        stopped = self.stop is not None and self.stop.is_set()
+        if self.per_agent and self.cancel_missing and not stopped:
+            # Agents gone from the schedule still have a file from the earlier export
+            for path in glob.glob(os.path.join(glob.escape(self.path), "*.ics")):
+                if path not in self.files:
+                    self.files[path] = IcsFile(path, self.dry_run)
+        for ics in self.files.values():
+            if stopped:
+                ics.discard()
+                continue
+            ics.finish(self.stamp, self.cancel_missing)
+            ics.commit()
+            self.summary.counters["ics.events"] += ics.events
+            self.summary.counters["ics.cancelled_removed"] += ics.cancelled
+        if stopped:
+            logger.info(f"Run stopped, {len(self.files)} export files left as they were")
+        else:
+            self.summary.counters["ics.files"] += len(self.files)
+        if self.started is not None:
+            self.summary.elapsed = time.monotonic() - self.started
+        return self.summary
@@ -0,0 +1,144 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import ContextManager, Iterator
+
+# Upper bounds of the COM call latency buckets in milliseconds, slower calls land in the last open bucket
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Shared by every span of a run without metrics, disabled instrumentation allocates nothing
+NO_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    """Latency distribution of one COM call in fixed buckets, percentiles are bucket upper bounds"""
+    __slots__ = ("buckets", "count", "total", "max", "failures")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.failures = 0
+
+    def add(self, ms: float, ok: bool = True):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.failures += not ok
+
+    def percentile(self, fraction: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": {(f"<={bound}" if index < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]}"): count
+                        for index, (bound, count) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), self.buckets))
+                        if count},
+        }
+
+
+class Metrics:
+    """
+    Phase timings, counters and COM call latencies of one run
+    Shared by the main thread and the Outlook writer threads. A run without --metrics passes None instead,
+    span() then hands out NO_SPAN and ComCaller skips the timing altogether.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.phase_counts: Counter = Counter()
+        self.counters: Counter = Counter()
+        self.calls: dict[str, Histogram] = {}
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Adds the time spent in the block to phase name, a phase entered twice sums up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+                self.phase_counts[name] += 1
+
+    def observe(self, name: str, seconds: float, ok: bool = True):
+        """One attempt of the COM call name"""
+        with self.lock:
+            histogram = self.calls.get(name)
+            if histogram is None:
+                histogram = self.calls[name] = Histogram()
+            histogram.add(seconds * 1000, ok)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                "started": self.started.isoformat(timespec="seconds"),
+                "elapsed_ms": round((time.perf_counter() - self.start) * 1000, 3),
+                "phases_ms": {name: round(ms, 3) for name, ms in self.phases.items()},
+                "phase_counts": dict(self.phase_counts),
+                "counters": dict(sorted(self.counters.items())),
+                "com_calls": {name: histogram.to_dict() for name, histogram in sorted(self.calls.items())},
+            }
+
+    def write(self, path: str, **extra):
+        """Writes the report as JSON, replacing path only once the file is complete"""
+        report = self.report()
+        report.update(extra)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, default=str)
+        os.replace(temporary, path)
+
+    def summary(self) -> str:
+        """A few lines for the log and the GUI"""
+        with self.lock:
+            phases = ", ".join(f"{name} {ms / 1000:.2f}s" for name, ms in self.phases.items())
+            calls = sorted(self.calls.items(), key=lambda item: item[1].total, reverse=True)
+            slowest = ", ".join(f"{name} x{histogram.count} {histogram.total / histogram.count:.1f}ms"
+                                for name, histogram in calls[:4])
+            total = sum(histogram.count for histogram in self.calls.values())
+        lines = [f"Phases: {phases or '-'}", f"Outlook calls: {total}" + (f" ({slowest})" if slowest else "")]
+        scanned = {name: value for name, value in self.counters.items() if name.endswith((".scanned", ".matched"))}
+        if scanned:
+            lines.append("Items: " + ", ".join(f"{name}={value}" for name, value in sorted(scanned.items())))
+        return "\n".join(lines)
+
+
+def span(metrics: Metrics | None, name: str) -> ContextManager:
+    return NO_SPAN if metrics is None else metrics.span(name)
+
+
+def count(metrics: Metrics | None, name: str, n: int = 1):
+    if metrics is not None:
+        metrics.count(name, n)
@@ -1,12 +1,23 @@
-import csv
-import sys
 import os
-import subprocess
+import queue
+import threading
 import tkinter as tk
 import tksheet
 from tkinter import ttk
 import customtkinter as ctk
 
+from store_cache import StoreCache, discover_stores
+from writer import co_initialize, co_uninitialize
+
+# Shown until the Outlook stores are known
+LOOKING_FOR_MAILBOXES = "Looking for mailboxes..."
+
+
+def preload_api():
+    # pandas and the scheduling code load while the user picks the files, api is imported on first use otherwise
+    import api
+
+
 class App(ctk.CTk):
 
     def __init__(self):
@@ -15,14 +26,25 @@ class App(ctk.CTk):
         self.schedule_file = ctk.StringVar(value="No Schedule File selected")
         self.wg_schedule_file= ctk.StringVar(value="No Working Group File selected")
         self.send_meeting: bool = False
-        self.selected_row = None
-        self.selected_column = None
-        self.available_emails = self.get_all_emails_on_pc()
+        self.selected_agents: list[str] = []
+        self.selected_dates: list[str] = []
+        self.schedule_path: str | None = None
+        self.service_path: str | None = None
+        self.schedule = None
+        self.services = None
+        self.scheduler = None
+        self.job = None
+        self.progress = ctk.StringVar(value="")
+        self.statistics = ctk.StringVar(value="")
+        self.show_statistics = ctk.BooleanVar(value=False)
+        self.store_cache = StoreCache()
+        self.store_updates: queue.Queue = queue.Queue()
+        self.available_emails, stores_fresh = self.store_cache.load()
 
         self.geometry("800x800")
         self.title("Working schedule reminder maker")
 
-        self.email_field = ctk.CTkOptionMenu(self, values=self.available_emails)
+        self.email_field = ctk.CTkOptionMenu(self, values=self.available_emails or [LOOKING_FOR_MAILBOXES])
         self.email_field.pack()
 
         self.schedule_select_button = ctk.CTkButton(self, text="Select Schedule File", command=lambda: self.select_file("schedule_file"))
@@ -43,87 +65,187 @@ class App(ctk.CTk):
         self.table_frame = ctk.CTkFrame(self)
         self.table_frame.pack(fill="both", expand=False, padx=10, pady=10)
 
-        self.tree = None
+        # One sheet for every loaded schedule, created with the first one
+        self.sheet = None
+        self.pages = None
+        self.page = 0
+        self.page_text = ctk.StringVar(value="")
+        # Coverage overlay: double-booked (agent, column) cells and columns touching an uncovered interval
+        self.coverage_cells: set[tuple[str, str]] = set()
+        self.coverage_columns: set[str] = set()
+
+        self.page_frame = ctk.CTkFrame(self)
+        self.page_frame.pack(pady=5)
+        self.previous_button = ctk.CTkButton(self.page_frame, text="<", width=30, command=lambda: self.show_page(self.page - 1))
+        self.previous_button.pack(side="left", padx=5)
+        self.page_label = ctk.CTkLabel(self.page_frame, textvariable=self.page_text)
+        self.page_label.pack(side="left", padx=5)
+        self.next_button = ctk.CTkButton(self.page_frame, text=">", width=30, command=lambda: self.show_page(self.page + 1))
+        self.next_button.pack(side="left", padx=5)
+
+        self.check_button = ctk.CTkButton(self, text="Check coverage", command=self.check_coverage)
+        self.check_button.pack(pady=5)
 
         self.run_button = ctk.CTkButton(self, text="Run", command=self.run_program)
         self.run_button.pack()
 
-    def get_all_emails_on_pc(self):
-        import win32com.client
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        session = outlook.Session
-
-        stores = []
-        for st in session.Stores:
-            stores.append(st.DisplayName)
-        return stores
+        self.cancel_button = ctk.CTkButton(self, text="Cancel", command=self.cancel_program, state="disabled")
+        self.cancel_button.pack(pady=5)
+
+        self.progress_label = ctk.CTkLabel(self, textvariable=self.progress, text_color="white")
+        self.progress_label.pack(padx=10)
+
+        self.statistics_checkbox = ctk.CTkCheckBox(self, text="Show Outlook call statistics", variable=self.show_statistics)
+        self.statistics_checkbox.pack(pady=5)
+        self.statistics_label = ctk.CTkLabel(self, textvariable=self.statistics, text_color="white", justify="left")
+        self.statistics_label.pack(padx=10)
+
+        # Outlook and pandas are only touched once the window is drawn
+        self.after_idle(lambda: self.start_background_work(discover=not stores_fresh))
+
+    def start_background_work(self, discover: bool):
+        threading.Thread(target=preload_api, name="preload", daemon=True).start()
+        if discover:
+            threading.Thread(target=self.discover_stores, name="store-discovery", daemon=True).start()
+            self.after(200, self.poll_stores)
+
+    def discover_stores(self):
+        co_initialize()
+        try:
+            self.store_updates.put(discover_stores())
+        except Exception as e:
+            self.store_updates.put(e)
+        finally:
+            co_uninitialize()
+
+    def poll_stores(self):
+        try:
+            stores = self.store_updates.get_nowait()
+        except queue.Empty:
+            self.after(200, self.poll_stores)
+            return
+        if isinstance(stores, Exception):
+            print(f"Could not read the Outlook mailboxes: {stores}")
+            if not self.available_emails:
+                self.progress.set("Outlook mailboxes not found, is Outlook installed?")
+            return
+        self.store_cache.save(stores)
+        self.available_emails = stores
+        self.email_field.configure(values=stores)
+        if self.email_field.get() not in stores and stores:
+            self.email_field.set(stores[0])
+
+    def get_scheduler(self):
+        if self.scheduler is None:
+            import api
+            self.scheduler = api.SchedulingService()
+        return self.scheduler
 
     def run_program(self):
+        import api
+
+        if self.get_scheduler().busy:
+            print("A run is already in progress")
+            return
+        if self.schedule_path is None or self.service_path is None:
+            self.progress.set("Select the schedule and working group files first")
+            return
+        if self.email_field.get() not in self.available_emails:
+            self.progress.set("Wait for the Outlook mailboxes to load")
+            return
 
         value = self.send_or_cancel.get()
-        send = "False"
-        cancel="False"
-
-        if value == "SEND":
-            send="True"
-
-        if value == "CANCEL":
-            cancel="True"
-            
-        if self.selected_row:
-            print(f"Running for specified agent: {self.selected_row}")
-            subprocess.run([
-                    sys.executable,
-                    "src/operatorscheduling/main.py",
-                    "--input", self.schedule_file.get(),
-                    "--service", self.wg_schedule_file.get(),
-                    "--agent", self.selected_row,
-                    "--email", self.email_field.get(),
-                    "--send", send,
-                    "--cancel", cancel
-                    ])
-        elif self.selected_column:
-            print(f"Running for specified date: {self.selected_column}")
-            subprocess.run([
-                    sys.executable,
-                    "src/operatorscheduling/main.py",
-                    "--input", self.schedule_file.get(),
-                    "--service", self.wg_schedule_file.get(),
-                    "--date", self.selected_column,
-                    "--email", self.email_field.get(),
-                    "--send", send,
-                    "--cancel", cancel
-                    ])
-        elif not self.selected_row and not self.selected_column:
+        options = {
+            "input": self.schedule_path,
+            "service": self.service_path,
+            "email": [self.email_field.get()],
+            "send": value == "SEND",
+            "cancel": value == "CANCEL",
+            "metrics": self.show_statistics.get(),
+        }
+        # Selected rows and columns run together in one job: the selected agents on the selected dates
+        if self.selected_agents:
+            print(f"Running for specified agents: {self.selected_agents}")
+            options["agent"] = self.selected_agents
+        if self.selected_dates:
+            print(f"Running for specified dates: {self.selected_dates}")
+            options["date"] = self.selected_dates
+        if not self.selected_agents and not self.selected_dates:
             print("No agent or date selected, running for whole time period")
-            subprocess.run([
-                    sys.executable,
-                    "src/operatorscheduling/main.py",
-                    "--input", self.schedule_file.get(),
-                    "--service", self.wg_schedule_file.get(),
-                    "--email", self.email_field.get(),
-                    "--send", send,
-                    "--cancel", cancel
-                    ])
-        else:
-            print("No matching case for run found")
+
+        if self.services is None:
+            self.services = api.read_services(self.service_path)
+        self.job = self.get_scheduler().submit(api.make_args(**options), self.schedule, self.services)
+        self.run_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.progress.set("Starting")
+        self.statistics.set("")
+        self.after(100, self.poll_progress)
+
+    def poll_progress(self):
+        finished = False
+        while True:
+            try:
+                progress = self.job.events.get_nowait()
+            except queue.Empty:
+                break
+            self.progress.set(str(progress))
+            finished = progress.finished
+        if self.job.metrics is not None:
+            self.statistics.set(self.job.metrics.summary())
+        if finished:
+            self.run_button.configure(state="normal")
+            self.cancel_button.configure(state="disabled")
+            return
+        self.after(100, self.poll_progress)
+
+    def check_coverage(self):
+        import api
+
+        if self.schedule is None or self.service_path is None:
+            self.progress.set("Select the schedule and working group files first")
+            return
+        if self.services is None:
+            self.services = api.read_services(self.service_path)
+        try:
+            report, self.coverage_cells, self.coverage_columns = api.check_coverage(
+                self.schedule, self.services, self.pages.headers[1:])
+        except SystemExit:
+            # FORMAT or TIMEZONE missing in the config, logged by main
+            self.progress.set("Coverage check stopped, see the log for details")
+            return
+        print(report)
+        self.progress.set(str(report).splitlines()[0])
+        self.show_coverage()
+
+    def show_coverage(self):
+        """Highlights the overlay on the rows of the shown page"""
+        self.sheet.dehighlight_all()
+        columns = {header: column for column, header in enumerate(self.pages.headers)}
+        if self.coverage_columns:
+            self.sheet.highlight_columns(columns=[columns[header] for header in self.coverage_columns], bg="#7a4a00")
+        first_row, last_row = self.pages.bounds(self.page)
+        rows = {self.pages.agent(row): row - first_row for row in range(first_row, last_row)}
+        for agent, header in self.coverage_cells:
+            if agent in rows and header in columns:
+                self.sheet.highlight_cells(row=rows[agent], column=columns[header], bg="#8b0000", fg="white")
+
+    def cancel_program(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.progress.set("Cancelling after the current shift")
 
     def on_selection(self, event=None):
         selected_rows = self.sheet.get_selected_rows()
         selected_columns = self.sheet.get_selected_columns()
 
-        print(selected_rows)
-        print(selected_columns)
-        if selected_rows:
-            self.selected_row = self.rows[selected_rows.pop()][0]
-            self.selected_column = None
-            print(f"Row selected: {self.selected_row}")
-            print(f"Column selected: {self.selected_column}")
-        if selected_columns:
-            self.selected_row = None
-            self.selected_column = self.headers[selected_columns.pop()]
-            print(f"Column selected: {self.selected_column}")
-            print(f"Row selected: {self.selected_row}")
+        # Sheet rows are numbered within the shown page
+        first_row, _ = self.pages.bounds(self.page)
+        self.selected_agents = [self.pages.agent(first_row + row) for row in sorted(selected_rows)]
+        # Column 0 holds the agent names, not a date
+        self.selected_dates = [self.pages.headers[column] for column in sorted(selected_columns) if column > 0]
+        print(f"Rows selected: {self.selected_agents}")
+        print(f"Columns selected: {self.selected_dates}")
 
     def select_file(self, attr):
         print(f"File {attr} selection")
@@ -141,40 +263,60 @@ class App(ctk.CTk):
 
 
         if attr == "schedule_file":
+            self.schedule_path = file_path
             self.load_csv(file_path)
+        else:
+            self.service_path = file_path
+            self.services = None
 
     def load_csv(self, file_path):
-
-        if self.tree:
-            self.tree.destroy()
-
-        with open(file_path, newline="", encoding="utf-8") as f:
-            reader = csv.reader(f, delimiter=";")
-            self.headers = next(reader)
-            self.rows = list(reader)
-        
-        self.sheet = tksheet.Sheet(self.table_frame)
-        self.sheet.pack(fill="both", expand=True)
-
-        self.sheet.headers(self.headers)
-        self.sheet.set_sheet_data(self.rows)
-
-        self.sheet.enable_bindings(
-            "single_select",
-            "row_select",
-            "column_select",
-            "arrowkeys",
-            "column_width_resize",
-            "rc_delete_column",
-            "delete"
-            )
-        self.sheet.bind("<<SheetSelect>>", self.on_selection)
-        
+        import api
+        from schedule_pages import SchedulePages
+
+        # Read once, the grid pages through the same frame the runs use
+        wide = api.read_wide_schedule(file_path)
+        self.schedule = api.melt_schedule(wide)
+        self.pages = SchedulePages(wide)
+        self.coverage_cells = set()
+        self.coverage_columns = set()
+
+        if self.sheet is None:
+            self.sheet = tksheet.Sheet(self.table_frame)
+            self.sheet.pack(fill="both", expand=True)
+            self.sheet.enable_bindings(
+                "single_select",
+                "ctrl_select",
+                "drag_select",
+                "row_select",
+                "column_select",
+                "arrowkeys",
+                "column_width_resize",
+                "rc_delete_column",
+                "delete"
+                )
+            self.sheet.bind("<<SheetSelect>>", self.on_selection)
+
+        self.sheet.headers(self.pages.headers)
+        self.show_page(0, new_file=True)
+
+    def show_page(self, page, new_file=False):
+        if self.pages is None or not 0 <= page < self.pages.pages:
+            return
+        self.page = page
+        # A selection only covers the rows on screen
+        self.selected_agents = []
+        self.selected_dates = []
+        self.sheet.deselect()
+        self.sheet.set_sheet_data(self.pages.rows(page), reset_col_positions=new_file)
+        self.page_text.set(self.pages.describe(page))
+        self.show_coverage()
 
 
 if __name__ == "__main__":
     app = App()
     app.mainloop()
+    if app.scheduler is not None:
+        app.scheduler.shutdown()
 
 
 
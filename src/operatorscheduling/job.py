@@ -0,0 +1,68 @@
+import queue
+import threading
+
+
+class Progress:
+    """One progress message of a running job, read by the GUI from Job.events"""
+    __slots__ = ("done", "total", "failed", "finished", "error")
+
+    def __init__(self, done: int, total: int, failed: int, finished: bool = False, error: str | None = None):
+        self.done = done
+        self.total = total
+        self.failed = failed
+        self.finished = finished
+        self.error = error
+
+    def __str__(self) -> str:
+        text = f"{self.done}/{self.total} shifts done, {self.failed} failed"
+        if self.error:
+            text += f" - {self.error}"
+        elif self.finished:
+            text += " - finished"
+        return text
+
+
+class Job:
+    """
+    Progress and cancellation of one scheduling run
+    The worker reports through start/advance/finish, any other thread reads Progress messages from events
+    and can ask the run to stop with cancel(). Cancelling stops between shifts, nothing is undone.
+    """
+
+    def __init__(self):
+        self.events: queue.Queue[Progress] = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.finished = False
+        # Metrics of the run when it measures itself, main sets it before the first shift
+        self.metrics = None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def start(self, total: int):
+        """Adds total shifts to the job, a run sending and cancelling calls it twice"""
+        with self.lock:
+            self.total += total
+            self.events.put(Progress(self.done, self.total, self.failed))
+
+    def advance(self, ok: bool = True):
+        # Called from the Outlook writer threads as well
+        with self.lock:
+            self.done += 1
+            self.failed += not ok
+            self.events.put(Progress(self.done, self.total, self.failed))
+
+    def finish(self, error: str | None = None):
+        with self.lock:
+            self.finished = True
+            if error is None and self.cancelled:
+                error = "cancelled"
+            self.events.put(Progress(self.done, self.total, self.failed, finished=True, error=error))
@@ -1,61 +1,104 @@
 import argparse
+import copy
+import functools
 import sys
 import logging
 from typing import Optional
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
 import os
-
-from constants import baltic_char_map
+import time
+
+from com_retry import ComCaller
+from coverage_check import CoverageReport, analyze, shift_timeline
+from calendar_snapshot import CalendarEntry, CalendarSnapshot, make_restriction, to_naive
+from directory import Employee, EmployeeDirectory, recipient_addresses
+from dispatch import PARTITIONS, Dispatcher
+import fake_outlook
+from ics_writer import IcsWriter
+from instrumentation import Metrics, count, span
+from job import Job
+from parse_cache import CACHE_DIR, MAX_BYTES, ParseCache
+from reconcile import apply_plan, make_plan
+from recurrence import SeriesSpec, collapse, shift_specs
+from run_journal import RunJournal
+from service_index import ServiceIndex
+from settings import Settings
+from shift_store import ShiftStore, content_hash
+from timeline import Shift, Timeline
+from watch import FileWatcher, diff_cells
+from writer import BACKENDS, AppointmentSpec, Delivery, WriteResult, create_item, discard_unsent
 from dotenv import dotenv_values
-if os.name != 'posix':
-    import win32com.client
-else:
-    from unittest.mock import MagicMock
-    class win32:
-        def __init__(self):
-            self.client = client
 
-    class client:
-        def __init__(self):
-            self.app = None
-            pass
 
-        @staticmethod
-        def Dispatch(args):
-            return app()
-    
-    class app:
+def dispatch_outlook():
+    # No Outlook off Windows, the in-memory fake stands in
+    if os.name == 'posix' or fake_outlook.selected():
+        return fake_outlook.application()
+    # win32com loads the COM runtime, only runs that talk to Outlook pay for the import
+    from win32com.client import Dispatch
+    return Dispatch("Outlook.Application")
 
-        def __init__(self):
-            pass
 
-        @staticmethod
-        def GetNamespace(args):
-            return namespace_mock()
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+config = dotenv_values(".env")
+if not config:
+    config = dotenv_values("env")
+# Set by main(), a debug run prepares the reminders without sending or cancelling them
+debug = False
 
-        @staticmethod
-        def CreateItem(args):
-            return MagicMock()
 
+@functools.cache
+def get_settings() -> Settings:
+    """The config of the working folder, read once per process"""
+    return Settings(config)
 
-    class namespace_mock:
-        def __init__(self):
-            pass
 
-        @staticmethod
-        def GetDefaultFolder(args):
-            return MagicMock()
+def get_time_settings(settings: Settings | None = None) -> tuple[str, str]:
+    return (settings or get_settings()).time_settings()
 
-    win32com = win32()
 
+def get_directory(settings: Settings | None = None) -> EmployeeDirectory:
+    """EMP_ entries of settings, by default of the working folder config"""
+    return (settings or get_settings()).directory
 
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
-config = dotenv_values(".env")
-if not config:
-    config = dotenv_values("env")
+
+def convert_shift_datetimes(shifts: pd.DataFrame, settings: Settings | None = None,
+                            local: bool = False) -> pd.DataFrame:
+    """
+    Parses every shift_start/shift_end cell of the long schedule frame at once
+    Adds "start" and "end" columns, shifted by the UTC offset of TIMEZONE like Operator did per date
+    local keeps the wall-clock times of the schedule instead, ex: to compare them with the service timeline
+    settings is the config of a batch team, by default the .env of the working folder is used
+    """
+    FORMAT, TIMEZONE = get_time_settings(settings)
+    timezone = pytz.timezone(TIMEZONE)
+
+    start = pd.to_datetime(shifts["shift_start"], format=FORMAT)
+    end = pd.to_datetime(shifts["shift_end"], format=FORMAT)
+    # Night shifts, ex: 22:00-06:00 end on the next day
+    end = end.mask(end <= start, end + pd.Timedelta(days=1))
+
+    shifts = shifts.copy()
+    shifts["start"] = start if local else start + utc_offsets(start, timezone)
+    shifts["end"] = end if local else end + utc_offsets(end, timezone)
+    return shifts
+
+
+def utc_offsets(dates: pd.Series, timezone: pytz.BaseTzInfo) -> pd.Series:
+    # Same choice as pytz localize(is_dst=False): ambiguous autumn times use standard time
+    # and the missing spring hour gets the offset in effect right before the switch
+    localized = dates.dt.tz_localize(timezone,
+                                     ambiguous=np.zeros(len(dates), dtype=bool),
+                                     nonexistent="shift_backward")
+    return localized.dt.tz_localize(None) - localized.dt.tz_convert("UTC").dt.tz_localize(None)
+
+
+def to_datetime_list(dates: pd.Series) -> list[datetime]:
+    return dates.to_numpy(dtype="datetime64[us]").tolist()
 
 
 class Operator:
@@ -63,45 +106,30 @@ class Operator:
     def __init__(self, name: str, operator_dates: list[str]):
         self.name: str = name
         self.email: str = self.create_email_from_name(name)
-        self.operator_dates: list[datetime] = self.__convert_to_datetimes(operator_dates)
+        self.operator_dates: list[datetime]
+        self.operator_end_dates: list[datetime]
+        self.operator_dates, self.operator_end_dates = self.__convert_to_datetimes(operator_dates)
+
+    @classmethod
+    def from_shifts(cls, name: str, start_dates: list[datetime], end_dates: list[datetime],
+                    settings: Settings | None = None) -> "Operator":
+        """Creates an operator from shift dates that were already converted with convert_shift_datetimes"""
+        operator = cls.__new__(cls)
+        operator.name = name
+        operator.email = get_directory(settings).email(name)
+        operator.operator_dates = start_dates
+        operator.operator_end_dates = end_dates
+        return operator
 
     def create_email_from_name(self, name: str) -> str:
-        EMAIL_DOMAIN = config.get('EMAIL_DOMAIN', None)
-        employee = config.get(f'EMP_{name}', None)
-        if EMAIL_DOMAIN is None:
-            logger.error("EMAIL_DOMAIN keyword not found in config")            
-            sys.exit(1)
-        if employee is None:
-            logger.error(f"Employee keyword: EMP_{name} not found in config")            
-            sys.exit(1)
+        return get_directory().email(name)
 
-        return f"{employee}@{EMAIL_DOMAIN}"
-
-    def __convert_to_datetimes(self, operator_dates: list[str]) -> list[datetime]:
+    def __convert_to_datetimes(self, operator_dates: list[str]) -> tuple[list[datetime], list[datetime]]:
         # Telia date format: 08.08.2025 15:00-22:00 -> dd.mm.YYYY HH:MM-HH:MM
-
-        converted_list: list[datetime] = []
-        FORMAT = config.get("FORMAT", None)
-        TIMEZONE = config.get("TIMEZONE", None)
         if not isinstance(operator_dates, list):
             operator_dates = [operator_dates]
-        removed_time_range_date = [date.split("-")[0] for date in operator_dates]
-
-        if FORMAT is None:
-            logger.error("FORMAT keyword not found in config")            
-            sys.exit(1)
-        if TIMEZONE is None:
-            logger.error("TIMEZONE keyword not found in config")            
-            sys.exit(1)
-
-        timezone = pytz.timezone(TIMEZONE)
-        for date in removed_time_range_date:
-            date = datetime.strptime(date, FORMAT)
-            timedelta_offset = timezone.localize(date).utcoffset()
-            new_date = date + timedelta_offset
-            converted_list.append(new_date)
-
-        return converted_list
+        converted = convert_shift_datetimes(split_shift_cells(pd.Series(operator_dates, dtype=object)))
+        return to_datetime_list(converted["start"]), to_datetime_list(converted["end"])
 
     def __str__(self):
         return f"{self.name} - {self.email}"
@@ -110,155 +138,406 @@ class Operator:
         return f"{self.name} - {self.email}\n"
 
 
-def get_next_operator(operator_timeline: list[tuple[str, str, datetime]], index: int):
+def get_next_operator(operator_timeline: Timeline, index: int) -> Shift | None:
     try:
-        return operator_timeline[index]
+        return operator_timeline.next_operator(index)
     except IndexError:
         return None
 
 
 class MeetingManager:
 
-    def __init__(self, from_email):
-        try:
-            self.outlook = win32com.client.Dispatch("Outlook.Application")
-            self.namespace = self.outlook.GetNamespace("MAPI")
-        except:
-            self.outlook = None
-            self.namespace = None
-        
-        self.store = self.get_email(from_email)
+    def __init__(self, from_email, shift_store: ShiftStore | None = None, com: ComCaller | None = None,
+                 directory: EmployeeDirectory | None = None, connect: bool = True,
+                 metrics: Metrics | None = None):
+        # Every Outlook call goes through self.com: retries busy/throttled calls and counts them
+        self.metrics = metrics
+        self.com: ComCaller = com if com is not None else ComCaller(metrics=metrics)
+        # Without connect only the appointments are prepared, ex: for the iCalendar export
+        self.outlook = self.namespace = self.store = None
+        if connect:
+            try:
+                self.outlook = self.com.call("Dispatch", dispatch_outlook)
+                self.namespace = self.com.call("GetNamespace", self.outlook.GetNamespace, "MAPI")
+            except Exception as e:
+                logger.error(f"Could not connect to Outlook: {e}")
+                raise
+
+        self.mailbox: str = from_email
+        if connect:
+            self.store = self.get_email(from_email)
+        self.store_ids: dict[str, str] = {}
         self.location: str = "At work/Home"
         self.subject: str = "Upcomming shift"
         self.body: str = ""
         self.list_of_dates: list[datetime] = []
+        self.snapshot: CalendarSnapshot | None = None
+        self.shift_store: ShiftStore | None = shift_store
+        self.service_index: ServiceIndex | None = None
+        self.service_index_source: pd.DataFrame | None = None
+        self.directory: EmployeeDirectory = directory if directory is not None else get_directory()
 
     def get_email(self, email):
 
         session = self.outlook.Session
 
         store = None
-        for st in session.Stores:
-            print(st, email)
+        # Reading Stores is the COM call, it has to happen inside the retry
+        for st in self.com.call("Stores", lambda: list(session.Stores)):
             if st.DisplayName == email:
                 store=st
                 break   
-        store_folder = store.GetDefaultFolder(9)
+        if store is None:
+            logger.error(f"No Outlook store found for {email}")
+            sys.exit(1)
+        store_folder = self.com.call("GetDefaultFolder", store.GetDefaultFolder, 9)
         
         return store_folder
 
-    def make_meeting_title(self, service: pd.DataFrame, operator: tuple[str, str, datetime]) -> str:
-        _, _, date = operator
-        services = service.query("@date >= start and @date <= end")
-        service_prefix = "/".join(services["service"].tolist())
-        if not services["service"].tolist():
-            return "Upcomming shift"
-        return f"[{service_prefix}] Upcomming shift"
+    def load_snapshot(self, operator_timeline: Timeline):
+        """
+        Reads every shift appointment around the timeline with one calendar query
+        cancel_meeting and find_meetings then look meetings up in memory
+        """
+        span = operator_timeline.span()
+        if span is None:
+            self.snapshot = CalendarSnapshot([], self.directory.attendee_key, self.subject)
+            return
+        start_date, end_date = span
+        self.load_snapshot_between(start_date - timedelta(days=1), end_date + timedelta(days=1))
+
+    def load_snapshot_between(self, start_date: datetime, end_date: datetime):
+        self.snapshot = self.com.call("CalendarSnapshot", CalendarSnapshot.load,
+                                              self.store,
+                                              start_date,
+                                              end_date,
+                                              self.directory.attendee_key,
+                                              self.subject)
+        count(self.metrics, "snapshot.shifts", len(self.snapshot))
+
+    def resolve_mailboxes(self, mailboxes: list[str]):
+        """Looks the sender mailboxes up once on this thread, an unknown one stops the run before anything is sent"""
+        for mailbox in mailboxes:
+            if mailbox != self.mailbox and mailbox not in self.store_ids:
+                self.store_ids[mailbox] = self.get_email(mailbox).StoreID
+
+    def get_item(self, entry_id: str, mailbox: str | None = None):
+        if mailbox is None or mailbox == self.mailbox:
+            return self.com.call("GetItemFromID", self.namespace.GetItemFromID, entry_id, self.store.StoreID)
+        if mailbox not in self.store_ids:
+            self.store_ids[mailbox] = self.get_email(mailbox).StoreID
+        return self.com.call("GetItemFromID", self.namespace.GetItemFromID, entry_id, self.store_ids[mailbox])
+
+    def own_entries(self, entries: list[CalendarEntry]) -> list[CalendarEntry]:
+        """Entries sent from this mailbox, like the Restrict fallback only sees its own calendar"""
+        return [entry for entry in entries if entry.mailbox in (None, self.mailbox)]
+
+    def open_meeting(self, entry: CalendarEntry):
+        """
+        Opens the appointment by EntryID, when the id is stale falls back to searching the calendar
+        A stale id is dropped from the shift store, the caller records the item that was found instead
+        """
+        try:
+            return self.get_item(entry.entry_id, entry.mailbox)
+        except Exception as e:
+            logger.warning(f"Meeting {entry} not found by EntryID ({e}), searching the calendar")
+        if self.shift_store is not None:
+            self.shift_store.forget(entry.entry_id)
+        employee = next(filter(None, map(self.directory.resolve, entry.recipients)), None)
+        if employee is None:
+            logger.warning(f"Meeting {entry} has no known attendee to search the calendar for")
+            return None
+        for item in self.find_meetings(employee, entry.start):
+            if to_naive(item.Start) == entry.start:
+                return item
+        logger.warning(f"Meeting {entry} not found in the calendar")
+        return None
 
-    def check_for_existing_shift(self, operator: tuple[str, str, datetime]):
-        name, email, date = operator
+    def record_results(self, results: list[WriteResult]):
+        """
+        Stores the EntryIDs of sent appointments, called from the writer thread once per batch
+        A recurring appointment is stored as its shifts, all with the EntryID of the series
+        """
+        if self.shift_store is None:
+            return
+        self.shift_store.record_many([
+            (spec.email, spec.attendee, spec.start, spec.end, spec.subject, result.entry_id, spec.content_hash,
+             result.mailbox or self.mailbox, isinstance(result.spec, SeriesSpec))
+            for result in results if result.ok and result.entry_id for spec in shift_specs(result.spec)])
+
+    def open_occurrence(self, entry: CalendarEntry) -> tuple[object | None, object | None]:
+        """
+        Opens the recurring appointment of entry and the occurrence of its shift
+        Returns None for what no longer exists, its shifts are dropped from the shift store
+        """
+        try:
+            master = self.get_item(entry.entry_id, entry.mailbox)
+        except Exception as e:
+            logger.warning(f"Recurring meeting {entry} not found by EntryID ({e})")
+            self.shift_store.forget(entry.entry_id)
+            return None, None
+        try:
+            return master, self.com.call("GetOccurrence", master.GetOccurrence, entry.start)
+        except Exception as e:
+            logger.warning(f"Occurrence {entry} not found in its series ({e})")
+            self.shift_store.forget_occurrence(entry.entry_id, entry.start)
+            return master, None
+
+    def get_service_index(self, service: pd.DataFrame) -> ServiceIndex:
+        # Built once per service timeline, the DataFrame is not modified after loading
+        if self.service_index is None or self.service_index_source is not service:
+            self.service_index = ServiceIndex(service)
+            self.service_index_source = service
+        return self.service_index
+
+    def make_meeting_title(self, service: pd.DataFrame, operator: Shift) -> str:
+        return self.get_service_index(service).titles(np.array([operator.start], dtype="datetime64[ns]"))[0]
+
+    def make_meeting_titles(self, service: pd.DataFrame, operator_timeline: Timeline) -> list[str]:
+        """Titles for every shift of the timeline in one lookup, in timeline order"""
+        return self.get_service_index(service).titles(operator_timeline.start_dates())
+
+    def make_body(self, next_operator: Shift | None) -> str:
+        next_name = "TBD" if next_operator is None else next_operator.name
+        return self.body + f"Next operator -> {next_name}"
+
+    def with_directory(self, directory: EmployeeDirectory) -> "MeetingManager":
+        """The same Outlook session for the employees of another team, see batch.py"""
+        manager = copy.copy(self)
+        manager.directory = directory
+        manager.snapshot = None
+        return manager
+
+    def attendee(self, name: str) -> Employee:
+        return self.directory.get(name)
+
+    def attendee_name(self, name: str) -> str:
+        """Schedule name -> name as Outlook shows it in RequiredAttendees, ex: EMP_Name1 = name1.surname1 -> Name1 Surname1"""
+        return self.directory.display_name(name)
+
+    def is_attendee(self, item, employee: Employee) -> bool:
+        """Matches the SMTP addresses of the item recipients, not the display names"""
+        return employee.key in self.com.call("Recipients", recipient_addresses, item)
+
+    def check_for_existing_shift(self, operator: Shift):
+        date = operator.start
         default_calendar = self.store.Items
         default_calendar.IncludeRecurrences = False
         start_date = date-timedelta(days=1)
         end_date = date+timedelta(days=1)
-        restriction = f"[Start] >= '{start_date.strftime('%m/%d/%Y %H:%M')}' AND [End] <= '{end_date.strftime('%m/%d/%Y %H:%M')}'"
-        matching_items = default_calendar.Restrict(restriction)
+        matching_items = self.com.call("Restrict", default_calendar.Restrict, make_restriction(start_date, end_date))
 
         return matching_items
 
 
-    def create_appointment(self,
-                           operator: tuple[str, str, datetime],
-                           services: pd.DataFrame,
-                           next_operator: tuple[str, str, datetime] | None,
-                           specific_date: datetime | None = None):
-        name, email, date = operator
-        if next_operator is None:
-            next_name, next_mail, next_date = "TBD", "TBD", "TBD"
-        else:
-            next_name, next_mail, next_date = next_operator
+    def build_spec(self,
+                   operator: Shift,
+                   services: pd.DataFrame,
+                   next_operator: Shift | None,
+                   specific_date: datetime | None = None,
+                   subject: str | None = None) -> AppointmentSpec:
+        """subject is the title when it was looked up already, see make_meeting_titles"""
+        name, email, date, end_date = operator
         
         if specific_date is not None:
+            end_date = specific_date + (end_date - date)
             date = specific_date
-        
-        self.appointment = self.store.Items.Add()
-        self.appointment.MeetingStatus = 1
-        self.appointment.Subject = self.make_meeting_title(services, operator)
-        self.appointment.Location = self.location
-        self.appointment.Body = self.body + f"Next operator -> {next_name}"
-        self.appointment.Start = date
-        self.appointment.End = date + timedelta(hours=8)
-        self.appointment.Recipients.Add(email)
-        self.appointment.BusyStatus = 0
-        self.appointment.ReminderMinutesBeforeStart = 24 * 60
-        logger.info(f"Appointment created {self.appointment.Subject} - {self.appointment.Start} - {self.appointment.End} - {name}")
+
+        if subject is None:
+            subject = self.make_meeting_title(services, operator)
+        body = self.make_body(next_operator)
+        return AppointmentSpec(name, email, self.attendee_name(name), subject, self.location, body,
+                               date, end_date, content_hash(subject, date, end_date, body))
+
+    def create_appointment(self,
+                           operator: Shift,
+                           services: pd.DataFrame,
+                           next_operator: Shift | None,
+                           specific_date: datetime | None = None):
+        spec = self.build_spec(operator, services, next_operator, specific_date)
+        self.appointment_spec = spec
+        self.appointment = self.com.call("Items.Add", create_item, self.store.Items, spec)
+        logger.info(f"Appointment created {self.appointment.Subject} - {self.appointment.Start} - {self.appointment.End} - {spec.name}")
 
     def send_appointment(self):
-        self.appointment.Save()
-        self.appointment.Send()
+        self.com.call("Save", self.appointment.Save)
+        try:
+            self.com.call("Send", self.appointment.Send)
+        except Exception:
+            discard_unsent(self.com, self.appointment, self.appointment_spec)
+            raise
+        self.record_results([WriteResult(self.appointment_spec, entry_id=str(self.appointment.EntryID),
+                                         mailbox=self.mailbox)])
         logger.info(f"Appointment {self.appointment.Subject} - {self.appointment.Start} - {self.appointment.End} sent")
 
-    def clear_name_of_special_chars(self, text: str) -> str:
-        if not text:
-            return ""
-        return ''.join(baltic_char_map.get(c, c) for c in text)
-
-    def cancel_meeting(self, operator: tuple[str, str, datetime]):
-        name, _, _ = operator
-        name = config.get(f"EMP_{name}")
-        if name is None:
-            logger.error("Name was not found")            
-            sys.exit(1)
+    def cancel_meeting(self, operator: Shift):
+        employee = self.attendee(operator.name)
+        stored = None if self.shift_store is None else self.shift_store.get(operator.email, operator.start)
+        if stored is not None:
+            logger.info(f"Found meeting: {stored.subject} {stored.start}")
+            self.delete_meeting(stored)
+            return
+        if self.snapshot is not None:
+            entries = self.own_entries(self.snapshot.find(employee, operator.start))
+            count(self.metrics, "cancel_meeting.matched", len(entries))
+            for entry in entries:
+                logger.info(f"Found meeting: {entry.subject} {entry.start}")
+                self.delete_meeting(entry)
+            return
         existing_meeting = self.check_for_existing_shift(operator)
         shifts = []
+        scanned = 0
         for item in existing_meeting:
+            scanned += 1
             if "Upcomming shift" in item.Subject:
                 shifts.append(item)
-        name = " ".join(name.split(".")).title()
+        matched = 0
         for item in shifts:
-            recipients = self.clear_name_of_special_chars(item.RequiredAttendees)
-            if name in recipients:
+            if self.is_attendee(item, employee):
+                matched += 1
                 logger.info(f"Found meeting: {item.Subject} {item.Start}")
-                item.Delete()
-
-    def find_meetings(self, name: str, date: Optional[datetime]):
-        default_calendar = self.store.Items
-        default_calendar.IncludeRecurrences = False
+                self.com.call("Delete", item.Delete)
+        count(self.metrics, "cancel_meeting.scanned", scanned)
+        count(self.metrics, "cancel_meeting.matched", matched)
 
+    def find_meetings(self, employee: Employee, date: Optional[datetime]):
         if date is None:
             date = datetime.now()
 
+        if self.snapshot is not None:
+            entries = self.own_entries(self.snapshot.find(employee, date))
+            count(self.metrics, "find_meetings.matched", len(entries))
+            return [self.get_item(entry.entry_id, entry.mailbox) for entry in entries]
+
+        default_calendar = self.store.Items
+        default_calendar.IncludeRecurrences = False
         start_date = date-timedelta(days=1)
         end_date = date+timedelta(days=1)
-        restriction = f"[Start] >= '{start_date.strftime('%m/%d/%Y %H:%M')}' AND [End] <= '{end_date.strftime('%m/%d/%Y %H:%M')}'"
-        matching_items = default_calendar.Restrict(restriction)
+        matching_items = self.com.call("Restrict", default_calendar.Restrict, make_restriction(start_date, end_date))
 
         meetings = []
         shifts = []
+        scanned = 0
         for item in matching_items:
+            scanned += 1
             if "Upcomming shift" in item.Subject:
                 shifts.append(item)
 
         for item in shifts:
-            recipients = self.clear_name_of_special_chars(item.RequiredAttendees)
-            if name in recipients:
+            if self.is_attendee(item, employee):
                 meetings.append(item)
 
+        count(self.metrics, "find_meetings.scanned", scanned)
+        count(self.metrics, "find_meetings.matched", len(meetings))
         return meetings
         
 
 
-    def update_meeting(self, operator_timeline: list[tuple[str, str, datetime]]):
-        for operator in operator_timeline:
-            name, email, date = operator
-            name = config.get(f"EMP_{name}")
-            if name is None:
-                logger.error("Name was not found")            
-                sys.exit(1)
-            name = " ".join(name.split(".")).title()
-            meetings = self.find_meetings(name, date)
-            breakpoint()
-            pass
+    def delete_meeting(self, entry: CalendarEntry):
+        if entry.recurring:
+            self.delete_occurrence(entry)
+            return
+        item = self.open_meeting(entry)
+        if item is not None:
+            if self.shift_store is not None:
+                self.shift_store.forget(str(item.EntryID))
+            self.com.call("Delete", item.Delete)
+        if self.shift_store is not None:
+            self.shift_store.forget(entry.entry_id)
+        if self.snapshot is not None:
+            self.snapshot.remove(entry)
+
+    def delete_occurrence(self, entry: CalendarEntry):
+        """Removes the shift from its series, the last stored shift of a series deletes the whole series"""
+        master, occurrence = self.open_occurrence(entry)
+        others = [stored for stored in self.shift_store.series(entry.entry_id) if stored.start != entry.start]
+        if master is not None and not others:
+            self.com.call("Delete", master.Delete)
+            self.shift_store.forget(entry.entry_id)
+        elif occurrence is not None:
+            self.com.call("Delete", occurrence.Delete)
+            self.shift_store.forget_occurrence(entry.entry_id, entry.start)
+
+    def cancel_series(self, operators: list[Shift]) -> set[tuple[str, datetime]]:
+        """
+        Deletes the recurring appointments whose stored shifts are all among operators, one Delete per series
+        Returns the (email, start) of the shifts cancelled that way, the others are cancelled one by one
+        """
+        series: dict[str, list[tuple[Shift, CalendarEntry]]] = {}
+        for operator in operators:
+            stored = self.shift_store.get(operator.email, operator.start)
+            if stored is not None and stored.recurring:
+                series.setdefault(stored.entry_id, []).append((operator, stored))
+        cancelled: set[tuple[str, datetime]] = set()
+        for entry_id, shifts in series.items():
+            if len(self.shift_store.series(entry_id)) != len(shifts):
+                continue
+            entry = shifts[0][1]
+            try:
+                master = self.get_item(entry_id, entry.mailbox)
+                self.com.call("Delete", master.Delete)
+            except Exception as e:
+                logger.warning(f"Recurring meeting {entry} could not be deleted as a whole ({e})")
+                continue
+            logger.info(f"Deleted recurring meeting {entry.subject} with its {len(shifts)} shifts")
+            self.shift_store.forget(entry_id)
+            cancelled.update((operator.email, operator.start) for operator, _ in shifts)
+        return cancelled
+
+    def update_meeting(self, entry: CalendarEntry, operator: Shift, subject: str, next_operator: Shift | None) -> bool:
+        """
+        Moves an existing shift appointment to the shift times and sends the update to the attendee
+        Returns False when the appointment no longer exists. A moved shift of a series leaves the series
+        and returns False too, the caller creates it again as a single appointment.
+        """
+        if entry.recurring:
+            return self.update_occurrence(entry, operator, subject, next_operator)
+        item = self.open_meeting(entry)
+        if item is None:
+            return False
+        body = self.make_body(next_operator)
+
+        def set_properties():
+            item.Subject = subject
+            item.Body = body
+            item.Start = operator.start
+            item.End = operator.end
+
+        self.com.call("SetProperties", set_properties)
+        self.com.call("Save", item.Save)
+        self.com.call("Send", item.Send)
+        if self.shift_store is not None:
+            self.shift_store.forget(entry.entry_id)
+        spec = AppointmentSpec(operator.name, operator.email, self.attendee_name(operator.name), subject,
+                               self.location, body, operator.start, operator.end,
+                               content_hash(subject, operator.start, operator.end, body))
+        self.record_results([WriteResult(spec, entry_id=str(item.EntryID), mailbox=entry.mailbox)])
+        logger.info(f"Appointment {subject} - {operator.start} - {operator.end} updated")
+        return True
+
+    def update_occurrence(self, entry: CalendarEntry, operator: Shift, subject: str,
+                          next_operator: Shift | None) -> bool:
+        """Retitles the occurrence of a shift that kept its times, see update_meeting"""
+        if (entry.start, entry.end) != (operator.start, operator.end):
+            self.delete_occurrence(entry)
+            return False
+        _, occurrence = self.open_occurrence(entry)
+        if occurrence is None:
+            return False
+        body = self.make_body(next_operator)
+
+        def set_properties():
+            occurrence.Subject = subject
+            occurrence.Body = body
+
+        self.com.call("SetProperties", set_properties)
+        self.com.call("Save", occurrence.Save)
+        self.com.call("Send", occurrence.Send)
+        self.shift_store.record_many([(operator.email, self.attendee_name(operator.name), operator.start, operator.end,
+                                       subject, entry.entry_id, content_hash(subject, operator.start, operator.end, body),
+                                       entry.mailbox or self.mailbox, True)])
+        logger.info(f"Occurrence {subject} - {operator.start} - {operator.end} updated")
+        return True
 
 def get_operator(name: str, agents: list) -> Operator | None:
     for agent in agents:
@@ -266,149 +545,654 @@ def get_operator(name: str, agents: list) -> Operator | None:
             return agent
     return None
 
-def create_agent_list(df: pd.DataFrame, filter_date: list[str]|None = None) -> list[Operator]:
+def create_agent_list(df: pd.DataFrame, filter_date: list[str]|None = None,
+                      settings: Settings | None = None) -> list[Operator]:
 
     AGENTS: list[Operator] = []
     if filter_date:
-        queried_res = df.explode("covered_dates").query("covered_dates == @filter_date")
-        for i, row in queried_res.iterrows():
-            AGENTS.append(Operator(row.agent, row.covered_dates))
-    else:
-        for i, row in df.iterrows():
-            AGENTS.append(Operator(row.agent, row.covered_dates))
+        df = df[df["shift"].isin(filter_date)]
+    # Every agent without a config entry is reported here, before any appointment is touched
+    get_directory(settings).validate(df["agent"].unique())
+    if "start" not in df.columns:
+        # Schedules from the parse cache are converted already
+        df = convert_shift_datetimes(df, settings)
+    for name, shifts in df.groupby("agent", sort=False):
+        AGENTS.append(Operator.from_shifts(name, to_datetime_list(shifts["start"]), to_datetime_list(shifts["end"]),
+                                           settings))
     return AGENTS
 
-def create_operator_timeline(agents: list[Operator]) -> list[tuple[str, str, datetime]]:
-
-    operator_timeline: list[tuple[str, str, datetime]] = []
-    for agent in agents:
-        agent_timeline = [(agent.name, agent.email, date) for date in agent.operator_dates]
-        operator_timeline.extend(agent_timeline)
-
-    operator_timeline = sorted(operator_timeline, key=lambda x: x[1])
-    return operator_timeline
-
-def read_schedule(filepath: str, seperator: str = ",") -> pd.DataFrame:
-
-    df = pd.read_csv(filepath_or_buffer=filepath, sep=seperator)
-    print(df)
+def select_shifts(df: pd.DataFrame,
+                  agents: list[str] | None = None,
+                  dates: list[str] | None = None,
+                  date_from: str | None = None,
+                  date_to: str | None = None,
+                  settings: Settings | None = None) -> pd.DataFrame:
+    """
+    Keeps the shifts of the selected agents on the selected dates, one vectorized mask over the long frame
+    dates are schedule column headers, date_from/date_to whole days (YYYY-mm-dd) with both ends included
+    A shift matching any of the dates or the range is kept, no selection keeps everything
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if agents:
+        mask &= df["agent"].isin(agents).to_numpy()
+    if dates or date_from or date_to:
+        on_date = df["shift"].isin(dates or []).to_numpy()
+        if date_from or date_to:
+            FORMAT, _ = get_time_settings(settings)
+            day = pd.to_datetime(df["shift_start"], format=FORMAT).dt.normalize()
+            in_range = np.ones(len(df), dtype=bool)
+            if date_from:
+                in_range &= (day >= pd.Timestamp(date_from)).to_numpy()
+            if date_to:
+                in_range &= (day <= pd.Timestamp(date_to)).to_numpy()
+            on_date |= in_range
+        mask &= on_date
+    return df[mask]
+
+def as_list(value: str | list[str] | None) -> list[str]:
+    # Journals and API callers from before the repeatable options pass a single string
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def create_operator_timeline(agents: list[Operator]) -> Timeline:
+    return Timeline.from_operators(agents)
+
+def detect_separator(filepath: str) -> str:
+    """Schedules come as ; or , separated files, the header row tells which"""
+    with open(filepath, encoding="utf-8") as f:
+        header = f.readline()
+    return ";" if header.count(";") > header.count(",") else ","
+
+def read_wide_schedule(filepath: str, seperator: str | None = None) -> pd.DataFrame:
+    """The Agents/Date matrix as it is in the file, every cell as text, shared by the GUI grid and the engine"""
+    if seperator is None:
+        seperator = detect_separator(filepath)
+    return pd.read_csv(filepath_or_buffer=filepath, sep=seperator, dtype=str)
+
+def read_schedule(filepath: str, seperator: str | None = None) -> pd.DataFrame:
+
+    df = read_wide_schedule(filepath, seperator)
+    return melt_schedule(df)
+
+def melt_schedule(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns the wide Agents/Date matrix into a long frame with one row per covered shift
+    Rows keep the schedule order: agent by agent, shifts in column order
+    """
     date_columns = df.columns[1:]
-    df['covered_dates'] = df[date_columns].apply(lambda row: row.dropna().index.tolist(), axis=1)
-    filtered_df = df[['Agents/Date', 'covered_dates']]
-    filtered_df = filtered_df.rename(columns={"Agents/Date": "agent"})
-    return filtered_df
-
-def find_agent_with_date(operator_timeline: list[tuple[str, str, datetime]],
-                         date: datetime) -> list[tuple[str, str, datetime]]:
+    rows, columns = np.nonzero(df[date_columns].notna().to_numpy())
+    shifts = split_shift_cells(pd.Series(date_columns.to_numpy()[columns], dtype=object))
+    shifts.insert(0, "agent", df["Agents/Date"].to_numpy()[rows])
+    return shifts
+
+def split_shift_cells(shifts: pd.Series) -> pd.DataFrame:
+    # Telia date format: 08.08.2025 15:00-22:00 -> dd.mm.YYYY HH:MM-HH:MM
+    start = shifts.str.partition("-")
+    day = start[0].str.rpartition(" ")[0]
+    return pd.DataFrame({
+        "shift": shifts,
+        "shift_start": start[0],
+        "shift_end": day + " " + start[2],
+    })
+
+def find_agent_with_date(operator_timeline: Timeline, date: datetime) -> list[Shift]:
     """
     Finds the agents with the same operating dates as the date specified in the command line args
-    Will return all tuples with the date
+    Will return all shifts starting at the date
     """
-    found_times = []
-    for agent in operator_timeline:
-        _, _, agent_date = agent
-        if agent_date == date:
-            found_times.append(agent)
+    return operator_timeline.at(date)
 
-    return found_times
+def parse_date_argument(date: str) -> datetime:
+    """Converts a schedule column header, ex: 08.08.2025 15:00-22:00, the same way the shifts are converted"""
+    converted = convert_shift_datetimes(split_shift_cells(pd.Series([date], dtype=object)))
+    return to_datetime_list(converted["start"])[0]
 
 def send_results(manager: MeetingManager,
-                 operator_timeline: list[tuple[str, str, datetime]],
+                 operator_timeline: Timeline,
                  services: pd.DataFrame,
-                 date: datetime | None):
-
-    if date is None:
-        for i in range(len(operator_timeline)):
-            agent = operator_timeline[i]
-            next_operator = get_next_operator(operator_timeline, index=i)
-            manager.create_appointment(agent,services, next_operator)
-            if not debug:
-                manager.send_appointment()
+                 handover: bool = True,
+                 writer: Delivery | None = None,
+                 journal: RunJournal | None = None,
+                 job: Job | None = None,
+                 recurring: bool = False):
+    """
+    Sends a reminder for every shift of the timeline
+    handover adds the next operator to the body, a timeline cut down to some dates has no reliable next operator
+    recurring sends the regular shifts of every agent as recurring appointments, it needs a writer
+    """
+    # One lookup for every title instead of one per appointment
+    titles = None if writer is None else manager.make_meeting_titles(services, operator_timeline)
+    shifts = list(operator_timeline)
+    if journal is not None:
+        shifts = journal.remaining("send", shifts)
+    if job is not None:
+        job.start(len(shifts))
+    # The handover is looked up in the whole timeline, also for the shifts left over by a resumed run
+    following = operator_timeline.next_operators() if handover else None
+    appointments = ((agent, None if following is None or following[agent.index] < 0
+                     else operator_timeline[int(following[agent.index])])
+                    for agent in shifts)
+
+    if recurring and writer is not None:
+        # The patterns are found over all the shifts at once, so every spec is built before the first write
+        specs = collapse([manager.build_spec(agent, services, next_operator, subject=titles[agent.index])
+                          for agent, next_operator in appointments])
+        logger.info(f"{len(shifts)} shifts sent as {len(specs)} appointments, "
+                    f"{sum(isinstance(spec, SeriesSpec) for spec in specs)} of them recurring")
+        for spec in specs:
+            if job is not None and job.cancelled:
+                logger.info("Run cancelled, no more reminders are sent")
+                break
+            writer.submit(spec)
         return
 
-    operator_date = find_agent_with_date(operator_timeline, date)
-    logger.info(f"{operator_date}")
-    manager.create_appointment(operator_date[0], services, None)
-    if not debug:
-        manager.send_appointment()
+    for agent, next_operator in appointments:
+        if job is not None and job.cancelled:
+            logger.info("Run cancelled, no more reminders are sent")
+            break
+        if writer is not None:
+            # The writer reports the progress once the appointment is written
+            writer.submit(manager.build_spec(agent, services, next_operator, subject=titles[agent.index]))
+            continue
+        manager.create_appointment(agent, services, next_operator)
+        if not debug:
+            manager.send_appointment()
+            if journal is not None:
+                journal.checkpoint("send", agent.email, agent.start)
+        if job is not None:
+            job.advance()
+
+def make_specs(manager: MeetingManager,
+               operator_timeline: Timeline,
+               services: pd.DataFrame,
+               handover: bool = True) -> list[AppointmentSpec]:
+    """The appointment of every shift of the timeline, as send_results hands them to a writer"""
+    titles = manager.make_meeting_titles(services, operator_timeline)
+    following = operator_timeline.next_operators() if handover else None
+    return [manager.build_spec(agent, services,
+                               None if following is None or following[agent.index] < 0
+                               else operator_timeline[int(following[agent.index])],
+                               subject=titles[agent.index])
+            for agent in operator_timeline]
 
 def cancel_meeting(manager: MeetingManager,
-                   operator_timeline: list[tuple[str, str, datetime]],
-                   date: datetime | None):
+                   operator_timeline: Timeline,
+                   journal: RunJournal | None = None,
+                   job: Job | None = None):
 
-    if date is None:
-        for op_timeline in operator_timeline:
-            manager.cancel_meeting(op_timeline)
+    if debug:
+        logger.info("Debug run, no reminders are cancelled")
         return
+    shifts = list(operator_timeline)
+    if journal is not None:
+        shifts = journal.remaining("cancel", shifts)
+    if job is not None:
+        job.start(len(shifts))
+    if manager.shift_store is not None:
+        whole = manager.cancel_series(shifts)
+        for agent in (agent for agent in shifts if (agent.email, agent.start) in whole):
+            if journal is not None:
+                journal.checkpoint("cancel", agent.email, agent.start)
+            if job is not None:
+                job.advance()
+        shifts = [agent for agent in shifts if (agent.email, agent.start) not in whole]
+
+    for agent in shifts:
+        if job is not None and job.cancelled:
+            logger.info("Run cancelled, no more reminders are cancelled")
+            break
+        if journal is None and job is None:
+            manager.cancel_meeting(agent)
+            continue
+        try:
+            manager.cancel_meeting(agent)
+        except Exception as e:
+            logger.error(f"Cancelling {agent} failed: {e}")
+            if journal is not None:
+                journal.checkpoint("cancel", agent.email, agent.start, e)
+            if job is not None:
+                job.advance(ok=False)
+            continue
+        if journal is not None:
+            journal.checkpoint("cancel", agent.email, agent.start)
+        if job is not None:
+            job.advance()
+
+
+def export_cancellations(manager: MeetingManager,
+                         operator_timeline: Timeline,
+                         services: pd.DataFrame,
+                         writer: IcsWriter,
+                         job: Job | None = None):
+    """Cancelled events for every shift of the timeline, under the UIDs they were exported with"""
+    if job is not None:
+        job.start(len(operator_timeline))
+    titles = manager.make_meeting_titles(services, operator_timeline)
+    for agent in operator_timeline:
+        if job is not None and job.cancelled:
+            logger.info("Run cancelled, no more reminders are cancelled")
+            break
+        writer.cancel(manager.build_spec(agent, services, None, subject=titles[agent.index]))
+
+
+def progress_callback(operation: str, journal: RunJournal | None, job: Job | None):
+    def on_result(result: WriteResult):
+        # A recurring appointment reports every shift of its series
+        for spec in shift_specs(result.spec):
+            if journal is not None:
+                journal.checkpoint(operation, spec.email, spec.start, result.error)
+            if job is not None:
+                job.advance(result.ok)
+    return on_result
+
+
+def make_writer(manager: MeetingManager, args: argparse.Namespace,
+                journal: RunJournal | None = None, job: Job | None = None) -> Dispatcher:
+    # Every writer thread opens its own Outlook connection, COM objects can't be shared across threads
+    manager.resolve_mailboxes(args.email)
+    return Dispatcher(args.email,
+                      lambda mailbox: MeetingManager(mailbox, metrics=manager.metrics).store,
+                      partition=args.partition,
+                      on_flush=manager.record_results,
+                      batch_size=args.batch_size,
+                      dry_run=debug,
+                      rate_limit=args.rate_limit,
+                      on_result=progress_callback("send", journal, job),
+                      stop=None if job is None else job.cancel_event,
+                      metrics=manager.metrics)
+
+
+def make_exporter(args: argparse.Namespace, operation: str = "send", cancel_missing: bool = False,
+                  job: Job | None = None) -> IcsWriter:
+    return IcsWriter(args.ics_path,
+                     per_agent=args.ics_per_agent,
+                     organizer=args.email[0] if args.email else None,
+                     cancel_missing=cancel_missing,
+                     dry_run=debug,
+                     on_result=progress_callback(operation, None, job),
+                     stop=None if job is None else job.cancel_event,
+                     time_zone=get_time_settings()[1])
+
+def open_journal(args: argparse.Namespace) -> RunJournal | None:
+    """
+    Starts a new journaled run, or with --resume restores the options of an earlier run
+    so only its pending and failed shifts are worked on again
+    """
+    if debug or not args.journal or args.check or args.plan or args.sync or args.watch or args.backend == "ics":
+        if args.resume:
+            logger.error("--resume needs the run journal and can't be combined with --check/--plan/--sync/--watch/--backend ics")
+            sys.exit(1)
+        return None
+    journal = RunJournal(args.journal)
+    if args.resume:
+        try:
+            stored = journal.resume(args.resume)
+        except KeyError:
+            logger.error(f"Run {args.resume} not found in {args.journal}")
+            sys.exit(1)
+        for key, value in stored.items():
+            setattr(args, key, value)
+        logger.info(f"Resuming run {journal.run_id}")
+    else:
+        journal.start(vars(args))
+        logger.info(f"Run id: {journal.run_id}")
+    return journal
 
-    operator_date = find_agent_with_date(operator_timeline, date)
-    if not debug:
-        manager.cancel_meeting(operator_date[0])
+def read_services(filepath: str) -> pd.DataFrame:
+    service_df = pd.read_csv(filepath, sep=";")
+    service_df["start"] = pd.to_datetime(service_df["start"])
+    service_df["end"] = pd.to_datetime(service_df["end"])
+    return service_df
 
+def load_schedule(filepath: str, cache: ParseCache | None = None, settings: Settings | None = None) -> pd.DataFrame:
+    """
+    Long schedule with converted start/end, from the parse cache when the file and the time settings are unchanged
+    Without a cache only the parsing is done, the dates are converted for the selected shifts later
+    """
+    if cache is None:
+        return read_schedule(filepath)
+    key = cache.key(filepath, "schedule", *get_time_settings(settings))
+    shifts = cache.get(key)
+    if shifts is not None:
+        logger.info(f"Schedule {filepath} loaded from the parse cache")
+        return shifts
+    shifts = convert_shift_datetimes(read_schedule(filepath), settings)
+    cache.put(key, shifts)
+    return shifts
+
+def load_services(filepath: str, cache: ParseCache | None = None) -> pd.DataFrame:
+    if cache is None:
+        return read_services(filepath)
+    key = cache.key(filepath, "services")
+    service_df = cache.get(key)
+    if service_df is not None:
+        logger.info(f"Service timeline {filepath} loaded from the parse cache")
+        return service_df
+    service_df = read_services(filepath)
+    cache.put(key, service_df)
+    return service_df
+
+def parse_flag(value: str | bool) -> bool:
+    # --send/--cancel arrive as "True"/"False" strings from the command line
+    return eval(value) if isinstance(value, str) else bool(value)
+
+def read_watched(args: argparse.Namespace) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, Timeline]:
+    """Wide schedule, services, selected converted shifts and their timeline, as watch diffs them"""
+    wide = read_wide_schedule(args.input)
+    service_df = read_services(args.service)
+    shifts = select_shifts(convert_shift_datetimes(melt_schedule(wide)),
+                           as_list(args.agent), as_list(args.date), args.date_from, args.date_to)
+    # create_agent_list exits on an unknown agent, a watch keeps running on the last good version instead
+    problems = get_directory().problems(shifts["agent"].unique())
+    if problems:
+        raise ValueError("; ".join(problems))
+    return wide, service_df, shifts, create_operator_timeline(create_agent_list(shifts))
+
+def handover_targets(operator_timeline: Timeline) -> dict[tuple[str, datetime], tuple[str, datetime] | None]:
+    following = operator_timeline.next_operators()
+    targets = {}
+    for shift in operator_timeline:
+        target = None if following[shift.index] < 0 else operator_timeline[int(following[shift.index])]
+        targets[(shift.name, shift.start)] = None if target is None else (target.name, target.start)
+    return targets
+
+def changed_scope(cells: set[tuple[str, str]],
+                  old_shifts: pd.DataFrame, new_shifts: pd.DataFrame,
+                  old_timeline: Timeline, new_timeline: Timeline,
+                  handover: bool) -> dict[tuple[str, str], set]:
+    """Agent days touched by the changed cells, plus the days whose handover to the next operator changed"""
+    emails = dict(zip(old_timeline.names, old_timeline.emails)) | dict(zip(new_timeline.names, new_timeline.emails))
+    scope: dict[tuple[str, str], set] = {}
+    for shifts in (old_shifts, new_shifts):
+        touched = shifts[pd.MultiIndex.from_frame(shifts[["agent", "shift"]]).isin(list(cells))]
+        for name, start in zip(touched["agent"], to_datetime_list(touched["start"])):
+            scope.setdefault((name, emails[name]), set()).add(start.date())
+    if handover:
+        old_targets = handover_targets(old_timeline)
+        for (name, start), target in handover_targets(new_timeline).items():
+            if (name, start) in old_targets and old_targets[(name, start)] != target:
+                scope.setdefault((name, emails[name]), set()).add(start.date())
+    return scope
+
+def sync_changes(manager: MeetingManager, args: argparse.Namespace, operator_timeline: Timeline,
+                 service_df: pd.DataFrame, handover: bool, scope: dict[tuple[str, str], set] | None = None):
+    plan = make_plan(manager, operator_timeline, service_df,
+                     shift_store=manager.shift_store, handover=handover, scope=scope)
+    logger.info(plan.summary())
+    if not len(plan):
+        return
+    writer = make_writer(manager, args)
+    try:
+        apply_plan(manager, plan, service_df, dry_run=debug, writer=writer)
+    finally:
+        logger.info(writer.close())
 
-def main(args: argparse.Namespace, debug_):
-    
+def watch(manager: MeetingManager, args: argparse.Namespace, handover: bool):
+    """
+    Keeps the calendar in sync with the input and service files until Ctrl+C
+    Every saved version is diffed against the previous one cell by cell (agent x date), only the agent days
+    with changed cells or a changed handover are planned and written. A changed service timeline
+    changes the titles, so it syncs the whole schedule.
+    """
+    try:
+        wide, service_df, shifts, operator_timeline = read_watched(args)
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(1)
+    logger.info("Syncing the current schedule before watching")
+    sync_changes(manager, args, operator_timeline, service_df, handover)
+
+    watcher = FileWatcher([args.input, args.service], interval=args.watch_interval, debounce=args.debounce)
+    logger.info(f"Watching {args.input} and {args.service}, Ctrl+C to stop")
+    try:
+        for changed in watcher.changes():
+            started = time.monotonic()
+            try:
+                new_wide, new_service_df, new_shifts, new_timeline = read_watched(args)
+            except Exception as e:
+                # Often a file caught while it is being written, the finished save is another change
+                logger.error(f"Could not read the changed files, waiting for the next change: {e}")
+                continue
+            if not new_service_df.equals(service_df):
+                logger.info("Service timeline changed, syncing the whole schedule")
+                scope = None
+            else:
+                cells = diff_cells(wide, new_wide)
+                scope = changed_scope(cells, shifts, new_shifts, operator_timeline, new_timeline, handover)
+                logger.info(f"{len(cells)} cells changed, {sum(map(len, scope.values()))} agent days to sync")
+                if not scope:
+                    wide, shifts, operator_timeline = new_wide, new_shifts, new_timeline
+                    continue
+            try:
+                sync_changes(manager, args, new_timeline, new_service_df, handover, scope)
+            except Exception as e:
+                # The old version stays the baseline, the next change syncs these cells again
+                logger.error(f"Sync failed: {e}")
+                continue
+            wide, service_df, shifts, operator_timeline = new_wide, new_service_df, new_shifts, new_timeline
+            logger.info(f"Changes synced in {time.monotonic() - started:.1f}s")
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+
+def log_outlook_calls(manager: MeetingManager):
+    logger.info(f"Outlook calls: {manager.com.report()}")
+    if fake_outlook.selected() and fake_outlook.current() is not None:
+        logger.info(f"Fake Outlook: {fake_outlook.current().report()}")
+
+def check_schedule(shifts: pd.DataFrame, services: pd.DataFrame) -> CoverageReport:
+    """Uncovered service windows, double-booked agents and handover chains of the shifts, Outlook is not needed"""
+    # The service windows are wall-clock times, the shifts are compared before the offset for Outlook is added
+    shifts = convert_shift_datetimes(shifts, local=True)
+    return analyze(shift_timeline(shifts), services)
+
+def report_metrics(metrics: Metrics, args: argparse.Namespace):
+    logger.info(f"Run statistics\n{metrics.summary()}")
+    if args.report:
+        metrics.write(args.report, options={key: value for key, value in vars(args).items() if key != "report"})
+        logger.info(f"Run report written to {args.report}")
+
+def main(args: argparse.Namespace, debug_,
+         schedule: pd.DataFrame | None = None,
+         services: pd.DataFrame | None = None,
+         job: Job | None = None):
+    """
+    Runs the scheduling described by the command line options
+    schedule (a melted schedule, see melt_schedule) and services skip reading the CSV files again,
+    job reports the progress and lets another thread cancel the run
+    With --metrics or --report the phases and Outlook calls are measured, the report is written even when the run fails
+    """
     global debug
     debug = debug_
-    logger.info(f"Using input file: {args.input}")
-    filtered_df = read_schedule(args.input, seperator=',')
-
-    logger.info(f"Using service timeline: {args.service}")
-    service_df = pd.read_csv(args.service, sep=";")
-    service_df["start"] = pd.to_datetime(service_df["start"])
-    service_df["end"] = pd.to_datetime(service_df["end"])
-
+    metrics = Metrics() if args.metrics or args.report else None
+    if job is not None:
+        job.metrics = metrics
+    try:
+        run_scheduling(args, metrics, schedule, services, job)
+    finally:
+        if metrics is not None:
+            report_metrics(metrics, args)
+
+def run_scheduling(args: argparse.Namespace, metrics: Metrics | None,
+                   schedule: pd.DataFrame | None = None,
+                   services: pd.DataFrame | None = None,
+                   job: Job | None = None):
+    if args.fake_outlook or os.name == 'posix':
+        fake_outlook.setup(args.email or [], latency=args.fake_latency / 1000, jitter=args.fake_jitter / 1000,
+                           fault_rate=args.fake_fault_rate, throttle_rate=args.fake_throttle_rate)
+    journal = open_journal(args)
+    ics = args.backend == "ics"
+    if args.recurring and (ics or not args.store):
+        # Cancelling and syncing find the shifts of a series only through the shift store
+        logger.error("--recurring writes Outlook series and needs the shift store, drop --backend ics or set --store")
+        return
+    if ics and (args.plan or args.sync or args.watch):
+        # Every export already carries the changes, see IcsWriter
+        logger.error("--plan/--sync/--watch read the Outlook calendar, use --send with --backend ics")
+        return
+    if args.watch:
+        if not args.email:
+            logger.error("No email specified to send the reminders from")
+            return
+        manager = MeetingManager(args.email[0], ShiftStore(args.store) if args.store else None, metrics=metrics)
+        watch(manager, args, handover=not (args.date or args.date_from or args.date_to))
+        return
+    cache = ParseCache(args.parse_cache, int(args.parse_cache_size * 1024 * 1024)) if args.parse_cache else None
+    if schedule is None:
+        logger.info(f"Using input file: {args.input}")
+        with span(metrics, "load_schedule"):
+            filtered_df = load_schedule(args.input, cache)
+    else:
+        filtered_df = schedule
 
-    if args.date:
-       date = [args.date]
+    if services is None:
+        logger.info(f"Using service timeline: {args.service}")
+        with span(metrics, "load_services"):
+            service_df = load_services(args.service, cache)
     else:
-        logger.info("No specific date specified")
-        date = None
+        service_df = services
+
+
+    agents = as_list(args.agent)
+    dates = as_list(args.date)
+    handover = not (dates or args.date_from or args.date_to)
+    if not handover:
+        logger.info(f"Dates specified: {dates} {args.date_from or ''} - {args.date_to or ''}")
+    if agents:
+        logger.info(f"Agents specified: {agents}")
+        unknown = sorted(set(agents) - set(filtered_df["agent"]))
+        if unknown:
+            logger.error(f"No agent found: {unknown}")
+            if len(unknown) == len(set(agents)):
+                return
+    with span(metrics, "select_shifts"):
+        selected_df = select_shifts(filtered_df, agents, dates, args.date_from, args.date_to)
+
+    if args.check:
+        with span(metrics, "check"):
+            report = check_schedule(selected_df, service_df)
+        print(report)
+        # A send run would stop at these, the check reports them without stopping
+        problems = get_directory().problems(selected_df["agent"].unique())
+        for problem in problems:
+            logger.warning(problem)
+        if problems or not report.ok:
+            sys.exit(1)
+        return
 
+    if ics:
+        # The export writes the real time of every shift, not the value shifted for pywin32
+        selected_df = convert_shift_datetimes(selected_df, local=True)
     logger.info(f"Creating agent list")
-    AGENTS = create_agent_list(filtered_df, date)
+    with span(metrics, "create_agent_list"):
+        AGENTS = create_agent_list(selected_df)
     logger.info(f"Agent list created: {AGENTS}")
-    manager = MeetingManager(args.email)
-    
-    if args.agent:
-        logger.info(f"Agent specified: {args.agent}")
-        operator = get_operator(args.agent, AGENTS)
-        if operator is None:
-            logger.error("No agent found")
-            return
-        operator_timeline = create_operator_timeline([operator])
-        if debug:
-            for operator in operator_timeline: logger.info(f"{operator}")
+    if ics:
+        manager = MeetingManager(args.email[0] if args.email else None, connect=False, metrics=metrics)
+    elif not args.email:
+        logger.error("No email specified to send the reminders from")
+        return
     else:
-        logger.info("Creating operator timeline")
+        # One Outlook session for every selected agent and date
+        with span(metrics, "connect"):
+            manager = MeetingManager(args.email[0], ShiftStore(args.store) if args.store else None, metrics=metrics)
+
+    logger.info("Creating operator timeline")
+    with span(metrics, "create_operator_timeline"):
         operator_timeline = create_operator_timeline(AGENTS)
-        logger.info("Operator timeline created")
-        if debug:
-            for operator in operator_timeline: logger.info(f"{operator}")
-
-    manager.update_meeting(operator_timeline)
-    SEND_BOOL = eval(args.send)
-    CANCEL_BOOL = eval(args.cancel)
-    if SEND_BOOL or debug:
-        logger.info("Sending out the meeting reminders")
-        send_results(manager, operator_timeline, service_df, date)
+    logger.info("Operator timeline created")
+    count(metrics, "shifts", len(operator_timeline))
+    if debug:
+        for operator in operator_timeline: logger.info(f"{operator}")
+
+    if args.plan or args.sync:
+        with span(metrics, "plan"):
+            plan = make_plan(manager, operator_timeline, service_df,
+                             shift_store=manager.shift_store, handover=handover)
+        print(plan.summary())
+        if args.sync:
+            logger.info("Syncing the meeting reminders")
+            with span(metrics, "sync"):
+                writer = make_writer(manager, args)
+                apply_plan(manager, plan, service_df, dry_run=debug, writer=writer)
+                logger.info(writer.close())
+        log_outlook_calls(manager)
+        logger.info("Process finished")
+        return
 
-    if CANCEL_BOOL or debug:
+    SEND_BOOL = parse_flag(args.send)
+    CANCEL_BOOL = parse_flag(args.cancel)
+    if ics and (SEND_BOOL or debug):
+        logger.info(f"Exporting the meeting reminders to {args.ics_path}")
+        with span(metrics, "export"):
+            # Only an export of the whole schedule knows which earlier events were removed
+            writer = make_exporter(args, cancel_missing=handover and not agents, job=job)
+            send_results(manager, operator_timeline, service_df, handover, writer, job=job)
+            logger.info(writer.close())
+    elif SEND_BOOL or debug:
+        logger.info("Sending out the meeting reminders")
+        with span(metrics, "send"):
+            writer = make_writer(manager, args, journal, job)
+            send_results(manager, operator_timeline, service_df, handover, writer, journal, job, args.recurring)
+            logger.info(writer.close())
+
+    if ics and CANCEL_BOOL:
+        logger.info(f"Exporting the cancelled meeting reminders to {args.ics_path}")
+        with span(metrics, "export_cancel"):
+            writer = make_exporter(args, "cancel", job=job)
+            export_cancellations(manager, operator_timeline, service_df, writer, job)
+            logger.info(writer.close())
+    elif not ics and (CANCEL_BOOL or debug):
         logger.info("Cancelling the meeting reminder")
-        cancel_meeting(manager, operator_timeline, date)
-
+        with span(metrics, "load_snapshot"):
+            manager.load_snapshot(operator_timeline)
+        with span(metrics, "cancel"):
+            cancel_meeting(manager, operator_timeline, journal, job)
+
+    if journal is not None:
+        logger.info(journal.summary())
+        journal.close()
+    log_outlook_calls(manager)
     logger.info("Process finished")
 
-if __name__ == "__main__":
+def make_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", type=str, default="./agents_schedulers.csv", help="Schedule CSV file")
     parser.add_argument("--service", type=str, default="./service_timeline.csv", help="Service Main/Backup schedule")
-    parser.add_argument("--agent", type=str, default=None, help="Single out one operator for scheduling")
-    parser.add_argument("--date", type=str, default=None, help="Specific date to run scheduling on, format: YYYY-mm-ddTHH")
+    parser.add_argument("--agent", type=str, action="append", help="Operator to run scheduling for, repeat for several operators")
+    parser.add_argument("--date", type=str, action="append", help="Schedule column to run scheduling on, ex: \"08.08.2025 15:00-22:00\", repeat for several")
+    parser.add_argument("--date-from", type=str, default=None, help="First day to run scheduling on, format: YYYY-mm-dd")
+    parser.add_argument("--date-to", type=str, default=None, help="Last day to run scheduling on, format: YYYY-mm-dd")
     parser.add_argument("--send", type=str, default=False, help="Send out the meeting reminders")
     parser.add_argument("--cancel", type=str, default=False, help="Cancel the meeting")
-    parser.add_argument("--email", type=str, default=False, help="Email from which to send the reminder")
-    args = parser.parse_args()
-    main(args, debug_=False)
-
+    parser.add_argument("--email", type=str, action="append", help="Email from which to send the reminder, repeat to spread the reminders over several mailboxes")
+    parser.add_argument("--partition", type=str, default="agent", choices=PARTITIONS, help="How reminders are split between several mailboxes")
+    parser.add_argument("--backend", type=str, default="outlook", choices=BACKENDS, help="Write the reminders through Outlook or export them to iCalendar files")
+    parser.add_argument("--ics-path", type=str, default="./shifts.ics", help="iCalendar file of the ics backend, a folder with --ics-per-agent")
+    parser.add_argument("--ics-per-agent", action="store_true", help="Export one iCalendar file per agent into --ics-path")
+    parser.add_argument("--fake-outlook", action="store_true", help="Write to an in-memory stand-in for Outlook, always used off Windows")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="Milliseconds every call to the fake Outlook takes")
+    parser.add_argument("--fake-jitter", type=float, default=0.0, help="Random milliseconds added to or taken from --fake-latency")
+    parser.add_argument("--fake-fault-rate", type=float, default=0.0, help="Share of fake Outlook calls failing with a transient error")
+    parser.add_argument("--fake-throttle-rate", type=float, default=0.0, help="Share of fake Outlook calls failing with server busy")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Maximum reminders sent per minute from each mailbox")
+    parser.add_argument("--plan", action="store_true", help="Show which reminders a sync would create, update or delete without changing the calendar")
+    parser.add_argument("--sync", action="store_true", help="Create, update and delete only the reminders that differ from the schedule")
+    parser.add_argument("--watch", action="store_true", help="Keep running and sync the reminders of every changed shift when the input or service file is saved")
+    parser.add_argument("--watch-interval", type=float, default=1.0, help="Seconds between checks of the watched files")
+    parser.add_argument("--debounce", type=float, default=1.0, help="Seconds without further saves before a change is synced")
+    parser.add_argument("--batch-size", type=int, default=20, help="Number of sent reminders recorded together")
+    parser.add_argument("--store", type=str, default="./shift_store.sqlite3", help="Local record of sent reminders, empty string to disable")
+    parser.add_argument("--parse-cache", type=str, default=CACHE_DIR, help="Folder of parsed schedules reused while the files are unchanged, empty string to disable")
+    parser.add_argument("--parse-cache-size", type=float, default=MAX_BYTES / 1024 / 1024, help="Size limit of the parse cache in MB")
+    parser.add_argument("--journal", type=str, default="./run_journal.sqlite3", help="Checkpoints of send/cancel runs, empty string to disable")
+    parser.add_argument("--resume", type=str, default=None, help="Run id of an interrupted run, sends/cancels only what it did not finish")
+    parser.add_argument("--check", action="store_true", help="Report uncovered service windows, double-booked agents and handover chains, exits with 1 when something is uncovered or double-booked")
+    parser.add_argument("--recurring", action="store_true", help="Send the regular shifts of every agent as recurring appointments, irregular ones stay single (Outlook backend, needs --store)")
+    parser.add_argument("--metrics", action="store_true", help="Time every phase and Outlook call and log the statistics at the end")
+    parser.add_argument("--report", type=str, default=None, help="Write the run statistics as JSON to this file, implies --metrics")
+    return parser
 
+if __name__ == "__main__":
+    args = make_parser().parse_args()
+    main(args, debug_=False)
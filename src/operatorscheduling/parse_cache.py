@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".operatorscheduling", "parsed")
+MAX_BYTES = 256 * 1024 * 1024
+# Bump when the layout of the cached tables changes
+CACHE_VERSION = "1"
+
+
+class ParseCache:
+    """
+    Parsed schedule and service tables on disk, one .npz file per table with a column per array
+    The key is the hash of the file content plus the settings the parsing depends on, so an edited file
+    or another FORMAT/TIMEZONE simply misses. Least recently used tables are evicted beyond max_bytes.
+    Text columns are stored as unicode arrays, missing values are not kept.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, filepath: str, *settings: str) -> str:
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        for setting in (CACHE_VERSION, *settings):
+            digest.update(b"\x1f" + setting.encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                columns = arrays["columns"].tolist()
+                frame = pd.DataFrame({column: arrays[f"column_{i}"] for i, column in enumerate(columns)})
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable parse cache entry {path}: {e}")
+            self.discard(path)
+            return None
+        # Marks the entry as recently used for the eviction
+        os.utime(path)
+        return frame
+
+    def put(self, key: str, frame: pd.DataFrame):
+        arrays = {"columns": np.array([str(column) for column in frame.columns])}
+        for i, column in enumerate(frame.columns):
+            values = frame[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                arrays[f"column_{i}"] = values.to_numpy(dtype="datetime64[ns]")
+            elif values.dtype == object:
+                arrays[f"column_{i}"] = values.to_numpy().astype(str)
+            else:
+                arrays[f"column_{i}"] = values.to_numpy()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.warning(f"Could not write parse cache entry {path}: {e}")
+            self.discard(temporary)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.discard(path)
+            total -= size
+
+    @staticmethod
+    def discard(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,231 @@
+import logging
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from calendar_snapshot import CalendarEntry, CalendarSnapshot
+from dispatch import Dispatcher
+from shift_store import ShiftStore, content_hash
+from timeline import Shift, Timeline
+
+logger = logging.getLogger(__name__)
+
+
+class Change:
+    """One planned operation: a desired shift, the existing calendar entry, or both"""
+    __slots__ = ("shift", "entry", "subject", "next_operator")
+
+    def __init__(self, shift: Shift | None, entry: CalendarEntry | None,
+                 subject: str | None = None, next_operator: Shift | None = None):
+        self.shift = shift
+        self.entry = entry
+        self.subject = subject
+        self.next_operator = next_operator
+
+    def describe(self) -> str:
+        if self.shift is None:
+            assert self.entry is not None
+            return f"{self.entry.subject} - {self.entry.start} - {self.entry.end} - {self.entry.attendees}"
+        line = f"{self.subject} - {self.shift.start} - {self.shift.end} - {self.shift.name}"
+        if self.entry is not None and (self.entry.start, self.entry.end) != (self.shift.start, self.shift.end):
+            line += f" (was {self.entry.start} - {self.entry.end})"
+        elif self.entry is not None and self.entry.subject != self.subject:
+            line += f" (was {self.entry.subject})"
+        return line
+
+
+class Plan:
+
+    def __init__(self):
+        self.create: list[Change] = []
+        self.update: list[Change] = []
+        self.delete: list[Change] = []
+        self.unchanged: list[Change] = []
+
+    def __len__(self) -> int:
+        """Number of calendar writes the plan needs"""
+        return len(self.create) + len(self.update) + len(self.delete)
+
+    def summary(self) -> str:
+        lines = [f"Plan: {len(self.create)} to create, {len(self.update)} to update, "
+                 f"{len(self.delete)} to delete, {len(self.unchanged)} unchanged"]
+        for sign, changes in (("+", self.create), ("~", self.update), ("-", self.delete)):
+            lines.extend(f"  {sign} {change.describe()}" for change in changes)
+        return "\n".join(lines)
+
+
+def is_unchanged(manager, change: Change) -> bool:
+    assert change.shift is not None and change.entry is not None and change.subject is not None
+    if change.entry.content_hash is not None:
+        body = manager.make_body(change.next_operator)
+        return change.entry.content_hash == content_hash(change.subject, change.shift.start, change.shift.end, body)
+    return (change.entry.start == change.shift.start
+            and change.entry.end == change.shift.end
+            and change.entry.subject == change.subject)
+
+
+def missing_entry_ids(manager, entries: list[CalendarEntry], snapshot: CalendarSnapshot | None) -> set[str]:
+    """
+    EntryIDs of stored appointments that are gone from the calendar, ex: deleted in Outlook by hand
+    Appointments of the snapshot mailbox are looked up in the snapshot, series, other mailboxes
+    and whatever the snapshot left out (ex: a retitled appointment) are opened by EntryID
+    """
+    gone: set[str] = set()
+    checked: set[str] = set()
+    for entry in entries:
+        if entry.entry_id in checked:
+            continue
+        checked.add(entry.entry_id)
+        if (snapshot is not None and not entry.recurring and entry.mailbox in (None, manager.mailbox)
+                and entry.entry_id in snapshot.by_entry_id):
+            continue
+        try:
+            manager.get_item(entry.entry_id, entry.mailbox)
+        except Exception as e:
+            logger.warning(f"Stored meeting {entry} is gone from the calendar ({e}), planning it again")
+            gone.add(entry.entry_id)
+    return gone
+
+
+def make_plan(manager, operator_timeline: Timeline, services: pd.DataFrame,
+              snapshot: CalendarSnapshot | None = None, shift_store: ShiftStore | None = None,
+              handover: bool = True, scope: dict[tuple[str, str], set[date]] | None = None) -> Plan:
+    """
+    Diffs the shifts of the timeline against the existing shift appointments
+    Existing appointments come from the shift store first, the calendar is only read
+    for the shifts the store knows nothing about (or always, without a store). Stored appointments
+    are confirmed against one snapshot of the span, the ones gone from the calendar are forgotten
+    and planned like shifts the store never knew.
+    Appointments are paired per agent and day, so a moved shift becomes an update instead of delete + create
+    Only appointments of agents in the timeline and on the days it covers can be deleted
+
+    scope, {(name, email): days}, limits the plan to some days of some agents, the agents don't need
+    shifts left in the timeline. The rest of the timeline is still used for the handover.
+    """
+    plan = Plan()
+    explicit = scope is not None
+    if scope is None:
+        if not len(operator_timeline):
+            return plan
+        covered = {shift.start.date() for shift in operator_timeline}
+        scope = {(name, operator_timeline.emails[agent_id]): covered
+                 for agent_id, name in enumerate(operator_timeline.names)}
+    scope = {agent: days for agent, days in scope.items() if days}
+    if not scope:
+        return plan
+    all_days: set[date] = set().union(*scope.values())
+    first_day, last_day = min(all_days), max(all_days)
+    shifts = {name: [shift for shift in operator_timeline.for_agent(name) if shift.start.date() in days]
+              for (name, _), days in scope.items()}
+
+    existing: dict[str, dict[date, list[CalendarEntry]]] = {name: {} for name, _ in scope}
+    stored_ids: set[str] = set()
+    if shift_store is not None:
+        stored = [(name, entry) for (name, email), days in scope.items()
+                  for entry in shift_store.between(email, first_day, last_day) if entry.start.date() in days]
+        if stored and snapshot is None:
+            manager.load_snapshot_between(datetime.combine(first_day, time()) - timedelta(days=1),
+                                          datetime.combine(last_day, time()) + timedelta(days=2))
+            snapshot = manager.snapshot
+        gone = missing_entry_ids(manager, [entry for _, entry in stored], snapshot)
+        for entry_id in gone:
+            shift_store.forget(entry_id)
+        for name, entry in stored:
+            if entry.entry_id not in gone:
+                existing[name].setdefault(entry.start.date(), []).append(entry)
+                stored_ids.add(entry.entry_id)
+
+    if snapshot is None and explicit:
+        # Removed shifts have no timeline entry, so the calendar is read for whole days
+        unknown_days = [day for (name, _), days in scope.items() for day in days if day not in existing[name]]
+        if unknown_days:
+            manager.load_snapshot_between(datetime.combine(min(unknown_days), time()) - timedelta(days=1),
+                                          datetime.combine(max(unknown_days), time()) + timedelta(days=2))
+            snapshot = manager.snapshot
+    elif snapshot is None:
+        unknown = np.array([shift.index for name, agent_shifts in shifts.items() for shift in agent_shifts
+                            if shift.start.date() not in existing[name]], dtype=np.int64)
+        if len(unknown):
+            manager.load_snapshot(operator_timeline.select(np.sort(unknown)))
+            snapshot = manager.snapshot
+    if snapshot is not None:
+        for (name, _), days in scope.items():
+            for entry in snapshot.for_attendee(manager.attendee(name)):
+                if entry.start.date() in days and entry.entry_id not in stored_ids:
+                    existing[name].setdefault(entry.start.date(), []).append(entry)
+
+    titles = manager.make_meeting_titles(services, operator_timeline)
+    # Keyed by CalendarEntry.key, the stored shifts of a recurring appointment share one EntryID
+    claimed: set[str] = set()
+    for name, _ in scope:
+        agent_existing = existing[name]
+
+        def pair(shift: Shift, entry: CalendarEntry | None) -> Change:
+            if entry is not None:
+                agent_existing[entry.start.date()].remove(entry)
+                claimed.add(entry.key)
+            next_operator = operator_timeline.next_operator(shift.index) if handover else None
+            return Change(shift, entry, titles[shift.index], next_operator)
+
+        # Same start first, then whatever is left on the same day was moved
+        leftover: list[Shift] = []
+        for shift in shifts[name]:
+            entries = agent_existing.get(shift.start.date(), [])
+            same_start = next((entry for entry in entries
+                               if entry.start == shift.start and entry.key not in claimed), None)
+            if same_start is None:
+                leftover.append(shift)
+                continue
+            change = pair(shift, same_start)
+            (plan.unchanged if is_unchanged(manager, change) else plan.update).append(change)
+
+        for shift in leftover:
+            entries = [entry for entry in agent_existing.get(shift.start.date(), []) if entry.key not in claimed]
+            if entries:
+                plan.update.append(pair(shift, entries[0]))
+            else:
+                plan.create.append(pair(shift, None))
+
+        for entries in agent_existing.values():
+            for entry in entries:
+                if entry.key not in claimed:
+                    claimed.add(entry.key)
+                    plan.delete.append(Change(None, entry))
+
+    plan.create.sort(key=lambda change: change.shift.start)
+    plan.update.sort(key=lambda change: change.shift.start)
+    plan.delete.sort(key=lambda change: change.entry.start)
+    return plan
+
+
+def apply_plan(manager, plan: Plan, services: pd.DataFrame, dry_run: bool = False,
+               writer: Dispatcher | None = None):
+    """
+    Writes only the changes of the plan to the calendar
+    New appointments go through the writer when one is given
+    """
+    def create(change: Change):
+        if writer is not None:
+            writer.submit(manager.build_spec(change.shift, services, change.next_operator))
+            return
+        manager.create_appointment(change.shift, services, change.next_operator)
+        if not dry_run:
+            manager.send_appointment()
+
+    for change in plan.delete:
+        logger.info(f"Deleting {change.describe()}")
+        if not dry_run:
+            manager.delete_meeting(change.entry)
+
+    for change in plan.update:
+        logger.info(f"Updating {change.describe()}")
+        if not dry_run and not manager.update_meeting(change.entry, change.shift, change.subject, change.next_operator):
+            logger.info(f"Appointment is gone from the calendar or left its series, creating it again")
+            create(change)
+
+    for change in plan.create:
+        create(change)
+
+    logger.info(f"Plan applied: {len(plan.create)} created, {len(plan.update)} updated, "
+                f"{len(plan.delete)} deleted, {len(plan.unchanged)} unchanged")
@@ -0,0 +1,210 @@
+import itertools
+from collections import Counter
+from datetime import date, datetime
+
+import numpy as np
+
+from shift_store import content_hash
+from writer import AppointmentSpec
+
+# Outlook OlRecurrenceType
+DAILY = 0
+WEEKLY = 1
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# A series needs this many shifts, shorter runs stay single appointments
+MIN_OCCURRENCES = 3
+# Longest cycle tried, ex: 8 for 4 days on / 4 days off
+MAX_INTERVAL_DAYS = 28
+MAX_INTERVAL_WEEKS = 4
+# Outlook calls per single appointment (Add, Save, Send), per series (Add, GetRecurrencePattern, Save, Send)
+# and per exception (GetOccurrence and Delete, or GetOccurrence, the new properties and Save)
+SINGLE_CALLS = 3
+SERIES_CALLS = 4
+EXCEPTION_CALLS = 2
+
+
+def weekdays(days: np.ndarray) -> np.ndarray:
+    # date.toordinal() is 1 for Monday 0001-01-01
+    return (days - 1) % 7
+
+
+def pattern_days(kind: int, interval: int, mask: tuple[bool, ...], first: int, last: int) -> np.ndarray:
+    """Ordinal days of the occurrences from first to last, weekly patterns count their weeks from the week of first"""
+    days = np.arange(first, last + 1)
+    if kind == DAILY:
+        return days[(days - first) % interval == 0]
+    weeks = (days - weekdays(days)) // 7
+    return days[np.asarray(mask)[weekdays(days)] & ((weeks - weeks[0]) % interval == 0)]
+
+
+class Recurrence:
+    """Outlook recurrence pattern of a series: every interval days, or every interval weeks on some weekdays"""
+    __slots__ = ("kind", "interval", "weekdays", "first", "last")
+
+    def __init__(self, kind: int, interval: int, weekdays: tuple[int, ...], first: date, last: date):
+        self.kind = kind
+        self.interval = interval
+        # Monday = 0, only used by weekly patterns
+        self.weekdays = weekdays
+        self.first = first
+        self.last = last
+
+    @property
+    def day_of_week_mask(self) -> int:
+        # OlDaysOfWeek: olSunday = 1, olMonday = 2 ... olSaturday = 64
+        return sum(1 << ((weekday + 1) % 7) for weekday in self.weekdays)
+
+    def days(self) -> list[date]:
+        mask = tuple(weekday in self.weekdays for weekday in range(7))
+        return [date.fromordinal(int(day)) for day in
+                pattern_days(self.kind, self.interval, mask, self.first.toordinal(), self.last.toordinal())]
+
+    def __repr__(self) -> str:
+        if self.kind == DAILY:
+            every = "every day" if self.interval == 1 else f"every {self.interval} days"
+        else:
+            every = ("weekly" if self.interval == 1 else f"every {self.interval} weeks") + \
+                " on " + ", ".join(WEEKDAY_NAMES[weekday] for weekday in self.weekdays)
+        return f"{every} {self.first} - {self.last}"
+
+
+class SeriesSpec:
+    """
+    A recurring appointment standing for several shifts of one agent with the same start time and duration
+    master carries the first shift and the most common subject and body. deleted are the starts of
+    pattern occurrences without a shift, exceptions the shifts whose subject or body differ from the master.
+    """
+    __slots__ = ("master", "recurrence", "occurrences", "deleted")
+
+    def __init__(self, master: AppointmentSpec, recurrence: Recurrence,
+                 occurrences: list[AppointmentSpec], deleted: list[datetime]):
+        self.master = master
+        self.recurrence = recurrence
+        self.occurrences = occurrences
+        self.deleted = deleted
+
+    @property
+    def exceptions(self) -> list[AppointmentSpec]:
+        return [spec for spec in self.occurrences
+                if (spec.subject, spec.body) != (self.master.subject, self.master.body)]
+
+    @property
+    def email(self) -> str:
+        return self.master.email
+
+    @property
+    def name(self) -> str:
+        return self.master.name
+
+    @property
+    def start(self) -> datetime:
+        return self.master.start
+
+    @property
+    def end(self) -> datetime:
+        return self.master.end
+
+    def __repr__(self) -> str:
+        return (f"{self.master.subject} - {self.master.start:%H:%M}-{self.master.end:%H:%M} {self.recurrence} - "
+                f"{self.master.name} ({len(self.occurrences)} shifts, {len(self.deleted)} skipped, "
+                f"{len(self.exceptions)} changed)")
+
+
+def shift_specs(spec: AppointmentSpec | SeriesSpec) -> list[AppointmentSpec]:
+    """The shifts a written appointment stands for"""
+    return spec.occurrences if isinstance(spec, SeriesSpec) else [spec]
+
+
+def candidates(days: np.ndarray) -> list[tuple[int, int, tuple[bool, ...]]]:
+    """(kind, interval, weekday mask) worth trying for the days, anchored at the first one"""
+    found = [(DAILY, interval, ()) for interval in range(1, MAX_INTERVAL_DAYS + 1)]
+    counts = np.bincount(weekdays(days), minlength=7)
+    # A weekday worked only now and then would add a deleted occurrence every week
+    mask = tuple(bool(count) for count in counts >= max(counts.max() / 2, 1))
+    # Outlook may start its weeks on Sunday, with Sunday in a pattern of every 2+ weeks the series would
+    # pair other weeks than ours. Every other Sunday alone is still found as every 14 days.
+    intervals = range(1, MAX_INTERVAL_WEEKS + 1) if not mask[6] else (1,)
+    found += [(WEEKLY, interval, mask) for interval in intervals]
+    return found
+
+
+def fit(specs: list[AppointmentSpec], days: np.ndarray,
+        per_shift: bool = False) -> tuple[int, np.ndarray, np.ndarray, Recurrence] | None:
+    """
+    Best pattern for shifts of the same start time and duration, by Outlook calls saved against single appointments
+    per_shift ranks the patterns by calls saved per covered shift instead of in total
+    Returns the calls saved, which shifts it covers, the days of its occurrences without a shift and the pattern
+    """
+    best = None
+    best_rank = 0.0
+    contents = [(spec.subject, spec.body) for spec in specs]
+    for kind, interval, mask in candidates(days):
+        if kind == WEEKLY and not any(mask):
+            continue
+        expected = pattern_days(kind, interval, mask, int(days[0]), int(days[-1]))
+        covered = np.isin(days, expected)
+        # Two shifts on the same day can't both be the occurrence of that day
+        covered[1:] &= days[1:] != days[:-1]
+        if covered.sum() < MIN_OCCURRENCES:
+            continue
+        first, last = days[covered][0], days[covered][-1]
+        expected = expected[(expected >= first) & (expected <= last)]
+        missing = expected[~np.isin(expected, days[covered])]
+        common, _ = Counter(itertools.compress(contents, covered)).most_common(1)[0]
+        changed = sum(content != common for content in itertools.compress(contents, covered))
+        saved = SINGLE_CALLS * int(covered.sum()) - SERIES_CALLS - EXCEPTION_CALLS * (len(missing) + changed)
+        rank = saved / int(covered.sum()) if per_shift else saved
+        if saved > 0 and rank > best_rank:
+            weekdays_ = tuple(weekday for weekday in range(7) if mask and mask[weekday])
+            best = (saved, covered, missing,
+                    Recurrence(kind, interval, weekdays_, date.fromordinal(int(first)), date.fromordinal(int(last))))
+            best_rank = rank
+    return best
+
+
+def make_series(specs: list[AppointmentSpec], missing: np.ndarray, recurrence: Recurrence) -> SeriesSpec:
+    (subject, body), _ = Counter((spec.subject, spec.body) for spec in specs).most_common(1)[0]
+    first = specs[0]
+    master = AppointmentSpec(first.name, first.email, first.attendee, subject, first.location, body,
+                             first.start, first.end, content_hash(subject, first.start, first.end, body),
+                             first.busy_status, first.reminder_minutes, first.meeting_status)
+    offset = first.start - datetime.combine(first.start.date(), datetime.min.time())
+    deleted = [datetime.combine(date.fromordinal(int(day)), datetime.min.time()) + offset for day in missing]
+    return SeriesSpec(master, recurrence, specs, deleted)
+
+
+def collapse_group(group: list[AppointmentSpec], per_shift: bool) -> tuple[int, list[AppointmentSpec | SeriesSpec]]:
+    """The best pattern takes its shifts, the rest of the group is tried again until no pattern saves anything"""
+    collapsed: list[AppointmentSpec | SeriesSpec] = []
+    total = 0
+    while len(group) >= MIN_OCCURRENCES:
+        days = np.array([spec.start.toordinal() for spec in group])
+        best = fit(group, days, per_shift)
+        if best is None:
+            break
+        saved, covered, missing, recurrence = best
+        total += saved
+        collapsed.append(make_series(list(itertools.compress(group, covered)), missing, recurrence))
+        group = list(itertools.compress(group, ~covered))
+    return total, collapsed + group
+
+
+def collapse(specs: list[AppointmentSpec]) -> list[AppointmentSpec | SeriesSpec]:
+    """
+    Replaces regular shifts by recurring appointments, irregular ones stay single appointments
+    Shifts are grouped per agent, start time and duration. Each group is collapsed twice, taking the pattern
+    that saves the most Outlook calls in total or per shift first, the run saving more calls is kept:
+    the first finds a weekly series with a few days off, the second a 4 on / 4 off rotation as four series
+    instead of one daily series with every other half deleted.
+    """
+    groups: dict[tuple, list[AppointmentSpec]] = {}
+    for spec in specs:
+        groups.setdefault((spec.email, spec.start.time(), spec.end - spec.start, spec.location), []).append(spec)
+    collapsed: list[AppointmentSpec | SeriesSpec] = []
+    for group in groups.values():
+        group.sort(key=lambda spec: spec.start)
+        _, best = max(collapse_group(group, False), collapse_group(group, True), key=lambda run: run[0])
+        collapsed.extend(best)
+    collapsed.sort(key=lambda spec: spec.start)
+    return collapsed
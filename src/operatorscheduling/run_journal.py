@@ -0,0 +1,109 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from shift_store import make_shift_key
+from timeline import Shift
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_items (
+    run_id TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, item_key)
+);
+"""
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Command line options that describe the work of a run, --resume restores them
+RUN_ARGS = ("input", "service", "agent", "date", "date_from", "date_to", "send", "cancel", "email", "partition",
+            "recurring", "backend")
+
+
+def make_item_key(operation: str, email: str, start: datetime) -> str:
+    return f"{operation}|{make_shift_key(email, start)}"
+
+
+class RunJournal:
+    """
+    Checkpoints every shift sent or cancelled by a run, so a run that died halfway can be resumed
+    All shifts of an operation are registered as pending up front, each completed one is committed
+    as done or failed in its own transaction. A resumed run only works on what is not done yet.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # The Outlook writer threads checkpoint what they sent
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript(SCHEMA)
+        self.run_id: str | None = None
+
+    def close(self):
+        self.connection.close()
+
+    def start(self, args: dict) -> str:
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO runs VALUES (?, ?, ?)",
+                                    (self.run_id, datetime.now().isoformat(timespec="seconds"),
+                                     json.dumps({key: args.get(key) for key in RUN_ARGS})))
+        return self.run_id
+
+    def resume(self, run_id: str) -> dict:
+        """Returns the options the run was started with, raises KeyError for an unknown run"""
+        row = self.connection.execute("SELECT args FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(run_id)
+        self.run_id = run_id
+        return json.loads(row[0])
+
+    def remaining(self, operation: str, shifts: list[Shift]) -> list[Shift]:
+        """Registers the shifts of an operation and returns the ones still pending or failed"""
+        keys = [make_item_key(operation, shift.email, shift.start) for shift in shifts]
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO run_items VALUES (?, ?, ?, NULL, ?)",
+                [(self.run_id, key, PENDING, now) for key in keys])
+            done = {row[0] for row in self.connection.execute(
+                "SELECT item_key FROM run_items WHERE run_id = ? AND status = ?", (self.run_id, DONE))}
+        skipped = sum(key in done for key in keys)
+        if skipped:
+            logger.info(f"Run {self.run_id}: skipping {skipped} shifts already done")
+        return [shift for shift, key in zip(shifts, keys) if key not in done]
+
+    def checkpoint(self, operation: str, email: str, start: datetime, error: Exception | None = None):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE run_items SET status = ?, error = ?, updated_at = ? WHERE run_id = ? AND item_key = ?",
+                (DONE if error is None else FAILED, None if error is None else str(error),
+                 datetime.now().isoformat(timespec="seconds"), self.run_id,
+                 make_item_key(operation, email, start)))
+
+    def counts(self) -> dict[str, int]:
+        rows = self.connection.execute(
+            "SELECT status, COUNT(*) FROM run_items WHERE run_id = ? GROUP BY status", (self.run_id,))
+        return dict(rows.fetchall())
+
+    def summary(self) -> str:
+        counts = self.counts()
+        text = f"Run {self.run_id}: " + ", ".join(f"{counts.get(status, 0)} {status}" for status in (DONE, FAILED, PENDING))
+        if counts.get(FAILED) or counts.get(PENDING):
+            text += f", rerun with --resume {self.run_id}"
+        return text
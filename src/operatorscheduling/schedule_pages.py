@@ -0,0 +1,40 @@
+import math
+
+import pandas as pd
+
+PAGE_SIZE = 200
+
+
+class SchedulePages:
+    """
+    Pages of the wide schedule for the GUI grid
+    The frame is the one read for the scheduling engine, rows only become cell lists when their page is shown
+    """
+
+    def __init__(self, wide: pd.DataFrame, page_size: int = PAGE_SIZE):
+        self.wide = wide
+        self.page_size = page_size
+        self.headers: list[str] = [str(column) for column in wide.columns]
+
+    def __len__(self) -> int:
+        return len(self.wide)
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(len(self.wide) / self.page_size))
+
+    def bounds(self, page: int) -> tuple[int, int]:
+        """First and one past the last row of page"""
+        start = page * self.page_size
+        return start, min(start + self.page_size, len(self.wide))
+
+    def rows(self, page: int) -> list[list[str]]:
+        start, stop = self.bounds(page)
+        return self.wide.iloc[start:stop].fillna("").to_numpy().tolist()
+
+    def agent(self, row: int) -> str:
+        return str(self.wide.iat[row, 0])
+
+    def describe(self, page: int) -> str:
+        start, stop = self.bounds(page)
+        return f"Agents {start + 1}-{stop} of {len(self.wide)}" if len(self.wide) else "No agents"
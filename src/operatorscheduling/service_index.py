@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+class ServiceIndex:
+    """
+    Precomputed lookup of which services are active at a moment, built once from the --service timeline
+    Same rule as service.query("@date >= start and @date <= end"), windows can overlap (Main/Backup)
+
+    The start/end points cut the timeline into elementary pieces: each point itself and the open gap
+    after it. The set of active services is constant on every piece, so its prefix is computed once
+    and a lookup is a binary search over the points.
+    A window covers a contiguous run of pieces, the prefixes come from one sweep over the +1/-1 events
+    where windows start and end, only built where the active set changes.
+    """
+
+    def __init__(self, service: pd.DataFrame):
+        service = service.dropna(subset=["start", "end"])
+        starts = service["start"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        ends = service["end"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        names = service["service"].astype(str).to_numpy()
+
+        self.points: np.ndarray = np.unique(np.concatenate([starts, ends]))
+        # Piece 0 is before the first point, 2i+1 is point i, 2i+2 the gap after point i
+        pieces = 2 * len(self.points) + 1
+        first = 2 * np.searchsorted(self.points, starts) + 1
+        last = 2 * np.searchsorted(self.points, ends) + 1
+        windows = np.flatnonzero(first <= last)
+
+        # +1 on the first piece of a window, -1 right after its last one
+        at = np.concatenate([first[windows], last[windows] + 1])
+        window = np.concatenate([windows, windows])
+        joins = np.repeat([True, False], len(windows))
+        order = np.argsort(at, kind="stable")
+        # Plain lists, the sweep itself is a Python loop
+        at, window, joins = at[order].tolist(), window[order].tolist(), joins[order].tolist()
+        at.append(pieces)
+        names = names.tolist()
+
+        self.prefixes: np.ndarray = np.full(pieces, "", dtype=object)
+        active: set[int] = set()
+        for event in range(len(window)):
+            if joins[event]:
+                active.add(window[event])
+            else:
+                active.discard(window[event])
+            if at[event + 1] != at[event]:
+                # Same order as the service timeline rows, like service.query
+                self.prefixes[at[event]:at[event + 1]] = "/".join([names[row] for row in sorted(active)])
+
+    def lookup(self, dates: np.ndarray) -> np.ndarray:
+        """Service prefix, ex: "Main/Backup", for every date at once"""
+        dates = np.asarray(dates, dtype="datetime64[ns]").astype(np.int64)
+        position = np.searchsorted(self.points, dates, side="left")
+        exact = np.zeros(len(dates), dtype=bool)
+        inside = position < len(self.points)
+        exact[inside] = self.points[position[inside]] == dates[inside]
+        return self.prefixes[2 * position + exact]
+
+    def titles(self, dates: np.ndarray, subject: str = "Upcomming shift") -> list[str]:
+        return [f"[{prefix}] {subject}" if prefix else subject for prefix in self.lookup(dates)]
@@ -0,0 +1,41 @@
+import logging
+import sys
+from typing import Mapping
+
+from dotenv import dotenv_values
+
+from directory import EmployeeDirectory
+
+logger = logging.getLogger(__name__)
+
+
+class Settings:
+    """
+    FORMAT, TIMEZONE and the employees of one .env file
+    main.py reads the .env of the working folder once, a batch run holds one Settings per team
+    and hands it to the parsing functions instead of changing the module config.
+    """
+
+    def __init__(self, config: Mapping[str, str | None], source: str | None = None):
+        self.config = dict(config)
+        self.source = source
+        self.directory = EmployeeDirectory.from_config(self.config)
+
+    @classmethod
+    def load(cls, path: str) -> "Settings":
+        config = dotenv_values(path)
+        if not config:
+            logger.error(f"No settings found in {path}")
+            sys.exit(1)
+        return cls(config, path)
+
+    def time_settings(self) -> tuple[str, str]:
+        FORMAT = self.config.get("FORMAT", None)
+        TIMEZONE = self.config.get("TIMEZONE", None)
+        if FORMAT is None:
+            logger.error(f"FORMAT keyword not found in {self.source or 'config'}")
+            sys.exit(1)
+        if TIMEZONE is None:
+            logger.error(f"TIMEZONE keyword not found in {self.source or 'config'}")
+            sys.exit(1)
+        return FORMAT, TIMEZONE
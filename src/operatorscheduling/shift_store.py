@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+from calendar_snapshot import CalendarEntry
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shifts (
+    shift_key TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    attendee TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    sent_at TEXT NOT NULL,
+    mailbox TEXT NOT NULL DEFAULT '',
+    series INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS shifts_email_start ON shifts (email, start_time);
+CREATE INDEX IF NOT EXISTS shifts_entry_id ON shifts (entry_id);
+"""
+
+
+def make_shift_key(email: str, start: datetime) -> str:
+    return f"{email}|{start.isoformat(timespec='minutes')}"
+
+
+def content_hash(subject: str, start: datetime, end: datetime, body: str) -> str:
+    content = "\x1f".join((subject, start.isoformat(), end.isoformat(), body))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ShiftStore:
+    """
+    Local record of the sent shift appointments: Outlook EntryID, content hash and when it was sent
+    Lets later runs open the appointment with GetItemFromID instead of searching the calendar
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # The Outlook writer threads record what they sent, the main thread reads, every use takes the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(shifts)")}
+        if "mailbox" not in columns:
+            # Stores created before reminders could be sent from several mailboxes
+            with self.connection:
+                self.connection.execute("ALTER TABLE shifts ADD COLUMN mailbox TEXT NOT NULL DEFAULT ''")
+        if "series" not in columns:
+            # Stores created before shifts could be sent as recurring appointments
+            with self.connection:
+                self.connection.execute("ALTER TABLE shifts ADD COLUMN series INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        self.connection.close()
+
+    def record_many(self, rows: list[tuple[str, str, datetime, datetime, str, str, str, str, bool]]):
+        """
+        Records (email, attendee, start, end, subject, entry_id, content_hash, mailbox, series) rows in one transaction
+        The shifts of a recurring appointment share the EntryID of its master and are flagged as series
+        """
+        sent_at = datetime.now().isoformat(timespec="seconds")
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO shifts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(make_shift_key(email, start), email, attendee, start.isoformat(), end.isoformat(), subject,
+                  entry_id, hash_, sent_at, mailbox, int(series))
+                 for email, attendee, start, end, subject, entry_id, hash_, mailbox, series in rows])
+
+    def forget(self, entry_id: str):
+        """Drops the appointment, for a recurring one every shift of the series"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM shifts WHERE entry_id = ?", (entry_id,))
+
+    def forget_occurrence(self, entry_id: str, start: datetime):
+        """Drops one shift of a recurring appointment"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM shifts WHERE entry_id = ? AND start_time = ?",
+                                    (entry_id, start.isoformat()))
+
+    def get(self, email: str, start: datetime) -> CalendarEntry | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT entry_id, subject, start_time, end_time, email, attendee, content_hash, mailbox, series FROM shifts WHERE shift_key = ?",
+                (make_shift_key(email, start),)).fetchone()
+        return None if row is None else self.to_entry(row)
+
+    def between(self, email: str, first_day: date, last_day: date) -> list[CalendarEntry]:
+        """Stored appointments of email starting on first_day up to and including last_day"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT entry_id, subject, start_time, end_time, email, attendee, content_hash, mailbox, series FROM shifts "
+                "WHERE email = ? AND start_time >= ? AND start_time < ? ORDER BY start_time",
+                (email, first_day.isoformat(), (last_day + timedelta(days=1)).isoformat())).fetchall()
+        return [self.to_entry(row) for row in rows]
+
+    def series(self, entry_id: str) -> list[CalendarEntry]:
+        """Stored shifts of the recurring appointment entry_id"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT entry_id, subject, start_time, end_time, email, attendee, content_hash, mailbox, series FROM shifts "
+                "WHERE entry_id = ? AND series ORDER BY start_time", (entry_id,)).fetchall()
+        return [self.to_entry(row) for row in rows]
+
+    @staticmethod
+    def to_entry(row: tuple) -> CalendarEntry:
+        entry_id, subject, start, end, email, attendee, hash_, mailbox, series = row
+        # Keyed by address like the calendar snapshot entries
+        return CalendarEntry(entry_id, subject, datetime.fromisoformat(start), datetime.fromisoformat(end),
+                             attendee, (email.lower(),), hash_, mailbox or None, bool(series))
@@ -0,0 +1,48 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".operatorscheduling", "stores.json")
+CACHE_TTL = 24 * 60 * 60
+
+
+def discover_stores() -> list[str]:
+    """Display names of the Outlook stores on this PC, starts Outlook when it is not running"""
+    # win32com is only imported by the thread that needs it
+    import win32com.client
+    outlook = win32com.client.Dispatch("Outlook.Application")
+    return [store.DisplayName for store in outlook.Session.Stores]
+
+
+class StoreCache:
+    """
+    Outlook store names saved on disk, so the GUI can fill the mailbox list without waiting for Outlook
+    Entries older than ttl seconds are stale: still shown, but discovered again in the background
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def load(self) -> tuple[list[str], bool]:
+        """Cached store names and whether they are still fresh, ([], False) without a usable cache"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                cached = json.load(f)
+            stores = [str(store) for store in cached["stores"]]
+            saved_at = float(cached["saved_at"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"No usable store cache at {self.path}: {e}")
+            return [], False
+        return stores, time.time() - saved_at < self.ttl
+
+    def save(self, stores: list[str]):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Written next to the cache and renamed, a GUI started meanwhile never reads half a file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "stores": stores}, f)
+        os.replace(temporary, self.path)
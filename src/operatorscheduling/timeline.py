@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(date: datetime) -> int:
+    return (date - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=int(seconds))
+
+
+class Shift:
+    """
+    Light view of one row of a Timeline
+    Unpacks like the old timeline tuples: name, email, start, end = shift
+    """
+    __slots__ = ("timeline", "index")
+
+    def __init__(self, timeline: "Timeline", index: int):
+        self.timeline = timeline
+        self.index = index
+
+    @property
+    def agent_id(self) -> int:
+        return int(self.timeline.agent_ids[self.index])
+
+    @property
+    def name(self) -> str:
+        return self.timeline.names[self.timeline.agent_ids[self.index]]
+
+    @property
+    def email(self) -> str:
+        return self.timeline.emails[self.timeline.agent_ids[self.index]]
+
+    @property
+    def start(self) -> datetime:
+        return from_epoch(self.timeline.starts[self.index])
+
+    @property
+    def end(self) -> datetime:
+        return from_epoch(self.timeline.ends[self.index])
+
+    def __iter__(self) -> Iterator:
+        return iter((self.name, self.email, self.start, self.end))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Shift):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return repr(tuple(self))
+
+
+class Timeline:
+    """
+    Columnar operator timeline sorted by shift start
+    Agents are interned: each shift stores an index into names/emails, start and end are int64 epoch seconds
+    """
+
+    def __init__(self, names: list[str], emails: list[str],
+                 agent_ids: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        order = np.argsort(starts, kind="stable")
+        self.names: list[str] = names
+        self.emails: list[str] = emails
+        self.agent_ids: np.ndarray = np.asarray(agent_ids, dtype=np.int32)[order]
+        self.starts: np.ndarray = np.asarray(starts, dtype=np.int64)[order]
+        self.ends: np.ndarray = np.asarray(ends, dtype=np.int64)[order]
+
+        # Positions of every agent's shifts, already in start order
+        by_agent = np.argsort(self.agent_ids, kind="stable")
+        bounds = np.searchsorted(self.agent_ids[by_agent], np.arange(len(names) + 1))
+        self.agent_positions: dict[str, np.ndarray] = {
+            name: by_agent[bounds[i]:bounds[i + 1]] for i, name in enumerate(names)
+        }
+
+    @classmethod
+    def from_operators(cls, agents: Iterable) -> "Timeline":
+        """Builds the timeline from Operator objects (name, email, operator_dates, operator_end_dates)"""
+        names: list[str] = []
+        emails: list[str] = []
+        ids: list[int] = []
+        starts: list[int] = []
+        ends: list[int] = []
+        interned: dict[str, int] = {}
+        for agent in agents:
+            if agent.name not in interned:
+                interned[agent.name] = len(names)
+                names.append(agent.name)
+                emails.append(agent.email)
+            agent_id = interned[agent.name]
+            ids.extend([agent_id] * len(agent.operator_dates))
+            starts.extend(to_epoch(date) for date in agent.operator_dates)
+            ends.extend(to_epoch(date) for date in agent.operator_end_dates)
+        return cls(names, emails, np.array(ids, dtype=np.int32),
+                   np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Shift:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Timeline index out of range")
+        return Shift(self, index)
+
+    def __iter__(self) -> Iterator[Shift]:
+        return (Shift(self, i) for i in range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"Timeline({len(self)} shifts, {len(self.names)} agents)"
+
+    @property
+    def nbytes(self) -> int:
+        return self.agent_ids.nbytes + self.starts.nbytes + self.ends.nbytes
+
+    def start_dates(self) -> np.ndarray:
+        return self.starts.astype("datetime64[s]")
+
+    def span(self) -> tuple[datetime, datetime] | None:
+        if not len(self):
+            return None
+        return from_epoch(self.starts[0]), from_epoch(self.ends.max())
+
+    def at(self, date: datetime) -> list[Shift]:
+        """All shifts starting exactly at date"""
+        seconds = to_epoch(date)
+        low = int(np.searchsorted(self.starts, seconds, side="left"))
+        high = int(np.searchsorted(self.starts, seconds, side="right"))
+        return [Shift(self, i) for i in range(low, high)]
+
+    def between(self, start: datetime, end: datetime) -> list[Shift]:
+        """All shifts starting in [start, end)"""
+        low = int(np.searchsorted(self.starts, to_epoch(start), side="left"))
+        high = int(np.searchsorted(self.starts, to_epoch(end), side="left"))
+        return [Shift(self, i) for i in range(low, high)]
+
+    def for_agent(self, name: str) -> list[Shift]:
+        return [Shift(self, int(i)) for i in self.agent_positions.get(name, ())]
+
+    def select(self, positions: np.ndarray) -> "Timeline":
+        """New timeline with only the shifts at positions, sharing the interned agents"""
+        return Timeline(self.names, self.emails,
+                        self.agent_ids[positions], self.starts[positions], self.ends[positions])
+
+    def next_operators(self) -> np.ndarray:
+        """next_operator of every shift in one pass: position of the shift taking over, -1 when nobody does"""
+        count = len(self)
+        if not count:
+            return np.empty(0, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.starts, self.ends, side="left"), count - 1)
+        # First position after each one where another agent's shift starts, count past the last change
+        changes = np.append(np.flatnonzero(self.agent_ids[1:] != self.agent_ids[:-1]) + 1, count)
+        other_agent = changes[np.searchsorted(changes, positions, side="right")]
+        following = np.where(self.agent_ids[positions] != self.agent_ids, positions, other_agent)
+        following[self.starts[positions] < self.ends] = -1
+        following[following >= count] = -1
+        return following.astype(np.int64)
+
+    def next_operator(self, index: int) -> Shift | None:
+        """
+        Who takes over when the shift at index ends:
+        the first shift of another agent starting at or after its end
+        """
+        agent_id = self.agent_ids[index]
+        position = int(np.searchsorted(self.starts, self.ends[index], side="left"))
+        for position in range(position, len(self)):
+            if self.agent_ids[position] != agent_id:
+                return Shift(self, position)
+        return None
@@ -0,0 +1,73 @@
+import logging
+import os
+import threading
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileWatcher:
+    """
+    Polls files for changes by modification time and size
+    Between polls the thread sleeps, so an idle watch costs a few stat calls per interval.
+    A change is reported once no file changed for debounce seconds, rapid saves are coalesced into one report.
+    """
+
+    def __init__(self, paths: list[str], interval: float = 1.0, debounce: float = 1.0,
+                 stop: threading.Event | None = None):
+        self.paths = paths
+        self.interval = interval
+        self.debounce = debounce
+        self.stop = stop if stop is not None else threading.Event()
+
+    def signatures(self) -> dict[str, tuple[int, int] | None]:
+        return {path: file_signature(path) for path in self.paths}
+
+    def changes(self) -> Iterator[set[str]]:
+        """Yields the paths that changed, until stop is set"""
+        seen = self.signatures()
+        while not self.stop.wait(self.interval):
+            current = self.signatures()
+            changed = {path for path in self.paths if current[path] != seen[path]}
+            if not changed:
+                continue
+            settled = current
+            while not self.stop.wait(self.debounce):
+                latest = self.signatures()
+                if latest == settled:
+                    break
+                changed |= {path for path in self.paths if latest[path] != settled[path]}
+                settled = latest
+            if self.stop.is_set():
+                return
+            seen = settled
+            yield changed
+
+
+def diff_cells(old: pd.DataFrame, new: pd.DataFrame) -> set[tuple[str, str]]:
+    """(agent, schedule column) of every cell that differs between two versions of the wide schedule"""
+    frames = []
+    for frame in (old, new):
+        frame = frame.set_index(frame.columns[0]).fillna("")
+        if frame.index.has_duplicates:
+            logger.warning(f"Agents listed twice in the schedule, only the first row is compared: "
+                           f"{sorted(set(frame.index[frame.index.duplicated()]))}")
+            frame = frame[~frame.index.duplicated()]
+        frames.append(frame)
+    index = frames[0].index.union(frames[1].index)
+    columns = frames[0].columns.union(frames[1].columns)
+    old_cells, new_cells = (frame.reindex(index=index, columns=columns, fill_value="").to_numpy()
+                            for frame in frames)
+    rows, cols = np.nonzero(old_cells != new_cells)
+    return {(str(index[row]), str(columns[col])) for row, col in zip(rows, cols)}
@@ -0,0 +1,346 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Protocol
+
+from com_retry import AimdController, ComCaller
+from instrumentation import Metrics
+
+if TYPE_CHECKING:
+    # recurrence builds on AppointmentSpec
+    from recurrence import SeriesSpec
+
+logger = logging.getLogger(__name__)
+
+
+def co_initialize():
+    # Every thread that touches Outlook needs its own COM apartment
+    if os.name != 'posix':
+        import pythoncom
+        pythoncom.CoInitialize()
+
+
+def co_uninitialize():
+    if os.name != 'posix':
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+
+class AppointmentSpec:
+    """Everything needed to write one shift appointment, prepared before it reaches the COM thread"""
+    __slots__ = ("name", "email", "attendee", "subject", "location", "body", "start", "end",
+                 "content_hash", "busy_status", "reminder_minutes", "meeting_status")
+
+    def __init__(self, name: str, email: str, attendee: str, subject: str, location: str, body: str,
+                 start: datetime, end: datetime, content_hash: str,
+                 busy_status: int = 0, reminder_minutes: int = 24 * 60, meeting_status: int = 1):
+        self.name = name
+        self.email = email
+        self.attendee = attendee
+        self.subject = subject
+        self.location = location
+        self.body = body
+        self.start = start
+        self.end = end
+        self.content_hash = content_hash
+        self.busy_status = busy_status
+        self.reminder_minutes = reminder_minutes
+        self.meeting_status = meeting_status
+
+    def __repr__(self) -> str:
+        return f"{self.subject} - {self.start} - {self.end} - {self.name}"
+
+
+def fill_appointment(item, spec: AppointmentSpec):
+    item.MeetingStatus = spec.meeting_status
+    item.Subject = spec.subject
+    item.Location = spec.location
+    item.Body = spec.body
+    item.Start = spec.start
+    item.End = spec.end
+    item.Recipients.Add(spec.email)
+    item.BusyStatus = spec.busy_status
+    item.ReminderMinutesBeforeStart = spec.reminder_minutes
+
+
+def create_item(items, spec: AppointmentSpec):
+    # Add and fill as one unit, a retry starts over with a fresh unsaved item
+    item = items.Add()
+    fill_appointment(item, spec)
+    return item
+
+
+def create_series(items, spec: "SeriesSpec"):
+    """Unsaved recurring appointment of a recurrence.SeriesSpec, the master and its pattern"""
+    item = create_item(items, spec.master)
+    recurrence = spec.recurrence
+    pattern = item.GetRecurrencePattern()
+    # The type first, setting it resets the other pattern properties
+    pattern.RecurrenceType = recurrence.kind
+    if recurrence.weekdays:
+        pattern.DayOfWeekMask = recurrence.day_of_week_mask
+    pattern.Interval = recurrence.interval
+    pattern.PatternStartDate = datetime.combine(recurrence.first, datetime.min.time())
+    pattern.PatternEndDate = datetime.combine(recurrence.last, datetime.min.time())
+    pattern.StartTime = spec.master.start
+    pattern.Duration = int((spec.master.end - spec.master.start).total_seconds() // 60)
+    return item
+
+
+def edit_occurrence(item, spec: AppointmentSpec):
+    # An exception of a series: the shift keeps the series time but has its own title or next operator
+    occurrence = item.GetOccurrence(spec.start)
+    occurrence.Subject = spec.subject
+    occurrence.Body = spec.body
+    return occurrence
+
+
+def discard_unsent(com: ComCaller, item, spec):
+    """
+    Deletes an appointment that was saved but could not be sent
+    Its EntryID is never recorded, a later --resume or --sync would otherwise create a second one next to it
+    """
+    try:
+        com.call("Delete", item.Delete)
+    except Exception as e:
+        logger.error(f"Appointment {spec} was saved but not sent and could not be deleted: {e}")
+
+
+class WriteResult:
+    __slots__ = ("spec", "entry_id", "error", "mailbox")
+
+    def __init__(self, spec: AppointmentSpec, entry_id: str | None = None, error: Exception | None = None,
+                 mailbox: str | None = None):
+        self.spec = spec
+        self.entry_id = entry_id
+        self.error = error
+        self.mailbox = mailbox
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class WriteSummary:
+
+    def __init__(self):
+        self.succeeded: list[WriteResult] = []
+        self.failed: list[WriteResult] = []
+        self.elapsed: float = 0.0
+        self.counters: Counter = Counter()
+
+    def add(self, result: WriteResult):
+        (self.succeeded if result.ok else self.failed).append(result)
+
+    def merge(self, other: "WriteSummary"):
+        """Writers run side by side, so the merged run took as long as the slowest one"""
+        self.succeeded.extend(other.succeeded)
+        self.failed.extend(other.failed)
+        self.elapsed = max(self.elapsed, other.elapsed)
+        self.counters.update(other.counters)
+
+    def per_minute(self) -> float:
+        return len(self.succeeded) / self.elapsed * 60 if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        lines = [f"{len(self.succeeded)} appointments sent, {len(self.failed)} failed "
+                 f"in {self.elapsed:.1f}s ({self.per_minute():.0f}/min)"]
+        mailboxes = {result.mailbox for result in self.succeeded + self.failed}
+        if len(mailboxes) > 1:
+            for mailbox in sorted(mailboxes, key=str):
+                sent = sum(result.mailbox == mailbox for result in self.succeeded)
+                failed = sum(result.mailbox == mailbox for result in self.failed)
+                lines.append(f"  {mailbox}: {sent} sent, {failed} failed")
+        if self.counters:
+            lines.append("  " + ", ".join(f"{key}={value}" for key, value in sorted(self.counters.items())))
+        lines.extend(f"  failed: {result.spec} -> {result.error}" for result in self.failed)
+        return "\n".join(lines)
+
+
+BACKENDS = ("outlook", "ics")
+
+
+class Delivery(Protocol):
+    """
+    Where the appointments go: Outlook through the Dispatcher, or an iCalendar export with the IcsWriter
+    submit() may return before the appointment is written, close() waits for all of them
+    """
+
+    def submit(self, spec: AppointmentSpec):
+        ...
+
+    def close(self) -> WriteSummary:
+        ...
+
+
+STOP = object()
+# Items.Add, Save and Send
+CALLS_PER_APPOINTMENT = 3
+
+
+class OutlookWriter:
+    """
+    Writes appointments on a dedicated COM thread fed by a bounded queue
+    The producer keeps computing the schedule while earlier appointments are saved and sent,
+    submit() blocks once queue_size specs are waiting. Every item is written as soon as it is dequeued,
+    only its recording is batched: results go to on_flush in batches of batch_size (or whatever was
+    written within flush_interval seconds).
+    A failing item is recorded in the summary and the run continues.
+    on_result is called right after every single item is written, before its batch is flushed.
+    Once stop is set the specs still waiting in the queue are dropped instead of written.
+    Outlook calls are retried on busy/throttling errors, once Outlook throttles an AIMD controller
+    paces them. rate_limit caps the appointments per minute of this writer from the start.
+    """
+
+    def __init__(self, connect: Callable[[], object],
+                 queue_size: int = 100,
+                 batch_size: int = 20,
+                 flush_interval: float = 1.0,
+                 dry_run: bool = False,
+                 on_flush: Callable[[list[WriteResult]], None] | None = None,
+                 mailbox: str | None = None,
+                 rate_limit: float | None = None,
+                 on_result: Callable[[WriteResult], None] | None = None,
+                 stop: threading.Event | None = None,
+                 metrics: Metrics | None = None):
+        self.connect = connect
+        self.mailbox = mailbox
+        max_rate = rate_limit * CALLS_PER_APPOINTMENT / 60 if rate_limit else None
+        self.com = ComCaller(AimdController(max_rate=max_rate), metrics=metrics)
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dry_run = dry_run
+        self.on_flush = on_flush
+        self.on_result = on_result
+        self.stop = stop
+        self.summary = WriteSummary()
+        self.thread = threading.Thread(target=self.run, name=f"outlook-writer {mailbox or ''}", daemon=True)
+        self.started = False
+
+    def start(self) -> "OutlookWriter":
+        if not self.started:
+            self.thread.start()
+            self.started = True
+        return self
+
+    def submit(self, spec: AppointmentSpec):
+        self.start()
+        if not self.put(spec):
+            error = RuntimeError(f"The Outlook writer of {self.mailbox} stopped")
+            self.summary.add(self.notify(WriteResult(spec, error=error, mailbox=self.mailbox)))
+
+    def close(self) -> WriteSummary:
+        """Waits for every submitted appointment and returns what happened to them"""
+        if self.started:
+            self.put(STOP)
+            self.thread.join()
+        return self.summary
+
+    def put(self, item) -> bool:
+        """Waits for room in the queue while the writer thread is alive, False once it is gone"""
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        co_initialize()
+        started = time.monotonic()
+        connect_error: BaseException | None = None
+        try:
+            try:
+                folder = self.connect()
+                items = self.com.call("Items", getattr, folder, "Items")
+            except (Exception, SystemExit) as e:
+                # MeetingManager.get_email exits on an unknown mailbox, here it only fails this writer
+                logger.error(f"Writer could not connect to Outlook: {e}")
+                folder = items = None
+                connect_error = e
+
+            written: list[WriteResult] = []
+            deadline = None
+            dropped = 0
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    spec = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    spec = None
+                if spec is not None and spec is not STOP:
+                    if self.stop is not None and self.stop.is_set():
+                        dropped += 1
+                    elif items is None:
+                        # Checkpointed as failed like any other failed write
+                        written.append(self.notify(WriteResult(spec, error=connect_error, mailbox=self.mailbox)))
+                    else:
+                        written.append(self.write(items, spec))
+                    if written and deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                if written and (spec is None or spec is STOP or len(written) >= self.batch_size):
+                    self.flush(written)
+                    written = []
+                    deadline = None
+                if spec is STOP:
+                    break
+            if dropped:
+                logger.info(f"Run stopped, dropped {dropped} queued appointments")
+        finally:
+            self.summary.elapsed = time.monotonic() - started
+            self.summary.counters.update(self.com.counters)
+            co_uninitialize()
+
+    def write(self, items, spec: "AppointmentSpec | SeriesSpec") -> WriteResult:
+        try:
+            series = not isinstance(spec, AppointmentSpec)
+            item = self.com.call("Items.Add", create_series if series else create_item, items, spec)
+            if not self.dry_run:
+                self.com.call("Save", item.Save)
+                try:
+                    if series:
+                        self.write_exceptions(item, spec)
+                    self.com.call("Send", item.Send)
+                except Exception:
+                    discard_unsent(self.com, item, spec)
+                    raise
+            if series:
+                self.summary.counters["series"] += 1
+            logger.info(f"Appointment {spec} sent")
+            result = WriteResult(spec, entry_id=str(item.EntryID), mailbox=self.mailbox)
+        except Exception as e:
+            logger.error(f"Appointment {spec} failed: {e}")
+            result = WriteResult(spec, error=e, mailbox=self.mailbox)
+        return self.notify(result)
+
+    def notify(self, result: WriteResult) -> WriteResult:
+        if self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logger.error(f"Checkpointing appointment {result.spec} failed: {e}")
+        return result
+
+    def write_exceptions(self, item, spec: "SeriesSpec"):
+        """Removes the occurrences without a shift and retitles the changed ones, before the series is sent"""
+        for start in spec.deleted:
+            occurrence = self.com.call("GetOccurrence", item.GetOccurrence, start)
+            self.com.call("Delete", occurrence.Delete)
+        for exception in spec.exceptions:
+            occurrence = self.com.call("GetOccurrence", edit_occurrence, item, exception)
+            self.com.call("Save", occurrence.Save)
+
+    def flush(self, results: list[WriteResult]):
+        for result in results:
+            self.summary.add(result)
+        if self.on_flush is not None and not self.dry_run:
+            try:
+                self.on_flush(results)
+            except Exception as e:
+                logger.error(f"Recording {len(results)} written appointments failed: {e}")
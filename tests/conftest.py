@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules import each other by bare name, like main.py does when it runs from its folder
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "operatorscheduling"))
+
+import fake_outlook  # noqa: E402
+import main  # noqa: E402
+
+MAILBOX = "team@x.com"
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """The .env of the working folder and a fresh fake Outlook with the sender mailbox"""
+    monkeypatch.setattr(main, "config", {"FORMAT": "%d.%m.%Y %H:%M", "TIMEZONE": "Europe/Vilnius",
+                                         "EMAIL_DOMAIN": "x.com", "EMP_Jane": "jane", "EMP_John": "john"})
+    main.get_settings.cache_clear()
+    fake_outlook.reset()
+    # Seeded, the injected faults hit the same calls on every run
+    outlook = fake_outlook.setup([MAILBOX], seed=7)
+    yield outlook
+    main.get_settings.cache_clear()
+    fake_outlook.reset()
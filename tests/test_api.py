@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import api
+import main
+from tests.test_end_to_end import write_schedule
+
+MAILBOX = "team@x.com"
+
+
+@pytest.fixture
+def args(tmp_path, config):
+    write_schedule(tmp_path / "schedule.csv", {"Jane": "EEEEE..EEEEE..", "John": "LLLLL..LLLLL.."})
+    (tmp_path / "services.csv").write_text("service;start;end\nMain;2025-09-01 00:00;2025-10-01 00:00\n")
+    return api.make_args(input=str(tmp_path / "schedule.csv"), service=str(tmp_path / "services.csv"),
+                         email=[MAILBOX], send="True", store="", journal="", parse_cache="")
+
+
+def wait_finished(job):
+    while True:
+        progress = job.events.get(timeout=10)
+        if progress.finished:
+            return progress
+
+
+def test_one_run_at_a_time(args, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(main, "main", lambda *_, **__: release.wait(10))
+    service = api.SchedulingService()
+    try:
+        job = service.submit(args)
+        assert service.busy
+        with pytest.raises(RuntimeError):
+            service.submit(args)
+        release.set()
+        assert wait_finished(job).error is None
+        service.future.result(timeout=10)
+        assert not service.busy
+        # The next run is accepted once the first one is over
+        assert wait_finished(service.submit(args)).error is None
+    finally:
+        release.set()
+        service.shutdown()
+
+
+def test_cancel_stops_between_shifts(args, config):
+    args.fake_latency = 20
+    service = api.SchedulingService()
+    try:
+        job = service.submit(args)
+        while not job.events.get(timeout=10).done:
+            pass
+        job.cancel()
+        progress = wait_finished(job)
+        assert progress.error == "cancelled"
+        assert 0 < len(config.items()) < 20
+    finally:
+        service.shutdown()
+
+
+def test_configuration_error_finishes_the_job(args, tmp_path):
+    # Mary has no EMP_ key in the .env
+    write_schedule(tmp_path / "schedule.csv", {"Mary": "EEEEE..EEEEE.."})
+    service = api.SchedulingService()
+    try:
+        assert wait_finished(service.submit(args)).error == "stopped, see the log for details"
+    finally:
+        service.shutdown()
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import batch
+import fake_outlook
+
+HEADER = "Agents/Date;01.09.2025 07:00-15:00;01.09.2025 15:00-22:00;02.09.2025 07:00-15:00;02.09.2025 15:00-22:00"
+ENV = "FORMAT=%d.%m.%Y %H:%M\nTIMEZONE=Europe/Vilnius\nEMAIL_DOMAIN=x.com\n"
+
+
+@pytest.fixture
+def manifest(tmp_path, config):
+    """Two teams, each with its own schedule, .env and sender mailbox"""
+    for team, agent in (("support", "Jane"), ("sales", "John")):
+        (tmp_path / f"{team}.csv").write_text(f"{HEADER}\n{agent};x;;x;\n")
+        (tmp_path / f"{team}_services.csv").write_text("service;start;end\nMain;2025-09-01 00:00;2025-10-01 00:00\n")
+        (tmp_path / f"{team}.env").write_text(f"{ENV}EMP_{agent}={agent.lower()}\n")
+    path = tmp_path / "teams.json"
+    path.write_text(json.dumps({"teams": [
+        {"name": "Support", "input": "support.csv", "service": "support_services.csv", "env": "support.env",
+         "email": ["support@x.com"]},
+        {"name": "Sales", "input": "sales.csv", "service": "sales_services.csv", "env": "sales.env",
+         "email": "sales@x.com", "date_from": "2025-09-02"},
+    ]}))
+    return path
+
+
+def parse(manifest, *options: str):
+    return batch.make_parser().parse_args([str(manifest), "--parse-cache", "", "--store", "", *options])
+
+
+def test_manifest_options_replace_the_command_line(manifest, tmp_path):
+    support, sales = batch.read_manifest(str(manifest), parse(manifest, "--agent", "Jane"))
+    assert support.args.input == str(tmp_path / "support.csv")
+    assert support.env == str(tmp_path / "support.env")
+    assert (support.args.email, sales.args.email) == (["support@x.com"], ["sales@x.com"])
+    assert (support.args.agent, support.handover) == (["Jane"], True)
+    assert (sales.args.date_from, sales.handover) == ("2025-09-02", False)
+    # Every team exports into its own file
+    assert support.args.ics_path != sales.args.ics_path
+
+
+def test_manifest_problems_stop_before_any_team_runs(tmp_path, config):
+    path = tmp_path / "teams.json"
+    path.write_text(json.dumps([{"name": "Support", "input": "a.csv", "service": "s.csv", "env": "a.env"},
+                                {"name": "Support", "input": "b.csv", "service": "s.csv", "env": "b.env"},
+                                {"name": "Sales", "input": "c.csv", "colour": "red"}]))
+    with pytest.raises(SystemExit):
+        batch.read_manifest(str(path), parse(path))
+
+
+def test_each_team_is_prepared_with_its_own_settings(manifest):
+    support, sales = batch.read_manifest(str(manifest), parse(manifest))
+    plan = batch.prepare_team(support)
+    assert plan.ok and plan.time_zone == "Europe/Vilnius"
+    assert {spec.email for spec in plan.specs} == {"jane@x.com"} and len(plan.specs) == 2
+    sales_plan = batch.prepare_team(sales)
+    # Only the shifts from --date-from 2025-09-02
+    assert [spec.start.day for spec in sales_plan.specs] == [2]
+    # The Sales .env does not know Jane
+    support.env = sales.env
+    assert batch.prepare_team(support).error == "configuration error, see the log"
+
+
+def test_teams_are_sent_from_their_own_mailboxes(manifest):
+    sent = batch.run_batch(parse(manifest, "--send", "True", "--workers", "1"))
+    assert [entry.get("sent") for entry in sent.report()] == [2, 1]
+    outlook = fake_outlook.current()
+    stores = {store.DisplayName: store for store in outlook.Session.store_list}
+    senders = {item.RequiredAttendees: item.folder.store.DisplayName for item in outlook.items()}
+    assert set(stores) >= {"support@x.com", "sales@x.com"}
+    assert senders == {"Jane": "support@x.com", "John": "sales@x.com"}
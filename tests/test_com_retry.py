@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from com_retry import FATAL, THROTTLED, TRANSIENT_ERROR, AimdController, ComCaller, classify, hresult
+from fake_outlook import MAPI_E_NOT_FOUND, RPC_E_CALL_REJECTED, RPC_E_SERVERCALL_RETRYLATER, FakeComError
+
+DISP_E_EXCEPTION = hresult(0x80020009)
+
+
+def test_hresults_are_classified():
+    assert hresult(0x8001010A) == RPC_E_SERVERCALL_RETRYLATER < 0
+    assert classify(FakeComError(RPC_E_SERVERCALL_RETRYLATER, "Call was rejected by callee")) == THROTTLED
+    assert classify(FakeComError(RPC_E_CALL_REJECTED, "Call was rejected by callee")) == TRANSIENT_ERROR
+    assert classify(FakeComError(MAPI_E_NOT_FOUND, "The item was not found")) == FATAL
+    assert classify(ValueError("bad value")) == FATAL
+
+
+def test_excepinfo_scode_and_message_are_classified():
+    # Outlook wraps its own errors in DISP_E_EXCEPTION, the real code is the scode of the excepinfo
+    wrapped = Exception(DISP_E_EXCEPTION, "Exception occurred.",
+                        (4096, "Microsoft Outlook", "Network problem", None, 0, hresult(0x80040115)), None)
+    assert classify(wrapped) == TRANSIENT_ERROR
+    busy = Exception(DISP_E_EXCEPTION, "Exception occurred.",
+                     (4096, "Microsoft Outlook", "Your server administrator has limited the number of items "
+                      "you can open simultaneously.", None, 0, 0), None)
+    assert classify(busy) == THROTTLED
+
+
+def flaky(*errors: Exception):
+    """A call raising the errors one after the other, then returning how many calls it took"""
+    remaining = list(errors)
+    calls = []
+
+    def function():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return len(calls)
+    return function
+
+
+def test_retries_transient_errors_with_capped_backoff():
+    delays = []
+    caller = ComCaller(base_delay=1.0, max_delay=3.0, sleep=delays.append, rng=lambda: 1.0)
+    function = flaky(*(FakeComError(RPC_E_CALL_REJECTED, "rejected") for _ in range(3)))
+    assert caller.call("Save", function) == 4
+    assert delays == [1.0, 2.0, 3.0]
+    assert (caller.counters["calls.Save"], caller.counters["retries"], caller.counters["failures"]) == (4, 3, 0)
+
+
+def test_fatal_errors_and_the_last_attempt_are_raised():
+    caller = ComCaller(max_attempts=3, sleep=lambda seconds: None)
+    with pytest.raises(FakeComError):
+        caller.call("GetItemFromID", flaky(FakeComError(MAPI_E_NOT_FOUND, "not found")))
+    assert caller.counters["calls"] == 1
+    with pytest.raises(FakeComError):
+        caller.call("Send", flaky(*(FakeComError(RPC_E_CALL_REJECTED, "rejected") for _ in range(5))))
+    assert (caller.counters["calls.Send"], caller.counters["failures"]) == (3, 2)
+
+
+def test_pacing_starts_at_the_first_throttling_signal():
+    controller = AimdController(min_rate=1.0, max_rate=10.0, increase=0.5, decrease=0.5)
+    # Unpaced until then, max_rate is the ceiling it will return to
+    assert controller.rate == 10.0
+    controller = AimdController(min_rate=1.0, increase=0.5, decrease=0.5)
+    assert controller.rate is None
+    controller.on_success()
+    assert controller.rate is None
+    # Pretend 40 calls ran in the last 10 seconds
+    controller.calls, controller.first_call = 40, time.monotonic() - 10
+    controller.on_throttle()
+    assert controller.rate == pytest.approx(2.0, rel=0.05)
+
+
+def test_rate_is_additive_up_and_multiplicative_down():
+    slept = []
+    controller = AimdController(rate=4.0, min_rate=1.0, max_rate=5.0, increase=0.5, decrease=0.5, sleep=slept.append)
+    controller.on_success()
+    controller.on_success()
+    controller.on_success()
+    assert controller.rate == 5.0
+    controller.on_throttle()
+    assert controller.rate == 2.5
+    controller.on_throttle()
+    controller.on_throttle()
+    assert controller.rate == 1.0
+    # At one call per second the second call right after the first waits about a second
+    controller.acquire()
+    controller.acquire()
+    assert len(slept) == 1 and 0.9 < slept[0] <= 1.0
+
+
+def test_caller_slows_the_controller_down_on_throttling():
+    controller = AimdController(rate=4.0, min_rate=1.0, increase=0.5, decrease=0.5, sleep=lambda seconds: None)
+    caller = ComCaller(controller, sleep=lambda seconds: None)
+    caller.call("Save", flaky(FakeComError(RPC_E_SERVERCALL_RETRYLATER, "retry later")))
+    # Halved by the throttled attempt, then raised again by the successful one
+    assert controller.rate == 2.5
+    assert caller.counters[THROTTLED] == 1
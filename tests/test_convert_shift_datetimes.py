@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+import pytz
+
+import main
+from settings import Settings
+
+FORMAT = "%d.%m.%Y %H:%M"
+
+SPRING_FORWARD = [
+    "30.03.2025 07:00-15:00",
+    # Starts in the hour that does not exist
+    "30.03.2025 03:30-11:00",
+    "30.03.2025 02:00-03:30",
+]
+AUTUMN_AMBIGUOUS = [
+    "26.10.2025 07:00-15:00",
+    # Starts in the hour that happens twice
+    "26.10.2025 03:30-11:00",
+    "26.10.2025 02:00-03:30",
+]
+NIGHT_SHIFTS = [
+    "29.03.2025 22:00-06:00",
+    "25.10.2025 22:00-06:00",
+    "31.12.2025 23:00-07:00",
+]
+ZONES = ["Europe/Vilnius", "Europe/Berlin", "America/New_York"]
+
+
+def settings(zone: str) -> Settings:
+    return Settings({"FORMAT": FORMAT, "TIMEZONE": zone})
+
+
+def convert(cells: list[str], zone: str, local: bool = False) -> pd.DataFrame:
+    shifts = main.split_shift_cells(pd.Series(cells, dtype=object))
+    return main.convert_shift_datetimes(shifts, settings(zone), local=local)
+
+
+def expected(cell: str, zone: str) -> tuple[datetime, datetime]:
+    """What Operator did per date: the wall-clock time plus its offset from pytz localize(is_dst=False)"""
+    timezone = pytz.timezone(zone)
+    day, times = cell.split(" ")
+    start_time, end_time = times.split("-")
+    start = datetime.strptime(f"{day} {start_time}", FORMAT)
+    end = datetime.strptime(f"{day} {end_time}", FORMAT)
+    if end <= start:
+        end += timedelta(days=1)
+    return (start + timezone.localize(start, is_dst=False).utcoffset(),
+            end + timezone.localize(end, is_dst=False).utcoffset())
+
+
+@pytest.mark.parametrize("zone", ZONES)
+@pytest.mark.parametrize("cells", [SPRING_FORWARD, AUTUMN_AMBIGUOUS, NIGHT_SHIFTS],
+                         ids=["spring_forward", "autumn_ambiguous", "night_shifts"])
+def test_matches_pytz_localize(cells: list[str], zone: str):
+    converted = convert(cells, zone)
+    result = list(zip(main.to_datetime_list(converted["start"]), main.to_datetime_list(converted["end"])))
+    assert result == [expected(cell, zone) for cell in cells]
+
+
+def test_berlin_spring_forward():
+    converted = convert(["30.03.2025 07:00-15:00"], "Europe/Berlin")
+    # CEST, two hours ahead of UTC from 02:00 on
+    assert main.to_datetime_list(converted["start"]) == [datetime(2025, 3, 30, 9)]
+    assert main.to_datetime_list(converted["end"]) == [datetime(2025, 3, 30, 17)]
+
+
+def test_autumn_ambiguous_uses_standard_time():
+    converted = convert(["26.10.2025 03:30-11:00"], "Europe/Vilnius")
+    # 03:30 happens in EEST and again in EET, the second one is taken
+    assert main.to_datetime_list(converted["start"]) == [datetime(2025, 10, 26, 5, 30)]
+
+
+def test_night_shift_ends_next_day():
+    converted = convert(["25.10.2025 22:00-06:00"], "Europe/Vilnius")
+    # Starts in summer time and ends in winter time
+    assert main.to_datetime_list(converted["start"]) == [datetime(2025, 10, 26, 1)]
+    assert main.to_datetime_list(converted["end"]) == [datetime(2025, 10, 26, 8)]
+
+
+@pytest.mark.parametrize("zone", ZONES)
+def test_local_keeps_wall_clock_times(zone: str):
+    converted = convert(SPRING_FORWARD + AUTUMN_AMBIGUOUS + NIGHT_SHIFTS, zone, local=True)
+    assert main.to_datetime_list(converted["start"])[0] == datetime(2025, 3, 30, 7)
+    assert main.to_datetime_list(converted["end"])[6] == datetime(2025, 3, 30, 6)
+    assert all(end > start for start, end in zip(converted["start"], converted["end"]))
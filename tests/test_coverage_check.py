@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pandas as pd
+
+from coverage_check import analyze, shift_timeline
+
+
+def make_shifts(rows: list[tuple[str, str, str]]) -> pd.DataFrame:
+    """rows: (agent, start, end) in start order, ex: ("Jane", "2025-09-01 07:00", "2025-09-01 15:00")"""
+    return pd.DataFrame({"agent": [agent for agent, _, _ in rows],
+                         "start": pd.to_datetime([start for _, start, _ in rows]),
+                         "end": pd.to_datetime([end for _, _, end in rows])})
+
+
+SERVICES = pd.DataFrame({"service": ["Main"], "start": [datetime(2025, 9, 1, 7)], "end": [datetime(2025, 9, 1, 22)]})
+
+
+def test_covered_day_is_ok():
+    report = analyze(shift_timeline(make_shifts([("Jane", "2025-09-01 07:00", "2025-09-01 15:00"),
+                                                 ("John", "2025-09-01 15:00", "2025-09-01 22:00")])), SERVICES)
+    assert report.ok
+    assert len(report.chains) == 1 and report.chains["shifts"][0] == 2
+
+
+def test_gaps_are_cut_out_of_the_service_window():
+    report = analyze(shift_timeline(make_shifts([("Jane", "2025-09-01 08:00", "2025-09-01 12:00"),
+                                                 ("John", "2025-09-01 13:00", "2025-09-01 20:00")])), SERVICES)
+    assert not report.ok
+    assert list(report.gaps[["start", "end", "minutes"]].itertuples(index=False, name=None)) == [
+        (pd.Timestamp("2025-09-01 07:00"), pd.Timestamp("2025-09-01 08:00"), 60.0),
+        (pd.Timestamp("2025-09-01 12:00"), pd.Timestamp("2025-09-01 13:00"), 60.0),
+        (pd.Timestamp("2025-09-01 20:00"), pd.Timestamp("2025-09-01 22:00"), 120.0),
+    ]
+    assert report.overlaps.empty
+
+
+def test_double_bookings_name_the_earlier_shift():
+    shifts = make_shifts([("Jane", "2025-09-01 07:00", "2025-09-01 15:00"),
+                          ("John", "2025-09-01 07:00", "2025-09-01 22:00"),
+                          ("Jane", "2025-09-01 14:00", "2025-09-01 22:00")])
+    report = analyze(shift_timeline(shifts), SERVICES)
+    assert report.gaps.empty
+    assert list(report.overlaps.itertuples(index=False, name=None)) == [
+        ("Jane", pd.Timestamp("2025-09-01 14:00"), pd.Timestamp("2025-09-01 22:00"),
+         pd.Timestamp("2025-09-01 07:00"), pd.Timestamp("2025-09-01 15:00")),
+    ]
+    # Back to back shifts of one agent are not double-booked
+    back_to_back = make_shifts([("Jane", "2025-09-01 07:00", "2025-09-01 15:00"),
+                                ("Jane", "2025-09-01 15:00", "2025-09-01 22:00")])
+    assert analyze(shift_timeline(back_to_back), SERVICES).ok
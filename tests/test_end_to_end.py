@@ -0,0 +1,96 @@
+import pytest
+
+import fake_outlook
+import main
+
+MAILBOX = "team@x.com"
+DAYS = [f"{day:02d}.09.2025" for day in range(1, 15)]
+
+
+def write_schedule(path, agents: dict[str, str]):
+    """agents: name -> "E" (early), "L" (late) or "." (off) per day of DAYS"""
+    header = ["Agents/Date"] + [f"{day} {hours}" for day in DAYS for hours in ("07:00-15:00", "15:00-22:00")]
+    lines = [";".join(header)]
+    for name, days in agents.items():
+        cells = []
+        for shift in days:
+            cells += ["x" if shift == "E" else "", "x" if shift == "L" else ""]
+        lines.append(";".join([name] + cells))
+    path.write_text("\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch, config):
+    """A working folder with a schedule and its services"""
+    monkeypatch.chdir(tmp_path)
+    write_schedule(tmp_path / "schedule.csv", {"Jane": "EEEEE..EEEEE..", "John": "LLLLL..LLLLL.."})
+    (tmp_path / "services.csv").write_text("service;start;end\nMain;2025-09-01 00:00;2025-10-01 00:00\n")
+    return tmp_path
+
+
+def run(*options: str):
+    args = main.make_parser().parse_args(["--input", "schedule.csv", "--service", "services.csv", "--email", MAILBOX,
+                                          "--store", "store.db", "--journal", "journal.db", "--parse-cache", "",
+                                          *options])
+    main.main(args, False)
+    return fake_outlook.current()
+
+
+def attendees(outlook) -> list[str]:
+    return sorted(item.RequiredAttendees for item in outlook.items())
+
+
+def plan(capsys) -> str:
+    capsys.readouterr()
+    run("--plan")
+    return capsys.readouterr().out
+
+
+def test_send_plan_cancel_sync(workdir, capsys):
+    outlook = run("--send", "True")
+    assert len(outlook.items()) == 20
+    assert "Plan: 0 to create, 0 to update, 0 to delete, 20 unchanged" in plan(capsys)
+
+    run("--cancel", "True", "--agent", "Jane", "--date-from", "2025-09-08", "--date-to", "2025-09-12")
+    assert len(outlook.items()) == 15
+    assert "Plan: 5 to create, 0 to update, 0 to delete, 15 unchanged" in plan(capsys)
+
+    run("--sync")
+    assert len(outlook.items()) == 20
+    assert "Plan: 0 to create, 0 to update, 0 to delete, 20 unchanged" in plan(capsys)
+
+    # Jane moves to the late shift on the 3rd and is off on the 4th
+    write_schedule(workdir / "schedule.csv", {"Jane": "EEL.E..EEEEE..", "John": "LLLLL..LLLLL.."})
+    assert "Plan: 0 to create, 1 to update, 1 to delete, 18 unchanged" in plan(capsys)
+    run("--sync")
+    assert len(outlook.items()) == 19
+    assert "Plan: 0 to create, 0 to update, 0 to delete, 19 unchanged" in plan(capsys)
+
+    run("--cancel", "True")
+    assert outlook.items() == []
+
+
+def test_send_with_faults_and_throttling(workdir, capsys):
+    outlook = run("--send", "True", "--fake-fault-rate", "0.05", "--fake-throttle-rate", "0.05")
+    assert sum(outlook.faults.values()) > 0
+    # Every appointment is written once despite the retries
+    assert len(outlook.items()) == 20
+    assert attendees(outlook).count("Jane") == 10
+    assert "Plan: 0 to create, 0 to update, 0 to delete, 20 unchanged" in plan(capsys)
+
+    run("--cancel", "True", "--fake-fault-rate", "0.05", "--fake-throttle-rate", "0.05")
+    assert outlook.items() == []
+
+
+def test_item_deleted_outside_the_tool_gets_recreated(workdir, capsys):
+    outlook = run("--send", "True")
+    deleted = next(item for item in outlook.items() if "Jane" in item.RequiredAttendees)
+    deleted.Delete()
+    assert len(outlook.items()) == 19
+
+    # The shift store still has it, the calendar decides
+    assert "Plan: 1 to create, 0 to update, 0 to delete, 19 unchanged" in plan(capsys)
+    run("--sync")
+    assert len(outlook.items()) == 20
+    assert deleted.Start in [item.Start for item in outlook.items() if "Jane" in item.RequiredAttendees]
+    assert "Plan: 0 to create, 0 to update, 0 to delete, 20 unchanged" in plan(capsys)
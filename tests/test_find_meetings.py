@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+
+import main
+from calendar_snapshot import CalendarEntry
+from tests.test_reconcile import SCHEDULE, SERVICES, make_timeline, sync
+
+MAILBOX = "team@x.com"
+
+
+def test_snapshot_lookup_keeps_to_the_manager_mailbox(config):
+    manager = main.MeetingManager(MAILBOX)
+    timeline = make_timeline(SCHEDULE)
+    sync(manager, timeline)
+    manager.load_snapshot(timeline)
+    start = datetime(2025, 9, 2, 10)
+    jane = manager.attendee("Jane")
+    own = [item.EntryID for item in manager.find_meetings(jane, start)]
+    assert len(own) == 2
+    # Same attendee and time, sent from another mailbox
+    manager.snapshot.add(CalendarEntry("other-id", "[Main] Upcomming shift", start, start + timedelta(hours=8),
+                                       "Jane", ("jane@x.com",), mailbox="other@x.com"))
+    assert [item.EntryID for item in manager.find_meetings(jane, start)] == own
@@ -0,0 +1,116 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+import main
+from reconcile import apply_plan, make_plan
+from shift_store import ShiftStore
+from writer import OutlookWriter
+
+MAILBOX = "team@x.com"
+SERVICES = pd.DataFrame({"service": ["Main"], "start": [datetime(2025, 9, 1)], "end": [datetime(2025, 10, 1)]})
+
+
+def make_timeline(cells: dict[str, list[str]]):
+    """cells: name -> schedule cells, ex: "01.09.2025 07:00-15:00" """
+    names = [name for name, agent_cells in cells.items() for _ in agent_cells]
+    shifts = main.split_shift_cells(pd.Series([cell for agent_cells in cells.values() for cell in agent_cells],
+                                              dtype=object))
+    shifts["agent"] = names
+    return main.create_operator_timeline(main.create_agent_list(shifts))
+
+
+SCHEDULE = {
+    "Jane": ["01.09.2025 07:00-15:00", "02.09.2025 07:00-15:00", "03.09.2025 07:00-15:00"],
+    "John": ["01.09.2025 15:00-22:00", "02.09.2025 15:00-22:00", "03.09.2025 15:00-22:00"],
+}
+
+
+@pytest.fixture
+def manager(config):
+    return main.MeetingManager(MAILBOX)
+
+
+def sync(manager, timeline, services=SERVICES, **options):
+    plan = make_plan(manager, timeline, services, **options)
+    apply_plan(manager, plan, services)
+    return plan
+
+
+def counts(plan) -> tuple[int, int, int, int]:
+    return len(plan.create), len(plan.update), len(plan.delete), len(plan.unchanged)
+
+
+def test_empty_calendar_creates_every_shift(manager):
+    plan = make_plan(manager, make_timeline(SCHEDULE), SERVICES)
+    assert counts(plan) == (6, 0, 0, 0)
+    assert [change.shift.start for change in plan.create] == sorted(change.shift.start for change in plan.create)
+
+
+def test_synced_calendar_is_unchanged(manager, config):
+    timeline = make_timeline(SCHEDULE)
+    sync(manager, timeline)
+    assert len(config.items()) == 6
+    assert counts(make_plan(manager, timeline, SERVICES)) == (0, 0, 0, 6)
+
+
+def test_new_title_is_an_update(manager, config):
+    timeline = make_timeline(SCHEDULE)
+    sync(manager, timeline)
+    services = pd.DataFrame({"service": ["Main", "Backup"], "start": [datetime(2025, 9, 1), datetime(2025, 9, 3)],
+                             "end": [datetime(2025, 9, 3), datetime(2025, 10, 1)]})
+    plan = sync(manager, timeline, services)
+    assert counts(plan) == (0, 2, 0, 4)
+    assert [item.Subject for item in config.items()].count("[Backup] Upcomming shift") == 2
+
+
+def test_moved_shift_is_an_update(manager, config):
+    sync(manager, make_timeline(SCHEDULE))
+    moved = dict(SCHEDULE, Jane=["01.09.2025 07:00-15:00", "02.09.2025 10:00-18:00", "03.09.2025 07:00-15:00"])
+    plan = sync(manager, make_timeline(moved))
+    assert counts(plan) == (0, 1, 0, 5)
+    [change] = plan.update
+    # Vilnius summer time, the timeline carries the UTC offset like Outlook gets it
+    assert (change.entry.start, change.shift.start) == (datetime(2025, 9, 2, 10), datetime(2025, 9, 2, 13))
+    # Moved in place, not deleted and created again
+    assert len(config.items()) == 6
+    assert counts(make_plan(manager, make_timeline(moved), SERVICES)) == (0, 0, 0, 6)
+
+
+def test_removed_shift_is_deleted(manager, config):
+    sync(manager, make_timeline(SCHEDULE))
+    removed = dict(SCHEDULE, Jane=["01.09.2025 07:00-15:00", "03.09.2025 07:00-15:00"])
+    plan = sync(manager, make_timeline(removed))
+    assert len(plan.delete) == 1 and plan.delete[0].entry.start == datetime(2025, 9, 2, 10)
+    assert len(config.items()) == 5
+
+
+def test_scope_limits_the_plan(manager, config):
+    timeline = make_timeline(SCHEDULE)
+    scope = {("Jane", "jane@x.com"): {date(2025, 9, 2)}}
+    plan = sync(manager, timeline, scope=scope)
+    assert counts(plan) == (1, 0, 0, 0)
+    assert plan.create[0].shift.start == datetime(2025, 9, 2, 10)
+    # An agent without shifts left in the timeline can still have its appointments deleted
+    sync(manager, timeline)
+    only_john = make_timeline({"John": SCHEDULE["John"]})
+    plan = make_plan(manager, only_john, SERVICES, scope={("Jane", "jane@x.com"): {date(2025, 9, 1)}})
+    assert counts(plan) == (0, 0, 1, 0)
+
+
+def test_store_entries_are_used_and_confirmed(manager, config, tmp_path):
+    store = ShiftStore(str(tmp_path / "store.db"))
+    manager.shift_store = store
+    timeline = make_timeline(SCHEDULE)
+    writer = OutlookWriter(lambda: manager.store, on_flush=manager.record_results, mailbox=MAILBOX)
+    for spec in main.make_specs(manager, timeline, SERVICES):
+        writer.submit(spec)
+    assert len(writer.close().succeeded) == 6
+    assert counts(make_plan(manager, timeline, SERVICES, shift_store=store)) == (0, 0, 0, 6)
+
+    # Gone from the calendar: forgotten in the store and planned again
+    next(item for item in config.items() if "Jane" in item.RequiredAttendees).Delete()
+    plan = make_plan(manager, timeline, SERVICES, shift_store=store)
+    assert counts(plan) == (1, 0, 0, 5)
+    assert len(store.between("jane@x.com", date(2025, 9, 1), date(2025, 9, 3))) == 2
@@ -0,0 +1,60 @@
+from datetime import date, datetime, timedelta
+
+import fake_outlook
+from recurrence import DAILY, WEEKLY, SeriesSpec, collapse
+from writer import AppointmentSpec, OutlookWriter
+
+
+def make_spec(day: date, hour: int = 7, subject: str = "[Main] Upcomming shift") -> AppointmentSpec:
+    start = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+    return AppointmentSpec("Jane", "jane@x.com", "Jane", subject, "At work/Home", "",
+                           start, start + timedelta(hours=8), start.isoformat())
+
+
+# Monday to Friday for two weeks, off on Wednesday the 10th
+WORKDAYS = [date(2025, 9, 1) + timedelta(days=offset) for offset in range(12)
+            if offset % 7 < 5 and offset != 9]
+
+
+def test_weekly_shifts_become_one_series():
+    [series] = collapse([make_spec(day) for day in WORKDAYS])
+    assert isinstance(series, SeriesSpec)
+    assert (series.recurrence.kind, series.recurrence.interval, series.recurrence.weekdays) == \
+        (WEEKLY, 1, (0, 1, 2, 3, 4))
+    assert len(series.occurrences) == 9
+    assert series.deleted == [datetime(2025, 9, 10, 7)]
+    assert series.exceptions == []
+
+
+def test_irregular_and_short_runs_stay_single():
+    specs = [make_spec(date(2025, 9, 1)), make_spec(date(2025, 9, 2)), make_spec(date(2025, 9, 3), hour=15)]
+    collapsed = collapse(specs)
+    assert not any(isinstance(spec, SeriesSpec) for spec in collapsed)
+    assert [spec.start for spec in collapsed] == [spec.start for spec in specs]
+
+
+def test_four_on_four_off_is_not_one_daily_series_with_deleted_days():
+    days = [date(2025, 9, 1) + timedelta(days=offset) for offset in range(32) if offset % 8 < 4]
+    collapsed = collapse([make_spec(day) for day in days])
+    assert all(isinstance(spec, SeriesSpec) for spec in collapsed)
+    assert {(spec.recurrence.kind, spec.recurrence.interval) for spec in collapsed} == {(DAILY, 8)}
+    assert sum(len(spec.deleted) for spec in collapsed) == 0
+
+
+def test_series_is_written_with_its_exceptions():
+    specs = [make_spec(day) for day in WORKDAYS]
+    specs[3] = make_spec(WORKDAYS[3], subject="[Backup] Upcomming shift")
+    [series] = collapse(specs)
+    assert [spec.start for spec in series.exceptions] == [specs[3].start]
+
+    outlook = fake_outlook.FakeOutlook(stores=["team@x.com"])
+    folder = outlook.Session.store_list[0].GetDefaultFolder(9)
+    writer = OutlookWriter(lambda: folder)
+    writer.submit(series)
+    assert len(writer.close().succeeded) == 1
+    [master] = outlook.items()
+    occurrences = master.occurrences()
+    # The deleted Wednesday is gone, the changed shift keeps its own subject
+    assert [occurrence.Start for occurrence in occurrences] == [spec.start for spec in specs]
+    assert [occurrence.Subject for occurrence in occurrences].count("[Backup] Upcomming shift") == 1
+    assert master.deleted == {date(2025, 9, 10)}
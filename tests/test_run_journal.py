@@ -0,0 +1,56 @@
+import sqlite3
+import fake_outlook
+import main
+from job import Job
+from run_journal import RunJournal
+from tests.test_end_to_end import run, workdir  # noqa: F401
+from tests.test_reconcile import make_timeline
+
+MAILBOX = "team@x.com"
+
+
+def test_resume_skips_what_was_done(tmp_path, config):
+    journal = RunJournal(str(tmp_path / "journal.db"))
+    run_id = journal.start({"input": "schedule.csv", "send": "True", "recurring": True, "backend": "outlook",
+                            "verbose": True})
+    shifts = list(make_timeline({"Jane": [f"0{day}.09.2025 07:00-15:00" for day in range(1, 5)]}))
+    assert [shift.start for shift in journal.remaining("send", shifts)] == [shift.start for shift in shifts]
+    journal.checkpoint("send", "jane@x.com", shifts[0].start)
+    journal.checkpoint("send", "jane@x.com", shifts[1].start, RuntimeError("busy"))
+    journal.close()
+
+    resumed = RunJournal(str(tmp_path / "journal.db"))
+    stored = resumed.resume(run_id)
+    # Only the options describing the work are kept
+    assert (stored["recurring"], stored["backend"]) == (True, "outlook") and "verbose" not in stored
+    # The failed shift is tried again, the sending ones are not registered twice
+    assert [shift.start for shift in resumed.remaining("send", shifts)] == [shift.start for shift in shifts[1:]]
+    assert resumed.counts() == {"done": 1, "failed": 1, "pending": 2}
+    assert f"--resume {run_id}" in resumed.summary()
+
+
+def test_resumed_run_keeps_recurring(workdir, capsys):  # noqa: F811
+    # The first run is stopped before anything is written, every shift stays pending
+    job = Job()
+    job.cancel()
+    args = main.make_parser().parse_args(["--input", "schedule.csv", "--service", "services.csv", "--email", MAILBOX,
+                                          "--store", "store.db", "--journal", "journal.db", "--parse-cache", "",
+                                          "--send", "True", "--recurring"])
+    main.main(args, False, job=job)
+    with sqlite3.connect(workdir / "journal.db") as connection:
+        [(run_id,)] = connection.execute("SELECT run_id FROM runs").fetchall()
+    assert fake_outlook.current().items() == []
+
+    # --recurring is not given again, the journal restores it
+    outlook = run("--resume", run_id)
+    items = outlook.items()
+    assert items and all(item.IsRecurring for item in items)
+    assert sum(len(item.occurrences()) for item in items) == 20
+    journal = RunJournal(str(workdir / "journal.db"))
+    journal.resume(run_id)
+    assert journal.counts() == {"done": 20}
+    journal.close()
+
+    # Nothing is left to resume
+    run("--resume", run_id)
+    assert len(outlook.items()) == len(items)
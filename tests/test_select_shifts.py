@@ -0,0 +1,41 @@
+import pandas as pd
+
+import main
+
+COLUMNS = ["01.09.2025 07:00-15:00", "01.09.2025 15:00-22:00", "02.09.2025 07:00-15:00", "03.09.2025 07:00-15:00",
+           "04.09.2025 15:00-22:00"]
+
+
+def make_shifts() -> pd.DataFrame:
+    """The long schedule select_shifts works on, every agent on every column"""
+    rows = [(agent, column) for agent in ("Jane", "John", "Mary") for column in COLUMNS]
+    return pd.DataFrame({"agent": [agent for agent, _ in rows], "shift": [column for _, column in rows],
+                         "shift_start": [column.split("-")[0] for _, column in rows]})
+
+
+def selected(**options) -> list[tuple[str, str]]:
+    kept = main.select_shifts(make_shifts(), **options)
+    return [(agent, shift[:5]) for agent, shift in zip(kept["agent"], kept["shift"])]
+
+
+def test_no_selection_keeps_everything(config):
+    assert len(selected()) == 15
+
+
+def test_agents_and_dates(config):
+    assert selected(agents=["Jane", "Mary"], dates=[COLUMNS[1], COLUMNS[4]]) == [
+        ("Jane", "01.09"), ("Jane", "04.09"), ("Mary", "01.09"), ("Mary", "04.09")]
+
+
+def test_range_includes_both_ends(config):
+    assert selected(agents=["John"], date_from="2025-09-02", date_to="2025-09-03") == [
+        ("John", "02.09"), ("John", "03.09")]
+    assert selected(agents=["John"], date_from="2025-09-03") == [("John", "03.09"), ("John", "04.09")]
+    assert selected(agents=["John"], date_to="2025-09-01") == [("John", "01.09"), ("John", "01.09")]
+
+
+def test_dates_and_range_add_up(config):
+    # A shift on one of the dates or inside the range is kept, the agents still narrow both
+    assert selected(agents=["Mary"], dates=[COLUMNS[0]], date_from="2025-09-03", date_to="2025-09-03") == [
+        ("Mary", "01.09"), ("Mary", "03.09")]
+    assert selected(agents=["Nobody"], dates=[COLUMNS[0]], date_from="2025-09-01") == []
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from service_index import ServiceIndex
+
+
+def query_prefix(service: pd.DataFrame, date: pd.Timestamp) -> str:
+    # The per shift lookup the index replaced
+    return "/".join(service.query("@date >= start and @date <= end")["service"].tolist())
+
+
+def test_matches_service_query():
+    service = pd.DataFrame({
+        "service": ["Main", "Backup", "Main", "Backup", "Main"],
+        "start": pd.to_datetime(["2025-09-01 00:00", "2025-09-20 00:00", "2025-10-01 00:00", "2025-10-05 12:00",
+                                "2025-10-06 00:00"]),
+        "end": pd.to_datetime(["2025-10-01", "2025-10-01", "2025-10-10", "2025-10-06", "2025-10-06"]),
+    })
+    dates = pd.date_range("2025-08-31", "2025-10-11", freq="6h")
+    prefixes = ServiceIndex(service).lookup(dates.to_numpy())
+    assert list(prefixes) == [query_prefix(service, date) for date in dates]
+    # The end of one window and the start of the next is in both, in timeline order
+    assert ServiceIndex(service).lookup(np.array(["2025-10-01"], dtype="datetime64[ns]"))[0] == "Main/Backup/Main"
+
+
+def test_empty_timeline():
+    service = pd.DataFrame({"service": pd.Series([], dtype=object),
+                            "start": pd.Series([], dtype="datetime64[ns]"),
+                            "end": pd.Series([], dtype="datetime64[ns]")})
+    assert ServiceIndex(service).titles(np.array(["2025-10-01"], dtype="datetime64[ns]")) == ["Upcomming shift"]
@@ -0,0 +1,50 @@
+import threading
+from datetime import date, datetime, timedelta
+
+from shift_store import ShiftStore
+
+START = datetime(2025, 9, 1, 10)
+
+
+def row(day: int, entry_id: str, series: bool = False) -> tuple:
+    start = START + timedelta(days=day)
+    return ("jane@x.com", "Jane", start, start + timedelta(hours=8), "[Main] Upcomming shift", entry_id,
+            f"hash{day}", "team@x.com", series)
+
+
+def test_record_and_read(tmp_path):
+    store = ShiftStore(str(tmp_path / "store.db"))
+    store.record_many([row(0, "A"), row(1, "S", series=True), row(2, "S", series=True)])
+    assert store.get("jane@x.com", START).entry_id == "A"
+    assert [entry.start.day for entry in store.between("jane@x.com", date(2025, 9, 1), date(2025, 9, 2))] == [1, 2]
+    assert [entry.start.day for entry in store.series("S")] == [2, 3]
+
+    store.forget_occurrence("S", START + timedelta(days=1))
+    assert [entry.start.day for entry in store.series("S")] == [3]
+    store.forget("S")
+    assert store.series("S") == []
+    assert store.get("jane@x.com", START) is not None
+
+
+def test_reads_while_a_writer_thread_records(tmp_path):
+    store = ShiftStore(str(tmp_path / "store.db"))
+    errors = []
+
+    def record():
+        try:
+            for day in range(300):
+                store.record_many([row(day, f"E{day}")])
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=record)
+    writer.start()
+    while writer.is_alive():
+        try:
+            store.between("jane@x.com", date(2025, 9, 1), date(2026, 9, 1))
+            store.get("jane@x.com", START)
+        except Exception as e:
+            errors.append(e)
+    writer.join()
+    assert errors == []
+    assert len(store.between("jane@x.com", date(2025, 9, 1), date(2026, 9, 1))) == 300
@@ -0,0 +1,52 @@
+import pandas as pd
+
+import main
+
+MAILBOX = "team@x.com"
+HEADER = "Agents/Date;01.09.2025 07:00-15:00;01.09.2025 15:00-22:00;02.09.2025 07:00-15:00;02.09.2025 15:00-22:00"
+
+
+def saves(*schedules: str):
+    """FileWatcher stand-in: every change is one saved version of the schedule"""
+    class Watcher:
+        def __init__(self, paths: list[str], **options):
+            self.paths = paths
+
+        def changes(self):
+            for schedule in schedules:
+                with open(self.paths[0], "w") as file:
+                    file.write(schedule)
+                yield {self.paths[0]}
+
+    return Watcher
+
+
+def test_unknown_agent_keeps_the_watch_running(config, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "schedule.csv").write_text(f"{HEADER}\nJane;x;;x;\nJohn;;x;;x\n")
+    (tmp_path / "services.csv").write_text("service;start;end\nMain;2025-09-01 00:00;2025-10-01 00:00\n")
+    monkeypatch.setattr(main, "FileWatcher", saves(
+        # Mary has no EMP_ key, the save is skipped
+        f"{HEADER}\nJane;x;;x;\nJohn;;x;;x\nMary;x;;;\n",
+        f"{HEADER}\nJane;x;;;\nJohn;;x;;x\n",
+    ))
+    args = main.make_parser().parse_args(["--input", "schedule.csv", "--service", "services.csv", "--email", MAILBOX,
+                                          "--store", "", "--watch"])
+    main.watch(main.MeetingManager(MAILBOX), args, handover=True)
+    # The save after the broken one is still synced
+    assert sorted(item.Start.day for item in config.items() if "Jane" in item.RequiredAttendees) == [1]
+    assert len(config.items()) == 3
+
+
+def test_handover_targets_match_next_operator(config):
+    cells = {"Jane": ["01.09.2025 07:00-15:00", "02.09.2025 07:00-15:00", "03.09.2025 22:00-07:00"],
+             "John": ["01.09.2025 15:00-22:00", "01.09.2025 22:00-07:00", "02.09.2025 15:00-22:00",
+                      "04.09.2025 07:00-15:00"]}
+    shifts = main.split_shift_cells(pd.Series([cell for agent_cells in cells.values() for cell in agent_cells],
+                                              dtype=object))
+    shifts["agent"] = [name for name, agent_cells in cells.items() for _ in agent_cells]
+    timeline = main.create_operator_timeline(main.create_agent_list(shifts))
+    targets = main.handover_targets(timeline)
+    for shift in timeline:
+        following = timeline.next_operator(shift.index)
+        assert targets[(shift.name, shift.start)] == (None if following is None else (following.name, following.start))
@@ -0,0 +1,82 @@
+import threading
+from datetime import datetime, timedelta
+
+import fake_outlook
+from writer import AppointmentSpec, OutlookWriter, WriteResult
+
+
+def make_specs(count: int) -> list[AppointmentSpec]:
+    start = datetime(2025, 9, 1, 7)
+    return [AppointmentSpec("Jane", "jane@x.com", "Jane", "[Main] Upcomming shift", "At work/Home", "",
+                            start + timedelta(days=day), start + timedelta(days=day, hours=8), str(day))
+            for day in range(count)]
+
+
+def test_connect_failure_reports_every_spec():
+    def connect():
+        # MeetingManager.get_email exits on an unknown mailbox
+        raise SystemExit(1)
+
+    results = []
+    writer = OutlookWriter(connect, on_result=results.append, mailbox="unknown@x.com")
+    for spec in make_specs(5):
+        writer.submit(spec)
+    summary = writer.close()
+    assert len(summary.failed) == 5
+    assert [result.spec for result in results] == [result.spec for result in summary.failed]
+    assert not any(result.ok for result in results)
+
+
+def calendar():
+    outlook = fake_outlook.FakeOutlook(stores=["team@x.com"])
+    return outlook, outlook.Session.store_list[0].GetDefaultFolder(9)
+
+
+def test_writes_without_waiting_for_a_batch():
+    outlook, folder = calendar()
+    written = threading.Event()
+    flushed = []
+    writer = OutlookWriter(lambda: folder, batch_size=20, flush_interval=60.0,
+                           on_result=lambda result: written.set(), on_flush=flushed.append)
+    writer.submit(make_specs(1)[0])
+    # Written long before the batch is full or its flush interval is over
+    assert written.wait(5.0)
+    assert len(outlook.items()) == 1
+    summary = writer.close()
+    assert len(summary.succeeded) == 1
+    assert [len(results) for results in flushed] == [1]
+
+
+def test_stop_keeps_what_was_written():
+    outlook, folder = calendar()
+    stop = threading.Event()
+    flushed = []
+
+    def on_result(result: WriteResult):
+        if len(outlook.items()) == 3:
+            stop.set()
+
+    writer = OutlookWriter(lambda: folder, batch_size=20, on_result=on_result, on_flush=flushed.extend, stop=stop)
+    for spec in make_specs(10):
+        writer.submit(spec)
+    summary = writer.close()
+    assert len(outlook.items()) == 3
+    # The appointments written before the stop are still recorded
+    assert len(summary.succeeded) == 3
+    assert len(flushed) == 3
+
+
+def test_unsent_appointment_is_deleted(monkeypatch):
+    outlook, folder = calendar()
+
+    def send(item):
+        raise fake_outlook.FakeComError(-2147024809, "The operation failed")
+
+    monkeypatch.setattr(fake_outlook.FakeAppointment, "Send", send)
+    writer = OutlookWriter(lambda: folder)
+    writer.submit(make_specs(1)[0])
+    summary = writer.close()
+    assert len(summary.failed) == 1
+    # Saved first, then deleted again so a later sync does not find a second copy
+    assert outlook.items() == []
+    assert outlook.calls["Save"] == 1 and outlook.calls["Delete"] == 1